@@ -0,0 +1,416 @@
+"""Performance benchmarks of the hot paths of ibmos.
+
+Times and memory usage of the construction of the solver, the immersed
+boundaries and the propagators, the first and subsequent time steps, the
+Newton iterations of `Solver.steady_state` and the (linearized) advection
+terms are measured on the canonical setups of the examples (lid-driven cavity,
+periodic Couette flow and flow past a cylinder) for a ladder of grid sizes in
+the fractional step and monolithic formulations, and optionally for several
+orderings of the unknowns in the factorizations (see `Solver.set_ordering`).
+
+Usage:
+
+    python benchmarks/run.py                        # results.json
+    python benchmarks/run.py -n 32 64 128 --plot scaling
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+    python benchmarks/run.py --orderings packed interleaved rcm
+
+Each operation is timed as the best of --repeat runs, and memory is measured in
+a separate run: 'memory' is the peak of the memory allocated by Python and
+NumPy (tracemalloc), and 'rss' the increase of the resident memory of the
+process, which also includes that allocated by compiled libraries (e.g. the
+factorizations of the propagators). 'fill' is the memory of the factorizations
+of the propagators ('steps') and of the Jacobian ('steady_state') reported by
+the linear solver.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import ibmos as ib
+
+# Operations measured for each case, grid size and formulation.
+operations = ('init', 'set_solids', 'propagator', 'steps_first', 'steps', 'steady_state',
+              'advection', 'linearized_advection')
+
+
+def cavity_grid(n, multiple=1):
+    """Return the grid of the lid-driven cavity example with about n cells per direction.
+
+    The number of cells is a multiple of `multiple` (3 in periodic directions).
+    """
+    h = 2 / n
+    m = n // 2
+    while (2 * m - 2) % multiple:
+        m += 1
+    s = ib.stretching(m, h / 4, h, 4, 8, 8, 0.04)
+    s = np.r_[s, 2 * s[-1] - s[-2::-1]]
+    return s / s[-1]
+
+
+def cylinder_grid(n):
+    """Return the grid of the cylinder example with n cells in the vertical direction."""
+    f = n / 256
+    h = 0.04 / f
+
+    s1 = ib.stretching(int(192 * f), h, 0.25 / f, int(0.65 / h), 16, 16, 0.04)
+    s2 = ib.stretching(int(96 * f), h, 0.25 / f, int(0.65 / h), 16, 16, 0.04)
+    s = ib.stretching(n // 2, h, 0.25 / f, int(0.65 / h), 16, 16, 0.04)
+
+    return np.r_[-s2[::-1], s1[1:]], np.r_[-s[::-1], s[1:]]
+
+
+def setup(case, n, fractionalStep):
+    """Return arguments of the Solver, solids and boundary conditions of a case.
+
+    Parameters
+    ----------
+    case : str
+        'cavity' (walled, no solids), 'couette' (periodic, no solids) or
+        'cylinder' (walled, one solid).
+    n : int
+        Grid size.
+    fractionalStep : bool
+        Fractional Step Method flag.
+
+    Returns
+    -------
+    args : tuple
+        Positional arguments of `Solver`.
+    solids : callable
+        `solids(solver)` returns the list of solids.
+    bcs : callable
+        `bcs(solver)` returns uBC, vBC, sBC and the initial condition.
+
+    """
+
+    if case == 'cavity':
+        s = cavity_grid(n)
+
+        def bcs(solver):
+            uBC, vBC = solver.zero_boundary_conditions()
+            uBC[3][:] = 1
+            return uBC, vBC, (), solver.zero()
+
+        return (s, s, 1 / 1000, 0.75, False, fractionalStep), lambda solver: [], bcs
+
+    elif case == 'couette':
+        s = cavity_grid(n, multiple=3)
+
+        def bcs(solver):
+            uBC, vBC = solver.zero_boundary_conditions()
+            vBC[0][:] = 1
+            x0 = solver.zero()
+            x0[:solver.fluid.u.size] = 1.0
+            return uBC, vBC, (), x0
+
+        return (cavity_grid(n), s, 1 / 1000, 0.75, True, fractionalStep), lambda solver: [], bcs
+
+    elif case == 'cylinder':
+        x, y = cylinder_grid(n)
+
+        def solids(solver):
+            return [ib.shapes.cylinder("cylinder", 0, 0, 0.5, solver.dxmin)]
+
+        def bcs(solver):
+            uBC, vBC = solver.zero_boundary_conditions()
+            for k in range(4):
+                uBC[k][:] = 1
+            sBC = tuple((np.zeros(solid.l), np.zeros(solid.l)) for solid in solver.solids)
+            x0 = solver.zero()
+            x0[:solver.fluid.u.size] = 1.0
+            return uBC, vBC, sBC, x0
+
+        return (x, y, 1 / 40, 0.5, False, fractionalStep), solids, bcs
+
+    raise ValueError("Unknown case '%s' (available: cavity, couette, cylinder)" % case)
+
+
+def resident_memory():
+    """Return resident memory of the process in bytes (NaN if not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return np.nan
+
+
+def measure(function, repeat, prepare=lambda: None):
+    """Return best time, peak traced memory and resident memory increase of function().
+
+    `prepare()` is called (untimed) before each run.
+    """
+    times = []
+    for _ in range(repeat):
+        prepare()
+        t = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t)
+
+    prepare()
+    rss = resident_memory()
+    tracemalloc.start()
+    try:
+        function()
+        memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    rss = resident_memory() - rss
+
+    return min(times), memory, rss
+
+
+def benchmark(case, n, fractionalStep, repeat=3, number=10, maxit=3, ordering='packed'):
+    """Benchmark the operations (see `operations`) on a case.
+
+    Parameters
+    ----------
+    case : str
+        Case (see `setup`).
+    n : int
+        Grid size.
+    fractionalStep : bool
+        Fractional Step Method flag.
+    repeat : int, optional
+        Number of timed runs of each operation.
+    number : int, optional
+        Number of time steps after the first one ('steps', time per step).
+    maxit : int, optional
+        Number of Newton iterations ('steady_state', time per iteration).
+    ordering : str, optional
+        Ordering of the unknowns in the factorizations: 'packed' (layout of the
+        state vector), 'interleaved' or 'rcm' (see `Solver.set_ordering`).
+
+    Returns
+    -------
+    list
+        One dict per operation with the case, grid size, formulation, ordering,
+        number of unknowns, time (seconds), memory (bytes) and, for 'steps'
+        and 'steady_state', memory of the factorizations (fill, bytes).
+
+    """
+
+    args, solids, bcs = setup(case, n, fractionalStep)
+
+    def new_solver():
+        solver = ib.Solver(*args)
+        solver.set_ordering(None if ordering == 'packed' else ordering)
+        return solver
+
+    solver = new_solver()
+    solver.set_solids(*solids(solver))
+    uBC, vBC, sBC, x0 = bcs(solver)
+
+    u, v = solver.reshape(*solver.unpack(x0))[:2]
+    rng = np.random.default_rng(0)
+    u, v = u + 0.1 * rng.standard_normal(u.shape), v + 0.1 * rng.standard_normal(v.shape)
+
+    x1 = [None]
+
+    def first():
+        x1[0] = solver.steps(x0, uBC, vBC, sBC, number=1, verbose=0)[0]
+
+    steady_state = [None]
+
+    # Newton iterations start from the first time step (nonzero flow).
+    def newton():
+        steady_state[0] = solver.steady_state(x1[0], uBC, vBC, sBC, maxit=maxit, verbose=False)[1]
+
+    functions = {
+        'init': (new_solver, None),
+        'set_solids': (lambda: solver.set_solids(*solids(solver)), None),
+        'propagator': (lambda: solver.propagator(fractionalStep), None),
+        'steps_first': (first, solver.cleanup),
+        'steps': (lambda: solver.steps(x1[0], uBC, vBC, sBC, number=number, verbose=0), None),
+        'steady_state': (newton, None),
+        'advection': (lambda: solver.fluid.advection(u, v, uBC, vBC), None),
+        'linearized_advection': (lambda: solver.fluid.linearized_advection(u, v, uBC, vBC, test=False), None),
+    }
+
+    results = []
+    for operation in operations:
+        function, prepare = functions[operation]
+        t, memory, rss = measure(function, repeat, prepare or (lambda: None))
+
+        result = {}
+        if operation == 'steps':
+            t /= number
+            result['fill'] = sum(value for key, value in solver.memory().items() if key.startswith('factorization'))
+        elif operation == 'steady_state':
+            t /= max(len(steady_state[0]['residual_x']), 1)
+            result['fill'] = steady_state[0]['memory'].get('factorization J', np.nan)
+
+        results.append(dict({'case': case, 'n': n, 'mode': 'fractional' if fractionalStep else 'monolithic',
+                             'ordering': ordering, 'unknowns': solver.zero().size, 'operation': operation,
+                             'time': t, 'memory': memory, 'rss': rss}, **result))
+
+    return results
+
+
+def metadata():
+    """Return description of the environment."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit,
+            'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(),
+            'threads': {key: os.environ.get(key) for key in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS',
+                                                            'OPENBLAS_NUM_THREADS')},
+            'solver': ib.tools.solver_default().__name__, 'kernels': ib.kernels.backend}
+
+
+def compare(results, baseline, threshold):
+    """Print ratios of the times to those of the baseline and return the regressions.
+
+    Parameters
+    ----------
+    results : list
+        Results (see `benchmark`).
+    baseline : list
+        Results of the baseline.
+    threshold : float
+        Ratio of times above which an operation is considered a regression.
+
+    Returns
+    -------
+    list
+        Results slower than the baseline by more than the threshold.
+
+    """
+
+    def key(result):
+        return result['case'], result['n'], result['mode'], result.get('ordering', 'packed'), result['operation']
+
+    reference = {key(result): result for result in baseline}
+
+    regressions = []
+    print(f"{'case':>10} {'n':>5} {'mode':>11} {'operation':>21} {'time':>12} {'baseline':>12} {'ratio':>7}")
+    for result in results:
+        if key(result) not in reference:
+            continue
+        t0 = reference[key(result)]['time']
+        ratio = result['time'] / t0
+        flag = ' *' if ratio > threshold else ''
+        print(f"{result['case']:>10} {result['n']:5} {result['mode']:>11} {result['operation']:>21} "
+              f"{result['time']:12.5e} {t0:12.5e} {ratio:7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(result)
+
+    return regressions
+
+
+def compare_orderings(results):
+    """Print fill and time per step (or Newton iteration) of each ordering relative to 'packed'."""
+
+    reference = {(r['case'], r['n'], r['mode'], r['operation']): r for r in results
+                 if r.get('ordering', 'packed') == 'packed'}
+
+    print(f"{'case':>10} {'n':>5} {'mode':>11} {'operation':>13} {'ordering':>12} {'time':>12} "
+          f"{'ratio':>7} {'fill':>12} {'ratio':>7}")
+    for r in results:
+        if r['operation'] not in ('steps', 'steady_state'):
+            continue
+        r0 = reference.get((r['case'], r['n'], r['mode'], r['operation']), r)
+        print(f"{r['case']:>10} {r['n']:5} {r['mode']:>11} {r['operation']:>13} {r['ordering']:>12} "
+              f"{r['time']:12.5e} {r['time'] / r0['time']:7.2f} {r['fill']:12.5e} {r['fill'] / r0['fill']:7.2f}")
+
+
+def plot(results, prefix):
+    """Plot time and memory against the number of unknowns (one figure per operation)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    for operation in operations:
+        fig, axes = plt.subplots(1, 2, figsize=(10, 4))
+        series = sorted({(r['case'], r['mode'], r.get('ordering', 'packed')) for r in results
+                         if r['operation'] == operation})
+        for case, mode, ordering in series:
+            rs = sorted((r for r in results if (r['operation'], r['case'], r['mode'], r.get('ordering', 'packed'))
+                         == (operation, case, mode, ordering)), key=lambda r: r['unknowns'])
+            N = [r['unknowns'] for r in rs]
+            label = f'{case} ({mode})' if ordering == 'packed' else f'{case} ({mode}, {ordering})'
+            axes[0].loglog(N, [r['time'] for r in rs], 'o-', label=label)
+            axes[1].loglog(N, [max(r['memory'], r['rss']) for r in rs], 'o-', label=label)
+
+        axes[0].set_ylabel('time [s]')
+        axes[1].set_ylabel('memory [bytes]')
+        for ax in axes:
+            ax.set_xlabel('unknowns')
+            ax.set_title(operation)
+            ax.legend(fontsize='small')
+        fig.tight_layout()
+        fig.savefig(f'{prefix}_{operation}.png', dpi=100)
+        plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=[32, 64], help="grid sizes")
+    parser.add_argument('-c', '--cases', nargs='+', default=['cavity', 'couette', 'cylinder'],
+                        help="cases (cavity, couette, cylinder)")
+    parser.add_argument('-m', '--modes', nargs='+', default=['fractional', 'monolithic'],
+                        help="formulations (fractional, monolithic)")
+    parser.add_argument('--orderings', nargs='+', default=['packed'],
+                        help="orderings of the unknowns in the factorizations (packed, interleaved, rcm)")
+    parser.add_argument('-k', '--kernels', choices=['numba', 'numpy'],
+                        help="backend of the advection terms and interpolation matrices (see ibmos.kernels)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="timed runs of each operation")
+    parser.add_argument('-o', '--output', default='results.json', help="JSON file with the results")
+    parser.add_argument('-b', '--baseline', help="JSON file with the results of the baseline")
+    parser.add_argument('-t', '--threshold', type=float, default=1.25,
+                        help="ratio of times above which an operation is a regression")
+    parser.add_argument('-p', '--plot', help="prefix of the scaling plots (PNG)")
+    args = parser.parse_args(argv)
+
+    if args.kernels:
+        ib.kernels.set_backend(args.kernels)
+
+    results = []
+    for case in args.cases:
+        for n in args.sizes:
+            for mode in args.modes:
+                if mode not in ('fractional', 'monolithic'):
+                    parser.error("unknown mode '%s'" % mode)
+                for ordering in args.orderings:
+                    if ordering not in ('packed', 'interleaved', 'rcm'):
+                        parser.error("unknown ordering '%s'" % ordering)
+                    t = time.perf_counter()
+                    results.extend(benchmark(case, n, mode == 'fractional', args.repeat, ordering=ordering))
+                    print(f"{case} n={n} {mode} {ordering}: {time.perf_counter() - t:.1f} s", file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump({'metadata': metadata(), 'results': results}, f, indent=1)
+
+    if len(args.orderings) > 1:
+        compare_orderings(results)
+
+    if args.plot:
+        plot(results, args.plot)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
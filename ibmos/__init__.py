@@ -1,4 +1,14 @@
+from . import adjoint
+from . import growth
+from . import kernels
+from . import monitors
+from . import multidomain
+from . import periodic
+from . import profiling
+from . import rom
+from . import schemes
 from . import shapes
+from . import sweep
 from .solid import Solid
 from .solver import Solver
 from .tools import stretching
@@ -0,0 +1,304 @@
+"""Discrete adjoint of the time-stepper."""
+
+from math import comb, ceil, log2
+
+import numpy as np
+import scipy.sparse as sp
+
+from .schemes import CNAB2
+
+
+def reversed_states(advance, state, n0, n1, snapshots):
+    """Yield the states of a time integration in reverse order (binomial checkpointing).
+
+    The states are recomputed from a set of at most `snapshots` stored states
+    (besides `state`), which are placed according to the binomial rule of
+    Griewank's revolve algorithm. For n1 - n0 steps, the number of times a step
+    is recomputed is the smallest r such that comb(snapshots + r, r) >= n1 - n0.
+
+    Parameters
+    ----------
+    advance : callable
+        `advance(n, state)` returns the state at step n + 1.
+    state : object
+        State at step n0.
+    n0 : int
+        First step.
+    n1 : int
+        Last step (not included).
+    snapshots : int
+        Number of states that can be stored.
+
+    Yields
+    ------
+    n : int
+        Step, from n1 - 1 down to n0.
+    state : object
+        State at step n.
+
+    """
+
+    length = n1 - n0
+
+    if length == 1:
+        yield n0, state
+    elif snapshots == 0:
+        for n in range(n1 - 1, n0 - 1, -1):
+            staten = state
+            for m in range(n0, n):
+                staten = advance(m, staten)
+            yield n, staten
+    else:
+        # Number of repetitions needed with the available snapshots.
+        r = 0
+        while comb(snapshots + r, r) < length:
+            r += 1
+
+        # First segment is reversed with r - 1 repetitions, the second one with
+        # one snapshot less.
+        m = n0 + min(comb(snapshots + r - 1, snapshots), length - 1)
+
+        statem = state
+        for n in range(n0, m):
+            statem = advance(n, statem)
+
+        yield from reversed_states(advance, statem, m, n1, snapshots - 1)
+        yield from reversed_states(advance, state, n0, m, snapshots)
+
+
+def time_step(solver, dt):
+    """Return right-hand-side matrix and solve of the propagator of a time step.
+
+    The state at the next time step is `solve(BB @ x + b)`, where b holds the
+    boundary terms and (in the velocity rows) the advection terms, as in
+    `Solver.steps`. With the fractional step method, the velocity and the
+    pressure (and forces) are computed with the factorizations of A and
+    Q BN Q^T, followed by the projection. `solve(a, trans=True)` applies the
+    transpose of the map from b to the next state, i.e. it returns the
+    gradient of a·x_{n+1} with respect to b, using transposed solves with the
+    same factorizations.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    dt : float
+        Time step.
+
+    Returns
+    -------
+    BB : sp.csr_matrix
+        Right-hand-side matrix (zero rows and columns for the pressure and the forces).
+    solve : callable
+        `solve(b, x0=None, trans=False)`, where x0 is an initial guess (only
+        used by iterative linear solvers in the monolithic formulation).
+
+    """
+    pStart = solver.pStart
+    A, B, iA = solver.cached_propagator(dt)
+
+    if not solver.fractionalStep:
+        return B[0], iA[0]
+
+    (B, BN, Q), (iA, iC) = B, iA
+    Z = sp.csr_matrix((Q.shape[0],) * 2)
+
+    def solve(b, x0=None, trans=False):
+        if not trans:
+            qast = iA(b[:pStart])
+            λ = iC(Q @ qast - b[pStart:])
+            return np.r_[qast - BN @ (Q.T @ λ), λ]
+
+        yλ = -iC(b[pStart:] - Q @ (BN.T @ b[:pStart]), trans=True)
+        return np.r_[iA(b[:pStart] - Q.T @ yλ, trans=True), yλ]
+
+    return sp.block_diag((B, Z), format='csr'), solve
+
+
+def force_weights(solver, objective):
+    """Return vector g such that g @ x is a weighted sum of forces.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    objective : dict
+        Weights of the forces, e.g. {'cylinder_fx': 1.0}, where forces are
+        named as in the infodict of `Solver.steps`.
+
+    Returns
+    -------
+    np.ndarray
+        Vector of weights (packed).
+
+    Raises
+    ------
+    ValueError
+        Unknown force in `objective`.
+
+    """
+    g = solver.zero()
+    fields = solver.unpack(g)[3:]
+
+    names = [f'{solid.name}_{component}' for solid in solver.solids for component in ('fx', 'fy')]
+    for name in objective:
+        if name not in names:
+            raise ValueError("Unknown force '%s' (available: %s)" % (name, ", ".join(names)))
+
+    for name, field in zip(names, fields):
+        field[:] = 2 * objective.get(name, 0.0)
+
+    return g
+
+
+def adjoint_steps(solver, x, uBC, vBC, sBC=(), objective=None, number=1, snapshots=None,
+                  Nm1=None, boundary=False, verbose=True):
+    """Return the gradient of a time-integrated force using the discrete adjoint.
+
+    The objective is J = Σ_n dt g·x_n (n = 1, ..., number), where g·x is a
+    weighted sum of the forces on the solids (see `force_weights`) and x_n are
+    the states computed by `Solver.steps` from the initial condition `x`. The
+    adjoint of each time step reuses the (cached) factorization of the forward
+    propagator through transposed solves, and the transpose of the advection
+    terms linearized about the forward state. Forward states are recomputed
+    from a logarithmic number of snapshots (see `reversed_states`). Both the
+    monolithic and the fractional step formulations are supported (see
+    `time_step`).
+
+    Only the CNAB2 scheme with constant time step is supported. Boundary
+    conditions must not change during the time integration (no outflow
+    boundary conditions).
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    x : np.ndarray
+        Initial condition (packed state-vector).
+    uBC : list
+        Boundary conditions on the horizontal velocity component.
+    vBC : list
+        Boundary conditions on the vertical velocity component.
+    sBC : list, optional
+        Velocity on the immersed boundaries.
+    objective : dict
+        Weights of the forces in the objective, e.g. {'cylinder_fx': 1.0}.
+    number : int, optional
+        Number of time steps.
+    snapshots : int, optional
+        Number of stored states. By default, ceil(log2(number)) + 1.
+    Nm1 : np.ndarray, optional
+        Advection terms at the previous time-step (see `Solver.steps`).
+    boundary : bool, optional
+        Compute also the gradient with respect to uBC and vBC.
+    verbose : bool, optional
+        Print objective and number of (forward and adjoint) steps.
+
+    Returns
+    -------
+    J : float
+        Objective.
+    gradient : dict
+        Gradient of J with respect to the initial condition (x0, packed state
+        vector whose velocity components are the only non-zero ones), the
+        velocity on the immersed boundaries (sBC, same structure as sBC) and,
+        if requested, the boundary conditions (uBC and vBC).
+    infodict : dict
+        Number of stored states and of forward steps (including recomputations).
+
+    Raises
+    ------
+    NotImplementedError
+        Time integration scheme other than CNAB2.
+
+    """
+
+    if not isinstance(solver.scheme, CNAB2):
+        raise NotImplementedError("Adjoint time-stepping requires the CNAB2 scheme")
+
+    if snapshots is None:
+        snapshots = ceil(log2(max(number, 1))) + 1
+
+    pStart, dt = solver.pStart, solver.dt
+
+    BB, iAA = time_step(solver, dt)
+    bc = solver.boundary_condition_terms(uBC, vBC, *sBC)
+    g = force_weights(solver, objective or {})
+
+    def advection(x):
+        return np.r_[solver.fluid.advection(*solver.reshape(*solver.unpack(x))[:2], uBC, vBC)]
+
+    steps = 0
+
+    def advance(n, state):
+        nonlocal steps
+        steps += 1
+
+        x, Nm1 = state
+        N = advection(x)
+
+        b = BB @ x + bc
+        b[:pStart] += -1.5 * N + 0.5 * Nm1
+        return iAA(b), N
+
+    # If Nm1 is not provided, the advection terms at the initial condition are
+    # also used as those at the previous time step.
+    startup = Nm1 is None
+    if startup:
+        Nm1 = advection(x)
+
+    J = 0.0
+    a = dt * g  # dJ/dx_{n+1}
+    y1, y2 = np.zeros_like(x), np.zeros_like(x)  # y_{n+1}, y_{n+2}
+    ysum = np.zeros_like(x)
+
+    uBCgrad = [np.zeros_like(bc) for bc in uBC]
+    vBCgrad = [np.zeros_like(bc) for bc in vBC]
+
+    try:
+        for n, (xn, Nm1n) in reversed_states(advance, (x, Nm1), 0, number, snapshots):
+            if n == number - 1:
+                J += dt * g @ advance(n, (xn, Nm1n))[0]
+            if n > 0:
+                J += dt * g @ xn
+
+            # Adjoint of the time step n -> n+1
+            y1, y2 = iAA(a, trans=True), y1
+            ysum += y1
+
+            # Adjoint of the advection terms at step n.
+            w = 1.5 * y1[:pStart] - 0.5 * y2[:pStart]
+            if n == 0 and startup:
+                w -= 0.5 * y1[:pStart]
+
+            un, vn = solver.reshape(*solver.unpack(xn))[:2]
+            Nn = solver.fluid.linearized_advection(un, vn, uBC, vBC, test=False)
+
+            a = BB.T @ y1
+            a[:pStart] -= Nn.T @ w
+            if n > 0:
+                a += dt * g
+
+            if boundary:
+                Nu, Nv = solver.fluid.linearized_advection_boundary(un, vn, uBC, vBC)
+                for grad, Nk in zip(uBCgrad + vBCgrad, Nu + Nv):
+                    grad -= Nk.T @ w
+    except KeyboardInterrupt:
+        print("Interrupting at step", n)
+        raise
+
+    # Velocity on the immersed boundaries and boundary conditions (contribution
+    # through the boundary terms).
+    uBCbc, vBCbc, sBCgrad = solver.boundary_condition_terms_adjoint(ysum)
+
+    gradient = {'x0': a, 'sBC': sBCgrad}
+    if boundary:
+        gradient['uBC'] = [grad + bc for grad, bc in zip(uBCgrad, uBCbc)]
+        gradient['vBC'] = [grad + bc for grad, bc in zip(vBCgrad, vBCbc)]
+
+    infodict = {'snapshots': snapshots, 'steps': steps}
+
+    if verbose:
+        print(f"J = {J: 12.5e}, {number} adjoint steps, {steps} forward steps, {snapshots} snapshots")
+
+    return J, gradient, infodict
@@ -0,0 +1,148 @@
+"""On-disk cache of operators and propagators.
+
+Entries are stored in subdirectories of the cache directory named after a hash
+of the configuration they depend on (see `key`). Arrays are stored as .npy
+files (sparse matrices as their CSR or CSC arrays), which are loaded with
+memory-mapping (and without pickle, so that loading entries never executes
+code). Factorizations are not stored.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+
+# Version of the format of the entries (part of the keys).
+version = 1
+
+
+def key(*items):
+    """Return hash of the items (arrays, numbers, strings and nested lists/tuples)."""
+    h = hashlib.sha256(str(version).encode())
+
+    def update(item):
+        if isinstance(item, (list, tuple)):
+            h.update(b'(')
+            for elem in item:
+                update(elem)
+            h.update(b')')
+        elif isinstance(item, np.ndarray):
+            h.update(f'{item.dtype.str}{item.shape}'.encode())
+            h.update(np.ascontiguousarray(item).tobytes())
+        else:
+            h.update(repr(item).encode())
+        h.update(b',')
+
+    update(items)
+    return h.hexdigest()
+
+
+def _flatten(obj, arrays):
+    """Return JSON-serializable structure of obj, appending its arrays to `arrays`."""
+    if isinstance(obj, (list, tuple)):
+        return {'type': type(obj).__name__, 'items': [_flatten(elem, arrays) for elem in obj]}
+    elif sp.issparse(obj):
+        fmt = obj.format if obj.format in ('csr', 'csc') else 'csr'
+        obj = obj.asformat(fmt)
+        arrays.extend((obj.data, obj.indices, obj.indptr))
+        return {'type': fmt, 'shape': obj.shape, 'arrays': len(arrays) - 3}
+    else:
+        arrays.append(np.asarray(obj))
+        return {'type': 'array', 'arrays': len(arrays) - 1}
+
+
+def _unflatten(structure, arrays):
+    """Inverse of `_flatten`."""
+    if structure['type'] in ('list', 'tuple'):
+        items = [_unflatten(elem, arrays) for elem in structure['items']]
+        return items if structure['type'] == 'list' else tuple(items)
+    elif structure['type'] in ('csr', 'csc'):
+        k = structure['arrays']
+        matrix = sp.csr_matrix if structure['type'] == 'csr' else sp.csc_matrix
+        return matrix(tuple(arrays(k + i) for i in range(3)), shape=tuple(structure['shape']), copy=False)
+    else:
+        return arrays(structure['arrays'])
+
+
+def save(directory, name, obj):
+    """Store entry in the cache.
+
+    Entries are written to a temporary directory which is then renamed, so that
+    concurrent processes never read partially written entries.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory.
+    name : str
+        Name of the entry (see `key`).
+    obj : object
+        Array, sparse matrix or nested lists/tuples of them.
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=directory, prefix='.tmp')
+
+    try:
+        arrays = []
+        structure = _flatten(obj, arrays)
+        for k, array in enumerate(arrays):
+            np.save(os.path.join(tmp, f'{k}.npy'), array)
+        with open(os.path.join(tmp, 'structure.json'), 'w') as f:
+            json.dump(structure, f)
+
+        os.replace(tmp, os.path.join(directory, name))
+    except OSError:
+        # Entry written by another process in the meantime.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load(directory, name):
+    """Return entry of the cache (None if it does not exist).
+
+    Arrays are memory-mapped (read-only).
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory.
+    name : str
+        Name of the entry (see `key`).
+
+    """
+    path = os.path.join(directory, name)
+    try:
+        with open(os.path.join(path, 'structure.json')) as f:
+            structure = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    return _unflatten(structure, lambda k: np.load(os.path.join(path, f'{k}.npy'), mmap_mode='r'))
+
+
+def cached(directory, name, build):
+    """Return entry of the cache, which is built and stored if it does not exist.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory. If None, `build` is always called.
+    name : str
+        Name of the entry (see `key`).
+    build : callable
+        Function without arguments that returns the entry (see `save`).
+
+    """
+    if directory is None:
+        return build()
+
+    obj = load(directory, name)
+    if obj is None:
+        obj = build()
+        save(directory, name, obj)
+
+    return obj
@@ -17,6 +17,18 @@ def roma(r, dr):
     return d
 
 
+def roma_derivative(r, dr):
+    """Derivative with respect to r of the delta function from Roma et al. JCP"""
+    d = np.zeros_like(r)
+    absr = np.abs(r / dr)
+    m3 = absr > 1.5
+    m1 = absr <= 0.5
+    d[m1] = -absr[m1] / (dr * np.sqrt(1 - 3 * absr[m1] ** 2))
+    m2 = np.logical_not(np.logical_or(m1, m3))
+    d[m2] = -(1 + (1 - absr[m2]) / np.sqrt(1 - 3 * (1 - absr[m2]) ** 2)) / (2 * dr)
+    return d * np.sign(r) / dr
+
+
 gaussNumPoints = 15
 
 
@@ -29,6 +41,16 @@ def gauss(r, dr):
     return d
 
 
+def gauss_derivative(r, dr):
+    """Derivative with respect to r of the Gaussian delta function"""
+    d = np.zeros_like(r)
+    absr = np.abs(r / dr)
+    m1 = absr <= 14
+    d[m1] = -(np.pi / (36 * dr ** 2)) ** 0.5 * np.exp(-np.pi ** 2 * absr[m1] ** 2 / 36) * \
+            np.pi ** 2 * r[m1] / (18 * dr ** 2)
+    return d
+
+
 bao6NumPoints = 4
 
 
@@ -68,5 +90,49 @@ def bao6(r, dr):
     return d / dr
 
 
+def bao6_derivative(r, dr):
+    """Derivative with respect to r of Bao's delta function"""
+    K = 59 / 60 - np.sqrt(29) / 20
+
+    d, r = np.zeros_like(r), r / dr
+
+    β = lambda x: 9 / 4 - 3 / 2 * (K + x ** 2) + (22 / 3 - 7 * K) * x - 7 / 3 * x ** 3
+    γ = lambda x: -11 / 32 * x ** 2 + \
+                  3 / 32 * (2 * K + x ** 2) * x ** 2 + \
+                  1 / 72 * ((3 * K - 1) * x + x ** 3) ** 2 + \
+                  1 / 18 * ((4 - 3 * K) * x - x ** 3) ** 2
+    dβ = lambda x: -3 * x + (22 / 3 - 7 * K) - 7 * x ** 2
+    dγ = lambda x: -11 / 16 * x + \
+                   3 / 8 * (K + x ** 2) * x + \
+                   1 / 36 * ((3 * K - 1) * x + x ** 3) * ((3 * K - 1) + 3 * x ** 2) + \
+                   1 / 9 * ((4 - 3 * K) * x - x ** 3) * ((4 - 3 * K) - 3 * x ** 2)
+
+    dϕm3 = lambda x: (-dβ(x) + np.sign(3 / 2 - K) * (β(x) * dβ(x) - 56 * dγ(x)) /
+                      np.sqrt(β(x) ** 2 - 112 * γ(x))) / 56
+    dϕm2 = lambda x: -3 * dϕm3(x) + x / 4 + (3 * K - 1) / 12 + x ** 2 / 4
+    dϕm1 = lambda x: 2 * dϕm3(x) + (4 - 3 * K) / 6 - x ** 2 / 2
+    dϕp0 = lambda x: 2 * dϕm3(x) - x / 2
+    dϕp1 = lambda x: -3 * dϕm3(x) - (4 - 3 * K) / 6 + x ** 2 / 2
+    dϕp2 = lambda x: dϕm3(x) + x / 4 - (3 * K - 1) / 12 - x ** 2 / 4
+
+    rm3 = (0 <= (r + 3)) * ((r + 3) < 1)
+    rm2 = (0 <= (r + 2)) * ((r + 2) < 1)
+    rm1 = (0 <= (r + 1)) * ((r + 1) < 1)
+    rp0 = (0 <= (r - 0)) * ((r - 0) < 1)
+    rp1 = (0 <= (r - 1)) * ((r - 1) < 1)
+    rp2 = (0 <= (r - 2)) * ((r - 2) < 1)
+
+    d[rm3] = dϕm3(r[rm3] + 3)
+    d[rm2] = dϕm2(r[rm2] + 2)
+    d[rm1] = dϕm1(r[rm1] + 1)
+    d[rp0] = dϕp0(r[rp0] - 0)
+    d[rp1] = dϕp1(r[rp1] - 1)
+    d[rp2] = dϕp2(r[rp2] - 2)
+
+    return d / dr ** 2
+
+
+derivatives = {roma: roma_derivative, gauss: gauss_derivative, bao6: bao6_derivative}
+
 defaultNumPoints = romaNumPoints
 defaultFunction = roma
@@ -4,6 +4,7 @@ import numpy as np
 import scipy.linalg as la
 import scipy.sparse as sp
 
+from . import kernels as _kernels
 from . import quad
 
 
@@ -50,6 +51,39 @@ class FieldInfo:
         """Return width, i.e. dx, weight matrix."""
         return sp.kron(sp.eye(self.shape[0]), sp.diags(self.dx))
 
+    def interpolation(self, xp, yp):
+        """Return bilinear interpolation matrix to the points (xp, yp).
+
+        Points outside the rectangle defined by the first and last nodes take
+        the value at the nearest point on its boundary.
+
+        Parameters
+        ----------
+        xp : np.ndarray
+            First coordinate of the points.
+        yp : np.ndarray
+            Second coordinate of the points.
+
+        Returns
+        -------
+        sp.csr_matrix
+            Matrix of shape (len(xp), size).
+        """
+
+        def weights(x, xp):
+            i = np.clip(np.searchsorted(x, xp) - 1, 0, len(x) - 2)
+            return i, np.clip((xp - x[i]) / (x[i + 1] - x[i]), 0, 1)
+
+        xp, yp = np.ravel(xp), np.ravel(yp)
+        (i, wx), (j, wy) = weights(self.x, xp), weights(self.y, yp)
+
+        rows = np.tile(np.arange(len(xp)), 4)
+        cols = np.r_[j * self.shape[1] + i, j * self.shape[1] + i + 1,
+                     (j + 1) * self.shape[1] + i, (j + 1) * self.shape[1] + i + 1]
+        vals = np.r_[(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx]
+
+        return sp.csr_matrix((vals, (rows, cols)), shape=(len(xp), self.size))
+
 
 @dataclass
 class Field:
@@ -143,6 +177,9 @@ class Field:
         return [[Lu, Lu0], [Lv, Lv0]]
 
     def advection(self, u, v, uBC, vBC):
+        if _kernels.enabled():
+            return _kernels.advection(self, u, v, uBC, vBC)
+
         Mu, Mv = self.u.weight_width(), self.v.weight_height()
         Ru, Rv = self.u.weight_height(), self.v.weight_width()
 
@@ -203,6 +240,12 @@ class Field:
         return Mu@Ru@Nu.ravel(), Mv@Rv@Nv.ravel()
 
     def linearized_advection(self, u0, v0, u0BC, v0BC, test=True):
+        if _kernels.enabled():
+            N = _kernels.linearized_advection(self, u0, v0)
+            if test:
+                self._test_linearized_advection(N, u0, v0, u0BC, v0BC)
+            return N
+
         n, m = self.p.shape
         h = 1e-8
 
@@ -324,26 +367,85 @@ class Field:
         N.eliminate_zeros()
 
         if test:
-            # First random u
-            u = np.random.random(u0.shape)
-            v = np.zeros_like(v0)
+            self._test_linearized_advection(N, u0, v0, u0BC, v0BC)
 
-            Nu1, Nv1 = self.advection(u0 + 1j * h * u, np.asarray(v0, dtype=complex), u0BC, v0BC)
-            NU1 = np.concatenate([Nu1.imag / h, Nv1.imag / h])
-            NU2 = N @ np.r_[u.ravel(), v.ravel()]
-            NUerr = la.norm(NU2 - NU1) / la.norm(NU1)
-
-            # Then random v
-            u = np.zeros(u0.shape)
-            v = np.random.random(v0.shape)
+        return N
 
-            α = la.norm(v, np.inf)
-            Nu1, Nv1 = self.advection(np.asarray(u0, dtype=complex), v0 + 1j * h * v, u0BC, v0BC)
-            NU1 = np.concatenate([Nu1.imag / h, Nv1.imag / h])
-            NU2 = N @ np.r_[u.ravel(), v.ravel()]
-            NVerr = la.norm(NU2 - NU1) / la.norm(NU1)
+    def _test_linearized_advection(self, N, u0, v0, u0BC, v0BC):
+        """Check linearized advection operator against complex-step derivatives of the advection terms."""
+        h = 1e-8
 
-            if NUerr > 1e-13 or NVerr > 1e-13:
-                raise ValueError("Linearization check failed: Nuerr = %f and Nverr = %f" % (NUerr, NVerr))
+        # First random u
+        u = np.random.random(u0.shape)
+        v = np.zeros_like(v0)
+
+        Nu1, Nv1 = self.advection(u0 + 1j * h * u, np.asarray(v0, dtype=complex), u0BC, v0BC)
+        NU1 = np.concatenate([Nu1.imag / h, Nv1.imag / h])
+        NU2 = N @ np.r_[u.ravel(), v.ravel()]
+        NUerr = la.norm(NU2 - NU1) / la.norm(NU1)
+
+        # Then random v
+        u = np.zeros(u0.shape)
+        v = np.random.random(v0.shape)
+
+        α = la.norm(v, np.inf)
+        Nu1, Nv1 = self.advection(np.asarray(u0, dtype=complex), v0 + 1j * h * v, u0BC, v0BC)
+        NU1 = np.concatenate([Nu1.imag / h, Nv1.imag / h])
+        NU2 = N @ np.r_[u.ravel(), v.ravel()]
+        NVerr = la.norm(NU2 - NU1) / la.norm(NU1)
+
+        if NUerr > 1e-13 or NVerr > 1e-13:
+            raise ValueError("Linearization check failed: Nuerr = %f and Nverr = %f" % (NUerr, NVerr))
+
+    def linearized_advection_boundary(self, u0, v0, u0BC, v0BC):
+        """Return derivatives of the advection terms with respect to the boundary conditions.
+
+        Each boundary value only affects the advection terms within one cell (along
+        the boundary) of it. Hence, the derivatives with respect to all the values of
+        a boundary condition are obtained with three complex-step evaluations, each
+        perturbing every third value.
+
+        Returns
+        -------
+        list, list
+            Sparse matrices with the derivatives of [Nu, Nv] with respect to each of
+            the vectors in u0BC and v0BC.
+        """
+        h = 1e-8
 
-        return N
+        u0, v0 = np.asarray(u0, dtype=complex), np.asarray(v0, dtype=complex)
+        u0BC = [np.asarray(bc, dtype=complex) for bc in u0BC]
+        v0BC = [np.asarray(bc, dtype=complex) for bc in v0BC]
+
+        derivatives = [], []
+        for BC, derivative in zip((u0BC, v0BC), derivatives):
+            for k, bc0 in enumerate(BC):
+                # West and East boundaries run along y, South and North along x.
+                alongy = k < 2
+                row, col, data = [], [], []
+
+                for color in range(3):
+                    BC[k] = bc0 + 1j * h * (np.arange(bc0.size) % 3 == color)
+                    Nu, Nv = self.advection(u0, v0, u0BC, v0BC)
+                    BC[k] = bc0
+
+                    offset = 0
+                    for N, shape in ((Nu, self.u.shape), (Nv, self.v.shape)):
+                        N = N.imag / h
+                        idx = np.flatnonzero(N)
+
+                        # Boundary value (of this color) next to each cell.
+                        j = idx // shape[1] if alongy else idx % shape[1]
+                        i = j - 1 + (color - (j - 1)) % 3
+                        if self.periodic and alongy:
+                            i %= bc0.size
+
+                        row.append(offset + idx)
+                        col.append(i)
+                        data.append(N[idx])
+                        offset += N.size
+
+                derivative.append(sp.coo_matrix((np.concatenate(data), (np.concatenate(row), np.concatenate(col))),
+                                                shape=(self.u.size + self.v.size, bc0.size)).tocsr())
+
+        return derivatives
@@ -0,0 +1,309 @@
+"""Optimal transient growth of perturbations about a steady state."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from .adjoint import time_step
+from .schemes import CNAB2
+
+
+def energy_weights(solver):
+    """Return the weights of the kinetic energy norm, i.e. the area of the cells.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+
+    Returns
+    -------
+    np.ndarray
+        Weights of the horizontal and vertical velocity components (first
+        solver.pStart entries of the state vector).
+
+    """
+    u, v = solver.fluid.u, solver.fluid.v
+    return np.r_[(u.weight_width() @ u.weight_height()).diagonal(),
+                 (v.weight_width() @ v.weight_height()).diagonal()]
+
+
+def projection(solver, W=None):
+    """Return the W-orthogonal projection onto the velocity fields that satisfy the constraints.
+
+    The constraints Q q = 0 (discrete divergence-free condition and no-slip
+    on the immersed boundaries, with homogeneous boundary conditions) are
+    those of the propagator of the solver (monolithic or fractional step). The projection of q is the velocity
+    field of the solution of the saddle-point system [W, Q^T; Q, 0] [p; λ] =
+    [W q; 0], whose matrix is factorized once.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    W : np.ndarray, optional
+        Weights of the norm. By default, `energy_weights(solver)`.
+
+    Returns
+    -------
+    callable
+        Projection of a velocity field (first solver.pStart entries of the
+        state vector).
+
+    """
+    W = energy_weights(solver) if W is None else W
+    pStart = solver.pStart
+
+    A, B, _ = solver.cached_propagator(solver.dt)
+    Q = B[2] if solver.fractionalStep else A[0][pStart:, :pStart]
+
+    K = sp.bmat([[sp.diags(W), Q.T], [Q, None]], format='csc')
+    iK = solver.linear_solver(K, **solver.propagator_properties(False)[0])
+
+    def project(q):
+        b = np.zeros(K.shape[0])
+        b[:pStart] = W * q
+        return iK(b)[:pStart]
+
+    return project
+
+
+def linearized_steps(solver, N, q, number, adjoint=False):
+    """Integrate the linearized governing equations (or their discrete adjoint).
+
+    The perturbations are advanced with the CNAB2 scheme and homogeneous
+    boundary conditions, reusing the factorizations of the propagator of the
+    solver (monolithic or fractional step, see `ibmos.adjoint.time_step`). The advection terms at the previous time step of the first one are
+    those at the initial condition (as in `Solver.steps`).
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    N : sp.spmatrix
+        Advection terms linearized about the base flow (see `linearized_advection`).
+    q : np.ndarray
+        Velocity perturbation (first solver.pStart entries of the state vector).
+    number : int
+        Number of time steps.
+    adjoint : bool, optional
+        Apply the transpose of the map instead, i.e. return the gradient of
+        p·q(T) with respect to q(0), where p is the argument `q`.
+
+    Returns
+    -------
+    np.ndarray
+        Velocity perturbation at the final time (or its adjoint at the initial time).
+
+    """
+    pStart = solver.pStart
+
+    BB, iAA = time_step(solver, solver.dt)
+
+    x = solver.zero()
+    x[:pStart] = q
+
+    if not adjoint:
+        Nm1 = N @ q
+        for _ in range(number):
+            Nx = N @ x[:pStart]
+            b = BB @ x
+            b[:pStart] += -1.5 * Nx + 0.5 * Nm1
+            x, Nm1 = iAA(b, x0=x), Nx
+        return x[:pStart]
+
+    a, y1 = x, np.zeros_like(x)
+    for n in range(number - 1, -1, -1):
+        y1, y2 = iAA(a, trans=True), y1
+
+        w = 1.5 * y1[:pStart] - 0.5 * y2[:pStart]
+        if n == 0:
+            w -= 0.5 * y1[:pStart]
+
+        a = BB.T @ y1
+        a[:pStart] -= N.T @ w
+
+    return a[:pStart]
+
+
+def linearized_advection(solver, x, uBC, vBC):
+    """Return the advection terms linearized about the base flow x.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    x : np.ndarray
+        Base flow (packed state vector), e.g. computed with `Solver.steady_state`.
+    uBC : list
+        Boundary conditions of the base flow (horizontal velocity component).
+    vBC : list
+        Boundary conditions of the base flow (vertical velocity component).
+
+    Returns
+    -------
+    sp.csr_matrix
+        Jacobian of the advection terms.
+
+    """
+    u, v = solver.reshape(*solver.unpack(x))[:2]
+    return sp.csr_matrix(solver.fluid.linearized_advection(u, v, uBC, vBC, test=False))
+
+
+def optimal_growth(solver, N, number, modes=1, tol=0, W=None, P=None):
+    """Return optimal gains and initial perturbations for a time horizon.
+
+    The gain G = |q(T)|²/|q(0)|² in the energy norm |q|² = q·W q is
+    maximized by computing the largest eigenvalues of P W^{-1/2} Φ^T W Φ
+    W^{-1/2} P with the Lanczos method, where Φ is the linearized map from
+    q(0) to q(T) (see `linearized_steps`) and P restricts the initial
+    perturbations to those that satisfy the constraints (see `projection`).
+    Each iteration requires one direct and one adjoint integration, and two
+    projections.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    N : sp.spmatrix
+        Advection terms linearized about the base flow (see `linearized_advection`).
+    number : int
+        Number of time steps (horizon T = number * solver.dt).
+    modes : int, optional
+        Number of optimal perturbations.
+    tol : float, optional
+        Relative tolerance of the eigenvalues (0 implies machine precision).
+    W : np.ndarray, optional
+        Weights of the norm. By default, `energy_weights(solver)`.
+    P : callable, optional
+        Projection onto the velocity fields that satisfy the constraints. By
+        default, `projection(solver, W)`.
+
+    Returns
+    -------
+    G : np.ndarray
+        Optimal gains (decreasing order).
+    q : np.ndarray
+        Optimal initial perturbations (columns) with unit norm, which satisfy
+        the constraints.
+    evaluations : int
+        Number of direct (and adjoint) integrations.
+
+    """
+    W = energy_weights(solver) if W is None else W
+    P = projection(solver, W) if P is None else P
+    sW = np.sqrt(W)
+
+    evaluations = 0
+
+    def matvec(z):
+        nonlocal evaluations
+        evaluations += 1
+
+        q = linearized_steps(solver, N, P(z.ravel() / sW), number)
+        return sW * P(linearized_steps(solver, N, W * q, number, adjoint=True) / W)
+
+    A = spla.LinearOperator((W.size,) * 2, matvec=matvec, dtype=float)
+    G, Z = spla.eigsh(A, k=modes, which='LA', tol=tol, v0=sW * P(np.ones_like(W)))
+
+    order = np.argsort(-G)
+    q = np.column_stack([P(z / sW) for z in Z[:, order].T])
+    return G[order], q / np.sqrt(W @ q**2), evaluations
+
+
+# Flow solver and linearized advection terms used by the worker processes.
+_worker = None
+
+
+def _initialize_worker(*args):
+    global _worker
+    _worker = args
+
+
+def _worker_optimal_growth(number, modes, tol):
+    global _worker
+    if len(_worker) == 3:
+        _worker += (projection(_worker[0], _worker[2]),)
+
+    solver, N, W, P = _worker
+    return optimal_growth(solver, N, number, modes, tol, W, P)
+
+
+def transient_growth(solver, x, uBC, vBC, horizons, modes=1, tol=0, workers=None, verbose=True):
+    """Compute optimal transient growth of perturbations about a steady state.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver. Perturbations are integrated with its time step.
+    x : np.ndarray
+        Base flow (packed state vector), e.g. computed with `Solver.steady_state`.
+    uBC : list
+        Boundary conditions of the base flow (horizontal velocity component).
+    vBC : list
+        Boundary conditions of the base flow (vertical velocity component).
+    horizons : list
+        Time horizons, rounded to a multiple of the time step.
+    modes : int, optional
+        Number of optimal perturbations per horizon.
+    tol : float, optional
+        Relative tolerance of the gains (0 implies machine precision).
+    workers : int, optional
+        Number of processes. By default, horizons are evaluated sequentially in
+        the current process. Otherwise, each process factorizes the propagator
+        once.
+    verbose : bool, optional
+        Print horizons, gains and number of integrations.
+
+    Returns
+    -------
+    G : np.ndarray
+        Optimal gains, shape (len(horizons), modes).
+    q : np.ndarray
+        Optimal initial perturbations (packed state vectors with unit energy),
+        shape (len(horizons), modes, solver.zero().size).
+    infodict : dict
+        Horizons (multiples of the time step) and number of direct (and adjoint)
+        integrations.
+
+    Raises
+    ------
+    NotImplementedError
+        Time integration scheme other than CNAB2.
+
+    """
+
+    if not isinstance(solver.scheme, CNAB2):
+        raise NotImplementedError("Transient growth requires the CNAB2 scheme")
+
+    N = linearized_advection(solver, x, uBC, vBC)
+    W = energy_weights(solver)
+
+    numbers = [max(int(round(T / solver.dt)), 1) for T in horizons]
+    args = (numbers, [modes] * len(numbers), [tol] * len(numbers))
+
+    if workers:
+        with ProcessPoolExecutor(workers, initializer=_initialize_worker,
+                                 initargs=(solver, N, W)) as pool:
+            results = list(pool.map(_worker_optimal_growth, *args))
+    else:
+        P = projection(solver, W)
+        results = [optimal_growth(solver, N, *arg, W=W, P=P) for arg in zip(*args)]
+
+    G = np.array([Gk for Gk, _, _ in results])
+
+    q = np.zeros((len(numbers), modes, solver.zero().size))
+    for k, (_, qk, _) in enumerate(results):
+        q[k, :, :solver.pStart] = qk.T
+
+    infodict = {'horizons': solver.dt * np.asarray(numbers),
+                'evaluations': np.array([evaluations for _, _, evaluations in results])}
+
+    if verbose:
+        print(f"{'T':>12} {'G':>12} {'evaluations':>12}")
+        for T, Gk, evaluations in zip(infodict['horizons'], G, infodict['evaluations']):
+            print(f"{T: 12.5e} {Gk[0]: 12.5e} {evaluations:12}")
+
+    return G, q, infodict
@@ -0,0 +1,555 @@
+"""Compiled kernels of the advection terms and of the interpolation matrices.
+
+If Numba is installed, `Field.advection`, `Field.linearized_advection`,
+`Solid.interpolation` and `Solid.interpolation_derivative` use the kernels of
+this module, which are compiled on their first call (and cached on disk):
+
+- advection: single pass over the cells of the walled or periodic grid,
+  without temporary arrays (real or complex fields).
+- linearized advection: entries of the Jacobian emitted directly from the
+  stencil, instead of 18 complex-step evaluations of the advection terms.
+- interpolation (E) matrices: entries emitted point by point, with the delta
+  functions (and their derivatives) evaluated in the same pass.
+
+Otherwise, or after `set_backend('numpy')`, the NumPy implementations in
+`ibmos.flow` and `ibmos.solid` are used. They are the reference: `check`
+compares both (without Numba, the kernels run as plain Python).
+"""
+
+import math
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+from . import delta as _delta
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Current backend: 'numba' (kernels of this module) or 'numpy'.
+backend = 'numpy' if numba is None else 'numba'
+
+
+def _jit(function):
+    """Return function compiled with Numba (the function itself if not installed)."""
+    return function if numba is None else numba.njit(cache=True)(function)
+
+
+def set_backend(name):
+    """Set backend of the advection terms and interpolation matrices.
+
+    Parameters
+    ----------
+    name : str
+        'numba' (compiled kernels, requires Numba) or 'numpy'.
+
+    """
+    global backend
+
+    if name not in ('numba', 'numpy'):
+        raise ValueError("Unknown backend '%s' (available: numba, numpy)" % name)
+    if name == 'numba' and numba is None:
+        raise ImportError("The numba backend requires Numba")
+
+    backend = name
+
+
+@contextmanager
+def using(name):
+    """Context manager that sets the backend temporarily (see `set_backend`)."""
+    previous = backend
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous)
+
+
+def enabled():
+    """Return True if the compiled kernels are used."""
+    return backend == 'numba'
+
+
+# Delta functions (see `ibmos.delta`) evaluated at a single point.
+
+@_jit
+def _roma(r, dr):
+    absr = abs(r / dr)
+    if absr <= 0.5:
+        return (1 + math.sqrt(1 - 3 * absr ** 2)) / (3 * dr)
+    elif absr <= 1.5:
+        return (5 - 3 * absr - math.sqrt(1 - 3 * (1 - absr) ** 2)) / (6 * dr)
+    return 0.0
+
+
+@_jit
+def _roma_derivative(r, dr):
+    absr = abs(r / dr)
+    if absr <= 0.5:
+        d = -absr / (dr * math.sqrt(1 - 3 * absr ** 2))
+    elif absr <= 1.5:
+        d = -(1 + (1 - absr) / math.sqrt(1 - 3 * (1 - absr) ** 2)) / (2 * dr)
+    else:
+        return 0.0
+    return d * np.sign(r) / dr
+
+
+@_jit
+def _gauss(r, dr):
+    absr = abs(r / dr)
+    if absr <= 14:
+        return (np.pi / (36 * dr ** 2)) ** 0.5 * math.exp(-np.pi ** 2 * absr ** 2 / 36)
+    return 0.0
+
+
+@_jit
+def _gauss_derivative(r, dr):
+    absr = abs(r / dr)
+    if absr <= 14:
+        return -(np.pi / (36 * dr ** 2)) ** 0.5 * math.exp(-np.pi ** 2 * absr ** 2 / 36) * \
+            np.pi ** 2 * r / (18 * dr ** 2)
+    return 0.0
+
+
+_K = 59 / 60 - math.sqrt(29) / 20
+
+
+@_jit
+def _bao6_ϕm3(x):
+    K = _K
+    β = 9 / 4 - 3 / 2 * (K + x ** 2) + (22 / 3 - 7 * K) * x - 7 / 3 * x ** 3
+    γ = -11 / 32 * x ** 2 + 3 / 32 * (2 * K + x ** 2) * x ** 2 + \
+        1 / 72 * ((3 * K - 1) * x + x ** 3) ** 2 + 1 / 18 * ((4 - 3 * K) * x - x ** 3) ** 2
+    return (-β + np.sign(3 / 2 - K) * math.sqrt(β ** 2 - 112 * γ)) / 56
+
+
+@_jit
+def _bao6(r, dr):
+    K, r = _K, r / dr
+    if -3 <= r < -2:
+        d = _bao6_ϕm3(r + 3)
+    elif -2 <= r < -1:
+        x = r + 2
+        d = -3 * _bao6_ϕm3(x) - 1 / 16 + (K + x ** 2) / 8 + (3 * K - 1) * x / 12 + x ** 3 / 12
+    elif -1 <= r < 0:
+        x = r + 1
+        d = 2 * _bao6_ϕm3(x) + 1 / 4 + (4 - 3 * K) * x / 6 - x ** 3 / 6
+    elif 0 <= r < 1:
+        d = 2 * _bao6_ϕm3(r) + 5 / 8 - (K + r ** 2) / 4
+    elif 1 <= r < 2:
+        x = r - 1
+        d = -3 * _bao6_ϕm3(x) + 1 / 4 - (4 - 3 * K) * x / 6 + x ** 3 / 6
+    elif 2 <= r < 3:
+        x = r - 2
+        d = _bao6_ϕm3(x) - 1 / 16 + (K + x ** 2) / 8 - (3 * K - 1) * x / 12 - x ** 3 / 12
+    else:
+        d = 0.0
+    return d / dr
+
+
+@_jit
+def _bao6_dϕm3(x):
+    K = _K
+    β = 9 / 4 - 3 / 2 * (K + x ** 2) + (22 / 3 - 7 * K) * x - 7 / 3 * x ** 3
+    γ = -11 / 32 * x ** 2 + 3 / 32 * (2 * K + x ** 2) * x ** 2 + \
+        1 / 72 * ((3 * K - 1) * x + x ** 3) ** 2 + 1 / 18 * ((4 - 3 * K) * x - x ** 3) ** 2
+    dβ = -3 * x + (22 / 3 - 7 * K) - 7 * x ** 2
+    dγ = -11 / 16 * x + 3 / 8 * (K + x ** 2) * x + \
+        1 / 36 * ((3 * K - 1) * x + x ** 3) * ((3 * K - 1) + 3 * x ** 2) + \
+        1 / 9 * ((4 - 3 * K) * x - x ** 3) * ((4 - 3 * K) - 3 * x ** 2)
+    return (-dβ + np.sign(3 / 2 - K) * (β * dβ - 56 * dγ) / math.sqrt(β ** 2 - 112 * γ)) / 56
+
+
+@_jit
+def _bao6_derivative(r, dr):
+    K, r = _K, r / dr
+    if -3 <= r < -2:
+        d = _bao6_dϕm3(r + 3)
+    elif -2 <= r < -1:
+        x = r + 2
+        d = -3 * _bao6_dϕm3(x) + x / 4 + (3 * K - 1) / 12 + x ** 2 / 4
+    elif -1 <= r < 0:
+        x = r + 1
+        d = 2 * _bao6_dϕm3(x) + (4 - 3 * K) / 6 - x ** 2 / 2
+    elif 0 <= r < 1:
+        d = 2 * _bao6_dϕm3(r) - r / 2
+    elif 1 <= r < 2:
+        x = r - 1
+        d = -3 * _bao6_dϕm3(x) - (4 - 3 * K) / 6 + x ** 2 / 2
+    elif 2 <= r < 3:
+        x = r - 2
+        d = _bao6_dϕm3(x) + x / 4 - (3 * K - 1) / 12 - x ** 2 / 4
+    else:
+        d = 0.0
+    return d / dr ** 2
+
+
+# Kernels of the delta functions of `ibmos.delta`.
+deltas = {_delta.roma: _roma, _delta.roma_derivative: _roma_derivative,
+          _delta.gauss: _gauss, _delta.gauss_derivative: _gauss_derivative,
+          _delta.bao6: _bao6, _delta.bao6_derivative: _bao6_derivative}
+
+
+@_jit
+def _delta_kernel(δ, r, dr, d):
+    for k in range(r.size):
+        d[k] = δ(r[k], dr[k])
+
+
+def delta(function, r, dr):
+    """Return delta function of `ibmos.delta` evaluated with its kernel.
+
+    Parameters
+    ----------
+    function : callable
+        Delta function (or derivative) of `ibmos.delta`.
+    r : np.ndarray
+        Distances.
+    dr : float or np.ndarray
+        Grid spacing.
+
+    """
+    r = np.asarray(r, dtype=float)
+    dr = np.full(r.shape, dr, dtype=float)
+    d = np.empty(r.size)
+    _delta_kernel(deltas[function], r.ravel(), dr.ravel(), d)
+    return d.reshape(r.shape)
+
+
+# Advection terms.
+
+@_jit
+def _corner(u, v, dx, dy, jb, ja, jv, i):
+    """Return u v at the corner between rows jb and ja of u (row jv of v) and columns i and i+1 of v."""
+    return (u[ja, i] * dy[jb] + u[jb, i] * dy[ja]) / (dy[ja] + dy[jb]) * \
+        (v[jv, i + 1] * dx[i] + v[jv, i] * dx[i + 1]) / (dx[i + 1] + dx[i])
+
+
+@_jit
+def _advection(u, v, uW, uE, uS, uN, vW, vE, vS, vN, dx, dy, periodic, wux, wuy, wvx, wvy, Nu, Nv):
+    ny, nx = u.shape[0], u.shape[1] + 1
+    p = 1 if periodic else 0
+
+    for j in range(ny):
+        for i in range(nx - 1):
+            uc = u[j, i]
+            um = uW[j] if i == 0 else u[j, i - 1]
+            up = uE[j] if i == nx - 2 else u[j, i + 1]
+            N = dx[i + 1] * dx[i] / (dx[i + 1] + dx[i]) * \
+                ((up * up - uc * uc) / dx[i + 1] ** 2 + (uc * uc - um * um) / dx[i] ** 2)
+
+            if periodic:
+                north = _corner(u, v, dx, dy, j, (j + 1) % ny, (j + 1) % ny, i)
+                south = _corner(u, v, dx, dy, (j - 1) % ny, j, j, i)
+            else:
+                if j == ny - 1:
+                    north = uN[i] * (vN[i + 1] * dx[i] + vN[i] * dx[i + 1]) / (dx[i] + dx[i + 1])
+                else:
+                    north = _corner(u, v, dx, dy, j, j + 1, j, i)
+                if j == 0:
+                    south = uS[i] * (vS[i + 1] * dx[i] + vS[i] * dx[i + 1]) / (dx[i] + dx[i + 1])
+                else:
+                    south = _corner(u, v, dx, dy, j - 1, j, j - 1, i)
+
+            Nu[j, i] = wuy[j] * wux[i] * (N + (north - south) / dy[j])
+
+    for j in range(v.shape[0]):
+        # Rows of u below and above.
+        jb, ja = (j - p) % ny, (j - p + 1) % ny
+
+        for i in range(nx):
+            vc = v[j, i]
+            if periodic:
+                vm, vp = v[(j - 1) % ny, i], v[(j + 1) % ny, i]
+            else:
+                vm = vS[i] if j == 0 else v[j - 1, i]
+                vp = vN[i] if j == v.shape[0] - 1 else v[j + 1, i]
+            N = dy[ja] * dy[jb] / (dy[ja] + dy[jb]) * \
+                ((vp * vp - vc * vc) / dy[ja] ** 2 + (vc * vc - vm * vm) / dy[jb] ** 2)
+
+            if i == nx - 1:
+                east = vE[j] * (uE[ja] * dy[jb] + uE[jb] * dy[ja]) / (dy[ja] + dy[jb])
+            else:
+                east = _corner(u, v, dx, dy, jb, ja, j, i)
+            if i == 0:
+                west = vW[j] * (uW[ja] * dy[jb] + uW[jb] * dy[ja]) / (dy[ja] + dy[jb])
+            else:
+                west = _corner(u, v, dx, dy, jb, ja, j, i - 1)
+
+            Nv[j, i] = wvy[j] * wvx[i] * (N + (east - west) / dx[i])
+
+
+def advection(fluid, u, v, uBC, vBC):
+    """Return advection terms (see `Field.advection`)."""
+    bcs = list(uBC) + list(vBC)
+    dtype = np.result_type(u, v, *bcs)
+
+    u = np.ascontiguousarray(np.reshape(u, fluid.u.shape), dtype=dtype)
+    v = np.ascontiguousarray(np.reshape(v, fluid.v.shape), dtype=dtype)
+    bcs = [np.ascontiguousarray(bc, dtype=dtype) for bc in bcs]
+    if fluid.periodic:
+        # No boundary conditions on the South and North boundaries.
+        empty = np.empty(0, dtype)
+        bcs = bcs[:2] + [empty, empty] + bcs[2:] + [empty, empty]
+
+    Nu, Nv = np.empty(fluid.u.shape, dtype), np.empty(fluid.v.shape, dtype)
+    _advection(u, v, *bcs, np.diff(fluid.x), np.diff(fluid.y), fluid.periodic,
+               fluid.u.dx, fluid.u.dy, fluid.v.dx, fluid.v.dy, Nu, Nv)
+
+    return Nu.ravel(), Nv.ravel()
+
+
+# Linearized advection terms.
+
+@_jit
+def _emit_corner(u, v, dx, dy, jb, ja, jv, i, row, scale, rows, cols, vals, k):
+    """Emit derivatives of scale * _corner(u, v, dx, dy, jb, ja, jv, i) with respect to u and v."""
+    nu, nxu, nxv = u.size, u.shape[1], v.shape[1]
+    sy, sx = dy[ja] + dy[jb], dx[i] + dx[i + 1]
+    a = (u[ja, i] * dy[jb] + u[jb, i] * dy[ja]) / sy
+    b = (v[jv, i + 1] * dx[i] + v[jv, i] * dx[i + 1]) / sx
+
+    rows[k:k + 4] = row
+    cols[k], vals[k] = ja * nxu + i, scale * dy[jb] / sy * b
+    cols[k + 1], vals[k + 1] = jb * nxu + i, scale * dy[ja] / sy * b
+    cols[k + 2], vals[k + 2] = nu + jv * nxv + i + 1, scale * a * dx[i] / sx
+    cols[k + 3], vals[k + 3] = nu + jv * nxv + i, scale * a * dx[i + 1] / sx
+
+    return k + 4
+
+
+@_jit
+def _emit(row, col, value, rows, cols, vals, k):
+    rows[k], cols[k], vals[k] = row, col, value
+    return k + 1
+
+
+@_jit
+def _linearized_advection(u, v, dx, dy, periodic, wux, wuy, wvx, wvy, rows, cols, vals):
+    ny, nx = u.shape[0], u.shape[1] + 1
+    nu = u.size
+    p = 1 if periodic else 0
+
+    k = 0
+    for j in range(ny):
+        for i in range(nx - 1):
+            row, w = j * (nx - 1) + i, wuy[j] * wux[i]
+
+            c = w * 2 * dx[i + 1] * dx[i] / (dx[i + 1] + dx[i])
+            if i > 0:
+                k = _emit(row, row - 1, -c * u[j, i - 1] / dx[i] ** 2, rows, cols, vals, k)
+            k = _emit(row, row, c * u[j, i] * (1 / dx[i] ** 2 - 1 / dx[i + 1] ** 2), rows, cols, vals, k)
+            if i < nx - 2:
+                k = _emit(row, row + 1, c * u[j, i + 1] / dx[i + 1] ** 2, rows, cols, vals, k)
+
+            if periodic:
+                k = _emit_corner(u, v, dx, dy, j, (j + 1) % ny, (j + 1) % ny, i, row, w / dy[j],
+                                 rows, cols, vals, k)
+                k = _emit_corner(u, v, dx, dy, (j - 1) % ny, j, j, i, row, -w / dy[j], rows, cols, vals, k)
+            else:
+                if j < ny - 1:
+                    k = _emit_corner(u, v, dx, dy, j, j + 1, j, i, row, w / dy[j], rows, cols, vals, k)
+                if j > 0:
+                    k = _emit_corner(u, v, dx, dy, j - 1, j, j - 1, i, row, -w / dy[j], rows, cols, vals, k)
+
+    nvy = v.shape[0]
+    for j in range(nvy):
+        jb, ja = (j - p) % ny, (j - p + 1) % ny
+
+        for i in range(nx):
+            row, w = nu + j * nx + i, wvy[j] * wvx[i]
+
+            c = w * 2 * dy[ja] * dy[jb] / (dy[ja] + dy[jb])
+            if periodic or j > 0:
+                k = _emit(row, nu + ((j - 1) % nvy) * nx + i, -c * v[(j - 1) % nvy, i] / dy[jb] ** 2,
+                          rows, cols, vals, k)
+            k = _emit(row, row, c * v[j, i] * (1 / dy[jb] ** 2 - 1 / dy[ja] ** 2), rows, cols, vals, k)
+            if periodic or j < nvy - 1:
+                k = _emit(row, nu + ((j + 1) % nvy) * nx + i, c * v[(j + 1) % nvy, i] / dy[ja] ** 2,
+                          rows, cols, vals, k)
+
+            if i < nx - 1:
+                k = _emit_corner(u, v, dx, dy, jb, ja, j, i, row, w / dx[i], rows, cols, vals, k)
+            if i > 0:
+                k = _emit_corner(u, v, dx, dy, jb, ja, j, i - 1, row, -w / dx[i], rows, cols, vals, k)
+
+    return k
+
+
+def linearized_advection(fluid, u0, v0):
+    """Return linearized advection operator (see `Field.linearized_advection`)."""
+    u0 = np.ascontiguousarray(np.reshape(u0, fluid.u.shape), dtype=float)
+    v0 = np.ascontiguousarray(np.reshape(v0, fluid.v.shape), dtype=float)
+
+    # At most 3 + 2 x 4 entries per row.
+    n = u0.size + v0.size
+    rows, cols, vals = np.empty(11 * n, dtype=np.int64), np.empty(11 * n, dtype=np.int64), np.empty(11 * n)
+    k = _linearized_advection(u0, v0, np.diff(fluid.x), np.diff(fluid.y), fluid.periodic,
+                              fluid.u.dx, fluid.u.dy, fluid.v.dx, fluid.v.dy, rows, cols, vals)
+
+    N = sp.csr_matrix((vals[:k], (rows[:k], cols[:k])), shape=(n, n))
+    N.sum_duplicates()
+    N.eliminate_zeros()
+    return N
+
+
+# Interpolation matrices.
+
+@_jit
+def _interpolation(δx, δy, n, ξ, η, ix, iy, x, y, dx, dy, normalized, rows, cols, vals):
+    m = 2 * n + 1
+    wx, wy = np.empty(m), np.empty(m)
+
+    k = 0
+    for j in range(ξ.size):
+        sx = dx[ix[j]] if normalized else 1.0
+        sy = dy[iy[j]] if normalized else 1.0
+        for a in range(m):
+            wx[a] = sx * δx(ξ[j] - x[ix[j] - n + a], dx[ix[j]])
+            wy[a] = sy * δy(η[j] - y[iy[j] - n + a], dy[iy[j]])
+
+        for b in range(m):
+            for a in range(m):
+                rows[k], cols[k], vals[k] = j, (iy[j] - n + b) * x.size + ix[j] - n + a, wy[b] * wx[a]
+                k += 1
+
+
+def _nearest(x, ξ):
+    """Return index of the nearest element of x (sorted) to each ξ (first one in case of ties)."""
+    i = np.clip(np.searchsorted(x, ξ), 1, len(x) - 1)
+    return np.where(np.abs(ξ - x[i - 1]) <= np.abs(ξ - x[i]), i - 1, i)
+
+
+def supported(solid):
+    """Return True if the delta function of the solid (and its derivative) has a kernel."""
+    return solid.δ in deltas and _delta.derivatives.get(solid.δ) in deltas
+
+
+def interpolation(solid, field, normalized=True, derivative=None):
+    """Return interpolation matrix of a solid (see `Solid.interpolation`).
+
+    Parameters
+    ----------
+    solid : Solid
+        Immersed boundary.
+    field : FieldInfo
+        Field (u, v or p).
+    normalized : bool, optional
+        Delta functions scaled by the grid spacing.
+    derivative : str, optional
+        'ξ' or 'η': derivative with respect to the coordinate of the points
+        (see `Solid.interpolation_derivative`).
+
+    Returns
+    -------
+    sp.csr_matrix
+        Matrix of shape (solid.l, field.size).
+
+    """
+    n = solid.n
+    ξ, η = np.asarray(solid.ξ, dtype=float), np.asarray(solid.η, dtype=float)
+    ix, iy = _nearest(field.x, ξ), _nearest(field.y, η)
+
+    if np.any(np.r_[ix, iy] < n) or np.any(ix + n >= len(field.x)) or np.any(iy + n >= len(field.y)):
+        raise ValueError("The support of the delta functions of '%s' exceeds the grid" % solid.name)
+
+    δx = deltas[_delta.derivatives[solid.δ] if derivative == 'ξ' else solid.δ]
+    δy = deltas[_delta.derivatives[solid.δ] if derivative == 'η' else solid.δ]
+
+    size = solid.l * (2 * n + 1) ** 2
+    rows, cols, vals = np.empty(size, dtype=np.int64), np.empty(size, dtype=np.int64), np.empty(size)
+    _interpolation(δx, δy, n, ξ, η, ix, iy, np.asarray(field.x, dtype=float), np.asarray(field.y, dtype=float),
+                   np.asarray(field.dx, dtype=float), np.asarray(field.dy, dtype=float), normalized,
+                   rows, cols, vals)
+
+    E = sp.csr_matrix((vals, (rows, cols)), shape=(solid.l, field.size))
+    E.eliminate_zeros()
+    return E
+
+
+def check(rtol=1e-12, seed=0):
+    """Compare the kernels with the NumPy implementations.
+
+    The advection terms (walled and periodic grids, real and complex fields),
+    linearized advection operators, interpolation matrices and their
+    derivatives (for each delta function) and the delta functions are
+    evaluated with both on random fields of small stretched grids.
+
+    Parameters
+    ----------
+    rtol : float, optional
+        Tolerance on the relative errors.
+    seed : int, optional
+        Seed of the random fields.
+
+    Returns
+    -------
+    dict
+        Relative error of each comparison.
+
+    Raises
+    ------
+    ValueError
+        If an error is larger than rtol.
+
+    """
+    from . import shapes
+    from .flow import Field
+
+    rng = np.random.default_rng(seed)
+    errors = {}
+
+    def error(name, a, b):
+        a, b = (q.toarray() if sp.issparse(q) else np.asarray(q) for q in (a, b))
+        errors[name] = np.linalg.norm(a - b) / (np.linalg.norm(b) or 1.0)
+
+    # The kernels are called directly (the NumPy implementations with the numpy backend).
+    with using('numpy'):
+        x = np.cumsum(np.r_[0, 1 + 0.2 * rng.random(20)])
+        y = np.cumsum(np.r_[0, 1 + 0.2 * rng.random(18)])
+
+        for periodic in (False, True):
+            name = 'periodic' if periodic else 'walled'
+            fluid = Field(x - x.mean(), y - y.mean(), periodic)
+
+            u, v = rng.standard_normal(fluid.u.shape), rng.standard_normal(fluid.v.shape)
+            uBC = [rng.standard_normal(size) for size in fluid.u.shape[:1] * 2 + fluid.u.shape[1:] * (2 - 2 * periodic)]
+            vBC = [rng.standard_normal(size) for size in fluid.v.shape[:1] * 2 + fluid.v.shape[1:] * (2 - 2 * periodic)]
+
+            error(f'advection ({name})', np.r_[advection(fluid, u, v, uBC, vBC)],
+                  np.r_[fluid.advection(u, v, uBC, vBC)])
+
+            uc, vc = u + 1j * rng.standard_normal(u.shape), v + 1j * rng.standard_normal(v.shape)
+            error(f'advection ({name}, complex)', np.r_[advection(fluid, uc, vc, uBC, vBC)],
+                  np.r_[fluid.advection(uc, vc, uBC, vBC)])
+
+            # The NumPy implementation requires a multiple of 3 cells in periodic directions.
+            if not periodic or fluid.p.shape[0] % 3 == 0:
+                error(f'linearized_advection ({name})', linearized_advection(fluid, u, v),
+                      fluid.linearized_advection(u, v, uBC, vBC, test=False))
+
+        fluid = Field(np.linspace(-4, 4, 81), np.linspace(-4, 4, 81))
+        for function, numPoints in ((_delta.roma, _delta.romaNumPoints), (_delta.gauss, _delta.gaussNumPoints),
+                                    (_delta.bao6, _delta.bao6NumPoints)):
+            r = np.linspace(-numPoints - 1, numPoints + 1, 1001) * 0.1
+            for f in (function, _delta.derivatives[function]):
+                error(f'delta {f.__name__}', delta(f, r, 0.1), f(r, 0.1))
+
+            solid = shapes.cylinder('cylinder', 0.03, -0.02, 0.5, 0.1, function, numPoints)
+            for normalized in (True, False):
+                error(f'interpolation {function.__name__} (normalized={normalized})',
+                      interpolation(solid, fluid.u, normalized), solid.interpolation(fluid.u, normalized))
+
+            Eξ, Eη = solid.interpolation_derivative(fluid.v)
+            error(f'interpolation_derivative {function.__name__} (ξ)', interpolation(solid, fluid.v, derivative='ξ'), Eξ)
+            error(f'interpolation_derivative {function.__name__} (η)', interpolation(solid, fluid.v, derivative='η'), Eη)
+
+    failed = [name for name, value in errors.items() if not value <= rtol]
+    if failed:
+        raise ValueError("Kernels differ from the NumPy implementation: %s" %
+                         ", ".join(f"{name} ({errors[name]:.2e})" for name in failed))
+
+    return errors
@@ -0,0 +1,616 @@
+"""Monitors evaluated by `Solver.steps` after every time step."""
+
+import csv
+import json
+
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+
+from .growth import energy_weights
+
+
+class Monitor:
+    """Base class for monitors.
+
+    Monitors are passed to `Solver.steps`, which calls `start` before the first
+    time step, `update` after every time step and merges the dictionary returned
+    by `result` into its infodict. If `update` returns True, the time integration
+    stops. `Solver.steady_state` does the same with the Newton iterations.
+    """
+
+    def start(self, solver, number):
+        """Prepare for a time integration.
+
+        Parameters
+        ----------
+        solver : Solver
+            Flow solver.
+        number : int
+            Maximum number of time steps.
+
+        """
+        pass
+
+    def update(self, k, t, x, uBC, vBC, values):
+        """Process a time step.
+
+        Parameters
+        ----------
+        k : int
+            Time step (starting at 0 for every call to `Solver.steps`).
+        t : float
+            Time.
+        x : np.ndarray
+            State vector (packed). Must not be modified.
+        uBC : list
+            Boundary conditions on the horizontal velocity component.
+        vBC : list
+            Boundary conditions on the vertical velocity component.
+        values : dict
+            Values of the infodict at this time step (x_2, dxdt_2, forces...).
+
+        Returns
+        -------
+        bool
+            True if the time integration must stop.
+
+        """
+        return False
+
+    def result(self):
+        """Return dictionary with the results to be added to the infodict."""
+        return {}
+
+
+class SteadyState(Monitor):
+    """Stop when the solution reaches a steady state, i.e. dxdt_2/x_2 < tol.
+
+    Attributes
+    ----------
+    tol : float
+        Tolerance on the relative time derivative of the state vector.
+
+    """
+
+    def __init__(self, tol=1e-8):
+        self.tol = tol
+
+    def update(self, k, t, x, uBC, vBC, values):
+        return values['dxdt_2'] < self.tol * values['x_2']
+
+
+class LimitCycle(Monitor):
+    """Stop when a signal (e.g. the lift on a solid) becomes periodic.
+
+    The period is estimated online from the times of the maxima of the signal,
+    which are located by fitting a parabola to the three samples around each
+    local maximum. The signal is considered periodic when, over the last
+    `cycles` cycles, the period and the peak-to-peak amplitude change less than
+    `rtol` from one cycle to the next.
+
+    Attributes
+    ----------
+    signal : str
+        Name of the signal in the infodict (e.g. 'cylinder_fy').
+    rtol : float
+        Relative tolerance on the period and amplitude.
+    atol : float
+        Peak-to-peak amplitudes below `atol` are ignored (steady signals).
+    cycles : int
+        Number of consecutive converged cycles.
+
+    """
+
+    def __init__(self, signal, rtol=1e-3, atol=1e-6, cycles=3):
+        self.signal = signal
+        self.rtol, self.atol = rtol, atol
+        self.cycles = cycles
+
+    def start(self, solver, number):
+        self.samples = []
+        self.peaks, self.amplitudes = [], []
+        self.minimum = np.inf
+
+    def update(self, k, t, x, uBC, vBC, values):
+        self.samples = self.samples[-2:] + [(t, values[self.signal])]
+        if len(self.samples) < 3:
+            return False
+
+        (t0, s0), (t1, s1), (t2, s2) = self.samples
+        self.minimum = min(self.minimum, s1)
+
+        # Local maximum?
+        if not (s0 < s1 and s2 <= s1):
+            return False
+
+        # Vertex of the parabola through the last three samples.
+        a, b, c = np.polyfit([t0 - t1, 0, t2 - t1], [s0, s1, s2], 2)
+        tmax, smax = t1 - b / (2 * a), c - b ** 2 / (4 * a)
+
+        amplitude, self.minimum = smax - self.minimum, s1
+        if amplitude < self.atol:
+            return False
+
+        self.peaks.append(tmax)
+        self.amplitudes.append(amplitude)
+
+        if len(self.peaks) < self.cycles + 2:
+            return False
+
+        T = np.diff(self.peaks[-self.cycles - 2:])
+        A = np.asarray(self.amplitudes[-self.cycles - 1:])
+
+        return (np.all(np.abs(np.diff(T)) < self.rtol * T[1:]) and
+                np.all(np.abs(np.diff(A)) < self.rtol * A[1:]))
+
+    def result(self):
+        T = self.peaks[-1] - self.peaks[-2] if len(self.peaks) > 1 else np.nan
+        A = self.amplitudes[-1] if self.amplitudes else np.nan
+
+        return {'period': T, 'frequency': 1 / T, 'amplitude': A}
+
+
+def _centers(solver, u, v, uBC, vBC):
+    """Return velocity components interpolated to the cell centers (pressure points)."""
+    u = np.hstack([uBC[0][:, np.newaxis], u, uBC[1][:, np.newaxis]])
+    if not solver.periodic:
+        v = np.vstack([vBC[2][np.newaxis, :], v, vBC[3][np.newaxis, :]])
+    else:
+        v = np.vstack([v, v[:1, :]])
+
+    return 0.5 * (u[:, 1:] + u[:, :-1]), 0.5 * (v[1:, :] + v[:-1, :])
+
+
+class Statistics(Monitor):
+    """Running mean and variance of the flow field and forces.
+
+    Mean values, variances and the covariance of the velocity components
+    (Reynolds stresses) are updated in place with Welford's algorithm, i.e.
+    snapshots are not stored. The covariance of u and v requires both components
+    at the same points, hence it is only computed if `centers` is True.
+
+    Results are stored in the infodict as a dictionary `{name}` with keys mean
+    and variance (dictionaries with u, v, p and forces), uv (covariance) and
+    samples (number of samples).
+
+    Attributes
+    ----------
+    centers : bool
+        Interpolate velocity components to the cell centers.
+    every : int
+        Sampling interval (time steps).
+    name : str
+        Name of the results in the infodict.
+
+    """
+
+    def __init__(self, centers=False, every=1, name='statistics'):
+        self.centers, self.every, self.name = centers, every, name
+
+    def start(self, solver, number):
+        self.solver = solver
+        self.samples = 0
+        self.mean, self.m2, self.δ = {}, {}, {}
+        self.uv = np.zeros(solver.fluid.p.shape) if self.centers else None
+
+    def fields(self, x, uBC, vBC, values):
+        """Return the sampled fields."""
+        u, v, p = self.solver.reshape(*self.solver.unpack(x))[:3]
+        if self.centers:
+            u, v = _centers(self.solver, u, v, uBC, vBC)
+
+        fields = {'u': u, 'v': v, 'p': p}
+        for solid in self.solver.solids:
+            for component in ('fx', 'fy'):
+                name = f'{solid.name}_{component}'
+                fields[name] = np.asarray(values[name], dtype=float)
+
+        return fields
+
+    def update(self, k, t, x, uBC, vBC, values):
+        if k % self.every:
+            return False
+
+        fields = self.fields(x, uBC, vBC, values)
+
+        if not self.samples:
+            for key, value in fields.items():
+                self.mean[key], self.m2[key], self.δ[key] = (np.zeros_like(value) for _ in range(3))
+
+        self.samples += 1
+
+        for key, value in fields.items():
+            mean, δ = self.mean[key], self.δ[key]
+
+            np.subtract(value, mean, out=δ)
+            mean += δ / self.samples
+            self.m2[key] += δ * (value - mean)
+
+        if self.centers:
+            self.uv += self.δ['u'] * (fields['v'] - self.mean['v'])
+
+        return False
+
+    def result(self):
+        n = max(self.samples, 1)
+
+        result = {'mean': self.mean,
+                  'variance': {key: value / n for key, value in self.m2.items()},
+                  'samples': self.samples}
+        if self.centers:
+            result['uv'] = self.uv / n
+
+        return {self.name: result}
+
+
+def line(start, end, number):
+    """Return coordinates of equispaced points on a segment (see `Probes`).
+
+    Parameters
+    ----------
+    start : tuple
+        First point (x, y).
+    end : tuple
+        Last point (x, y).
+    number : int
+        Number of points.
+
+    Returns
+    -------
+    x : np.ndarray
+        First coordinate of the points.
+    y : np.ndarray
+        Second coordinate of the points.
+
+    """
+    s = np.linspace(0, 1, number)
+    return start[0] + s * (end[0] - start[0]), start[1] + s * (end[1] - start[1])
+
+
+class Probes(Monitor):
+    """Time series of the flow field at a set of points.
+
+    The values at the points are obtained by bilinear interpolation on the
+    staggered grid of each field (see `FieldInfo.interpolation`). The
+    interpolation matrices are stacked into a single sparse matrix acting on the
+    packed state vector, hence each sample costs one sparse matrix-vector
+    product. Samples are stored in a buffer preallocated for the maximum
+    number of time steps.
+
+    Results are arrays of shape (samples, points) named `{name}_{field}` in the
+    infodict.
+
+    Attributes
+    ----------
+    x : np.ndarray
+        First coordinate of the points (e.g. computed with `line`).
+    y : np.ndarray
+        Second coordinate of the points.
+    fields : tuple
+        Sampled fields ('u', 'v' and/or 'p').
+    every : int
+        Sampling interval (time steps).
+    name : str
+        Prefix of the results in the infodict.
+
+    """
+
+    def __init__(self, x, y, fields=('u', 'v', 'p'), every=1, name='probes'):
+        self.x, self.y = np.ravel(x), np.ravel(y)
+        self.fields, self.every, self.name = tuple(fields), every, name
+
+    def start(self, solver, number):
+        fluid, n = solver.fluid, solver.zero().size
+        offsets = {'u': 0, 'v': fluid.u.size, 'p': solver.pStart - 1}
+
+        blocks = []
+        for field in self.fields:
+            E = getattr(fluid, field).interpolation(self.x, self.y).tocoo()
+            # The pressure at the first cell is zero (not stored).
+            keep = E.col > 0 if field == 'p' else np.ones(E.nnz, dtype=bool)
+            blocks.append(sp.csr_matrix((E.data[keep], (E.row[keep], E.col[keep] + offsets[field])),
+                                        shape=(E.shape[0], n)))
+
+        self.P = sp.vstack(blocks, format='csr')
+        self.buffer = np.empty((-(-number // self.every), self.P.shape[0]))
+        self.samples = 0
+
+    def update(self, k, t, x, uBC, vBC, values):
+        if not k % self.every:
+            self.buffer[self.samples] = self.P @ x
+            self.samples += 1
+        return False
+
+    def result(self):
+        values = np.split(self.buffer[:self.samples], len(self.fields), axis=1)
+        return {f'{self.name}_{field}': value for field, value in zip(self.fields, values)}
+
+
+def _orthogonalize(Q, z):
+    """Return coefficients and residual of z with respect to the orthonormal columns of Q."""
+    c = Q.T @ z
+    r = z - Q @ c
+
+    # Second pass of Gram-Schmidt to keep the columns of Q orthonormal.
+    δc = Q.T @ r
+    return c + δc, r - Q @ δc
+
+
+class _Modal(Monitor):
+    """Base class for modal decompositions of the velocity field.
+
+    Snapshots (every `every` time steps) are weighted by the square root of the
+    area of the cells, so that the Euclidean inner product of weighted snapshots
+    is the kinetic energy inner product. Only bases whose dimension is at most
+    `rank` (plus one) are stored, i.e. memory does not grow with the number of
+    snapshots.
+    """
+
+    def __init__(self, rank=10, every=1, tol=1e-10, name=None):
+        self.rank, self.every, self.tol = rank, every, tol
+        self.name = name or type(self).__name__.lower()
+
+    def start(self, solver, number):
+        self.shapes = solver.fluid.u.shape, solver.fluid.v.shape
+        self.sW = np.sqrt(energy_weights(solver))
+        self.Q = np.empty((self.sW.size, 0))
+
+    def sample(self, k, x):
+        """Return weighted velocity field if the time step k is sampled (None otherwise)."""
+        return None if k % self.every else self.sW * x[:self.sW.size]
+
+    def modes(self, Φ):
+        """Return the (unweighted) modes in the columns of Φ as (u, v) fields."""
+        Φ = Φ / self.sW[:, np.newaxis]
+        uSize = np.prod(self.shapes[0])
+        return [(φ[:uSize].reshape(self.shapes[0]), φ[uSize:].reshape(self.shapes[1])) for φ in Φ.T]
+
+
+class POD(_Modal):
+    """Proper orthogonal decomposition of the velocity field (incremental SVD).
+
+    The rank-truncated SVD of the matrix of weighted snapshots is updated with
+    every new snapshot (Brand, Linear Algebra Appl., 2006); right singular
+    vectors (temporal coefficients) are not stored. Snapshots are not
+    centered, i.e. the first mode approximates the mean flow.
+
+    Results are the POD eigenvalues (energy of each mode, `{name}_values`) and
+    modes (`{name}_modes`, list of (u, v) fields with unit energy).
+
+    Attributes
+    ----------
+    rank : int
+        Number of retained modes.
+    every : int
+        Sampling interval (time steps).
+    tol : float
+        Snapshots whose (relative) component orthogonal to the current modes is
+        below `tol` do not add new directions.
+    name : str
+        Prefix of the results in the infodict.
+
+    """
+
+    def start(self, solver, number):
+        super().start(solver, number)
+        self.S = np.empty(0)
+
+    def update(self, k, t, x, uBC, vBC, values):
+        z = self.sample(k, x)
+        if z is None:
+            return False
+
+        c, r = _orthogonalize(self.Q, z)
+        ρ = la.norm(r)
+
+        K = np.c_[np.diag(self.S), c]
+        if ρ > self.tol * la.norm(z):
+            K = np.r_[K, np.zeros((1, K.shape[1]))]
+            K[-1, -1] = ρ
+            self.Q = np.c_[self.Q, r / ρ]
+
+        U, S = la.svd(K, full_matrices=False)[:2]
+        self.Q, self.S = self.Q @ U[:, :self.rank], S[:self.rank]
+
+        return False
+
+    def result(self):
+        return {f'{self.name}_values': self.S ** 2,
+                f'{self.name}_modes': self.modes(self.Q)}
+
+
+class DMD(_Modal):
+    """Streaming dynamic mode decomposition of the velocity field.
+
+    The (projected) DMD of pairs of consecutive snapshots x -> y is computed
+    from the matrices A = Σ ỹ x̃^T, G = Σ x̃ x̃^T and H = Σ ỹ ỹ^T, where x̃ and
+    ỹ are the coordinates of the weighted snapshots on an orthonormal basis
+    that is extended with every new snapshot. When its dimension exceeds
+    `rank`, the basis is compressed to the leading eigenvectors of H (Hemati,
+    Williams & Rowley, Phys. Fluids, 2014). Snapshots must be equispaced in
+    time.
+
+    Results are the DMD eigenvalues (`{name}_eigenvalues`), continuous-time
+    exponents (`{name}_exponents`, growth rate + i angular frequency) and modes
+    (`{name}_modes`, list of complex (u, v) fields with unit energy), which
+    are empty if fewer than two snapshots were sampled.
+
+    Attributes
+    ----------
+    rank : int
+        Dimension of the basis.
+    every : int
+        Sampling interval (time steps).
+    tol : float
+        Snapshots whose (relative) component orthogonal to the basis is below
+        `tol` do not extend it.
+    name : str
+        Prefix of the results in the infodict.
+
+    """
+
+    def start(self, solver, number):
+        super().start(solver, number)
+        self.A, self.G, self.H = (np.empty((0, 0)) for _ in range(3))
+        self.x, self.t, self.Δt = None, None, np.nan
+
+    def extend(self, z):
+        """Extend the basis with the component of z orthogonal to it."""
+        r = _orthogonalize(self.Q, z)[1]
+        ρ = la.norm(r)
+
+        if ρ > self.tol * la.norm(z):
+            self.Q = np.c_[self.Q, r / ρ]
+            self.A, self.G, self.H = (np.pad(M, ((0, 1), (0, 1))) for M in (self.A, self.G, self.H))
+
+    def update(self, k, t, x, uBC, vBC, values):
+        z = self.sample(k, x)
+        if z is None:
+            return False
+
+        self.extend(z)
+
+        if self.x is not None:
+            a, b = self.Q.T @ self.x, self.Q.T @ z
+            self.A += np.outer(b, a)
+            self.G += np.outer(a, a)
+            self.H += np.outer(b, b)
+            self.Δt = t - self.t
+
+            # Compress the basis.
+            if self.Q.shape[1] > self.rank:
+                V = la.eigh(self.H)[1][:, ::-1][:, :self.rank]
+                self.Q = self.Q @ V
+                self.A, self.G, self.H = (V.T @ M @ V for M in (self.A, self.G, self.H))
+
+        self.x, self.t = z, t
+
+        return False
+
+    def result(self):
+        # Fewer than two snapshots: no pairs.
+        if np.isnan(self.Δt):
+            return {f'{self.name}_eigenvalues': np.empty(0, dtype=complex),
+                    f'{self.name}_exponents': np.empty(0, dtype=complex),
+                    f'{self.name}_modes': []}
+
+        μ, w = la.eig(self.A @ la.pinv(self.G))
+        order = np.argsort(-np.abs(μ))
+        μ, w = μ[order], w[:, order]
+
+        return {f'{self.name}_eigenvalues': μ,
+                f'{self.name}_exponents': np.log(μ.astype(complex)) / self.Δt,
+                f'{self.name}_modes': self.modes(self.Q @ w)}
+
+
+class Callback(Monitor):
+    """Call a function every `every` time steps (or Newton iterations).
+
+    The function is called as `function(k, t, x, values, profile)`, where k is
+    the time step (starting at 0), x a read-only view of the state vector,
+    values those of the infodict at this time step and profile the `Profile` of
+    the run (see `ibmos.profiling`). If it returns True, the time integration
+    stops.
+
+    Attributes
+    ----------
+    function : callable
+        Function to call.
+    every : int
+        Interval (time steps).
+
+    """
+
+    def __init__(self, function, every=1):
+        self.function, self.every = function, every
+
+    def start(self, solver, number):
+        self.solver = solver
+
+    def update(self, k, t, x, uBC, vBC, values):
+        if (k + 1) % self.every:
+            return False
+        return bool(self.function(k, t, x, values, self.solver.profile))
+
+
+class _Logger(Monitor):
+    """Base class for loggers of the values of the infodict.
+
+    Rows (every `every` time steps) contain the time step k (starting at 1, as
+    printed by `Solver.steps`), the time t (empty for Newton iterations), the values of the infodict at this
+    time step and, if `profile` is True, the times and counters of the profile
+    of the run so far (see `Profile.as_dict`). The file is flushed after every
+    row and closed at the end of the run.
+    """
+
+    def __init__(self, filename, every=1, profile=False):
+        self.filename, self.every, self.profile = filename, every, profile
+
+    def start(self, solver, number):
+        self.solver = solver
+        self.file = open(self.filename, 'w', newline='')
+
+    def row(self, k, t, values):
+        """Return the row of time step k."""
+        row = {'k': k + 1, 't': None if np.isnan(t) else float(t)}
+        row.update((key, float(value)) for key, value in values.items())
+        if self.profile:
+            row.update(self.solver.profile.as_dict())
+        return row
+
+    def update(self, k, t, x, uBC, vBC, values):
+        if (k + 1) % self.every == 0:
+            self.write(self.row(k, t, values))
+            self.file.flush()
+        return False
+
+    def result(self):
+        self.file.close()
+        return {}
+
+
+class CSVLogger(_Logger):
+    """Write the values of the infodict to a CSV file.
+
+    Columns are those of the first row (phases of the profile that first appear
+    later are not written).
+
+    Attributes
+    ----------
+    filename : str
+        CSV file.
+    every : int
+        Interval (time steps).
+    profile : bool
+        Include the times and counters of the profile.
+
+    """
+
+    def start(self, solver, number):
+        super().start(solver, number)
+        self.writer = None
+
+    def write(self, row):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(row), extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow(row)
+
+
+class JSONLogger(_Logger):
+    """Write the values of the infodict to a JSON lines file (one object per row).
+
+    Attributes
+    ----------
+    filename : str
+        JSON lines file.
+    every : int
+        Interval (time steps).
+    profile : bool
+        Include the times and counters of the profile.
+
+    """
+
+    def write(self, row):
+        self.file.write(json.dumps(row) + '\n')
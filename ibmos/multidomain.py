@@ -0,0 +1,297 @@
+"""Multi-domain technique: nested grids of increasing size for far-field boundaries.
+
+The domain is covered by a hierarchy of grids with the same number of cells,
+each one twice as large as the previous one and centered on the same point
+(Colonius & Taira, Comput. Methods Appl. Mech. Engrg., 2008). The immersed
+boundaries are resolved by the finest grid, and their forces act on the
+coarser grids as a body force (see `MultiDomain.set_solids`). The physical
+boundary conditions are imposed on the coarsest grid. At every time step the
+grids are advanced from the coarsest to the finest: the velocity on the
+boundaries of each grid is interpolated from the next coarser grid before
+(explicit terms) and after (implicit terms) advancing it, and the solution
+of each grid then replaces that of the next coarser grid in the region where
+they overlap. Grids are not periodic.
+"""
+
+from itertools import chain
+
+import numpy as np
+import scipy.sparse as sp
+
+from .profiling import Profile
+from .solver import Solver
+
+
+def _interpolation(solver, name, xp, yp):
+    """Return interpolation matrix from the velocity field (first solver.pStart entries of the
+    state vector) to the points (xp, yp) of component u or v."""
+    E = getattr(solver.fluid, name).interpolation(xp, yp).tocoo()
+    offset = 0 if name == 'u' else solver.fluid.u.size
+    return sp.csr_matrix((E.data, (E.row, E.col + offset)), shape=(E.shape[0], solver.pStart))
+
+
+def _boundary_points(fluid):
+    """Return coordinates of the boundary values of u and v (see `Solver.zero_boundary_conditions`)."""
+    x, y, xc, yc = fluid.x, fluid.y, fluid.xc, fluid.yc
+
+    u = [(np.full_like(yc, x[0]), yc), (np.full_like(yc, x[-1]), yc),
+         (x[1:-1], np.full_like(x[1:-1], y[0])), (x[1:-1], np.full_like(x[1:-1], y[-1]))]
+    v = [(np.full_like(y[1:-1], x[0]), y[1:-1]), (np.full_like(y[1:-1], x[-1]), y[1:-1]),
+         (xc, np.full_like(xc, y[0])), (xc, np.full_like(xc, y[-1]))]
+
+    return u, v
+
+
+class MultiDomain:
+    """Hierarchy of nested grids, each one advanced by its own `Solver`.
+
+    Level 0 is the finest grid (given by the user) and level l is obtained by
+    scaling it by 2**l about its center. All levels share the time step of the
+    finest one, hence each level builds and factorizes its propagator once
+    (see `Solver.cached_propagator`) and reuses it at every time step.
+
+    Attributes
+    ----------
+    levels : list
+        Flow solver of each level (finest first).
+    transfer : list
+        Interpolation matrices from the velocity field of level l+1 to
+        the boundary conditions of level l (stacked uW, uE, uS, uN, vW, vE, vS, vN).
+    restriction : list
+        Indices of the velocity unknowns of level l+1 inside level l and
+        interpolation matrix from the velocity field of level l to them.
+    spreading : list
+        Matrices that spread the forces on the immersed boundaries (of the
+        finest grid) onto the velocity unknowns of level l+1 (see `set_solids`).
+
+    """
+
+    def __init__(self, x, y, levels=3, iRe=1.0, Co=0.5, fractionalStep=False, margin=12, **kwargs):
+        """Initialize the hierarchy of grids.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Coordinates of the vertices of the finest grid (x direction).
+        y : np.ndarray
+            Coordinates of the vertices of the finest grid (y direction).
+        levels : int, optional
+            Number of grids.
+        iRe : float, optional
+            Inverse of the Reynolds number.
+        Co : float, optional
+            Courant number (on the finest grid).
+        fractionalStep : bool, optional
+            Fractional Step Method flag.
+        margin : int, optional
+            Width (in cells of the finer grid) of the band along the boundary
+            of each grid whose solution does not replace that of the next
+            coarser grid (see `restrict`).
+        kwargs : dict, optional
+            Other options of `Solver` (e.g. solver and cache).
+
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        xm, ym = 0.5 * (x[0] + x[-1]), 0.5 * (y[0] + y[-1])
+
+        self.levels = [Solver(xm + 2 ** l * (x - xm), ym + 2 ** l * (y - ym), iRe, Co,
+                              fractionalStep=fractionalStep, **kwargs)
+                       for l in range(levels)]
+        self.set_dt(self.levels[0].dt)
+        self.spreading = [None] * (levels - 1)
+
+        self.transfer, self.restriction = [], []
+        for fine, coarse in zip(self.levels[:-1], self.levels[1:]):
+            u, v = _boundary_points(fine.fluid)
+            self.transfer.append(sp.vstack([_interpolation(coarse, 'u', *points) for points in u] +
+                                           [_interpolation(coarse, 'v', *points) for points in v],
+                                           format='csr'))
+            self.restriction.append(self._restriction(fine, coarse, margin))
+
+    @staticmethod
+    def _restriction(fine, coarse, margin):
+        """Return indices of the velocity of `coarse` inside `fine` and interpolation matrix to them.
+
+        Coarse points closer than `margin` fine cells to the boundary of the
+        fine grid are excluded.
+        """
+        margin *= max(np.max(fine.fluid.p.dx), np.max(fine.fluid.p.dy))
+        x0, x1, y0, y1 = fine.fluid.x[0] + margin, fine.fluid.x[-1] - margin, \
+            fine.fluid.y[0] + margin, fine.fluid.y[-1] - margin
+
+        indices, blocks = [], []
+        for name in ('u', 'v'):
+            info = getattr(coarse.fluid, name)
+            xp, yp = (xy.ravel() for xy in np.meshgrid(info.x, info.y))
+            inside = (x0 < xp) & (xp < x1) & (y0 < yp) & (yp < y1)
+
+            blocks.append(_interpolation(fine, name, xp[inside], yp[inside]))
+            indices.append(np.flatnonzero(inside) + (0 if name == 'u' else coarse.fluid.u.size))
+
+        return np.concatenate(indices), sp.vstack(blocks, format='csr')
+
+    def set_dt(self, dt):
+        """Set time step of all the levels."""
+        for solver in self.levels:
+            solver.set_dt(dt)
+
+    def set_solids(self, *solids):
+        """Set immersed boundaries.
+
+        The solids are immersed in the finest grid only. The coarser grids
+        feel them through the forces of the finest grid at the previous time
+        step, spread onto them as a body force (see `Solver.steps`), which
+        carries the far field of the body (e.g. its displacement) beyond the
+        finest grid.
+        """
+        self.levels[0].set_solids(*solids)
+        self.spreading = [sp.vstack([sp.block_diag((solid.interpolation(solver.fluid.u),
+                                                    solid.interpolation(solver.fluid.v)))
+                                     for solid in solids], format='csr').T.tocsr() if solids else None
+                          for solver in self.levels[1:]]
+
+    def zero(self):
+        """Return zero state vectors of all the levels (finest first)."""
+        return [solver.zero() for solver in self.levels]
+
+    def zero_boundary_conditions(self):
+        """Return zero boundary conditions (of the coarsest grid)."""
+        return self.levels[-1].zero_boundary_conditions()
+
+    def boundary_conditions(self, l, x):
+        """Return boundary conditions of level l interpolated from the state vector x of level l+1.
+
+        Parameters
+        ----------
+        l : int
+            Level.
+        x : np.ndarray
+            Packed state vector of level l+1.
+
+        Returns
+        -------
+        uBC : list
+            Boundary conditions on the horizontal velocity component (uW, uE, uS, uN).
+        vBC : list
+            Boundary conditions on the vertical velocity component (vW, vE, vS, vN).
+
+        """
+        sizes = [bc.size for bc in chain(*self.levels[l].zero_boundary_conditions())]
+        bc = np.split(self.transfer[l] @ x[:self.levels[l + 1].pStart], np.cumsum(sizes)[:-1])
+        return bc[:4], bc[4:]
+
+    def restrict(self, x):
+        """Replace the solution of each level by that of the finer one where they overlap (in-place).
+
+        Parameters
+        ----------
+        x : list
+            Packed state vectors of all the levels (finest first).
+
+        """
+        for l, (indices, R) in enumerate(self.restriction):
+            x[l + 1][indices] = R @ x[l][:self.levels[l].pStart]
+
+    def steps(self, x, uBC, vBC, sBC=(), outflowEast=False, number=1, saveEvery=None, verbose=1,
+              Nm1=None, t0=0.0, profile=None):
+        """Time-step the governing equations on all the levels.
+
+        Parameters
+        ----------
+        x : list
+            Initial condition: packed state vectors of all the levels (finest
+            first), see `zero`.
+        uBC : list
+            Boundary conditions on the horizontal velocity component (coarsest grid).
+        vBC : list
+            Boundary conditions on the vertical velocity component (coarsest grid).
+        sBC : list, optional
+            Velocity on the immersed boundaries (of the finest grid).
+        outflowEast : bool, optional
+            East boundary of the coarsest grid has outflow boundary condition.
+        number : int, optional
+            Number of time steps.
+        saveEvery : int, optional
+            Specify how often flow fields are stored. By default, only the
+            last ones are returned.
+        verbose : int, optional
+            Specify how often the forces on the immersed boundaries are displayed.
+        Nm1 : list, optional
+            Advection terms at the previous time step of each level (e.g.
+            infodict['Nm1'] of a previous call). By default, the first step is
+            performed using explicit Euler method.
+        t0 : float, optional
+            Time at the initial condition.
+        profile : Profile, optional
+            Profile where the phases of all the levels are accumulated (see
+            `Solver.steps`). By default, a new one.
+
+        Returns
+        -------
+        xres : list
+            Flow fields of each level sampled every saveEvery steps.
+        tres : np.ndarray
+            Time.
+        infodict : dict
+            Time, forces on the immersed boundaries, advection terms at the
+            last time step of each level (Nm1) and profile.
+
+        """
+        profile = Profile() if profile is None else profile
+        saveEvery = number if saveEvery is None else saveEvery
+
+        x = [xl.copy() for xl in x]
+        Nm1 = [None] * len(self.levels) if Nm1 is None else list(Nm1)
+
+        header = ['t'] + [f'{solid.name}_{component}' for solid in self.levels[0].solids
+                          for component in ('fx', 'fy')]
+        infodict = dict(zip(header, (np.empty(number) for _ in header)))
+
+        if verbose:
+            print("       k", "".join((f'{elem:>12} ' for elem in header)))
+
+        xres, tres = [[] for _ in self.levels], []
+        t = float(t0)
+        for k in range(number):
+            # Boundary conditions at the current time step (before advancing the coarser grids).
+            bc0 = [self.boundary_conditions(l, x[l + 1]) for l in range(len(self.levels) - 1)]
+            bc0.append((None, None))
+
+            # Forces on the immersed boundaries at the current time (body force on the coarser grids).
+            f = x[0][self.levels[0].pEnd:]
+
+            # From the coarsest to the finest grid.
+            for l in reversed(range(len(self.levels))):
+                solver = self.levels[l]
+                bc = (uBC, vBC) if l == len(self.levels) - 1 else self.boundary_conditions(l, x[l + 1])
+                S = self.spreading[l - 1] if l else None
+
+                x[l], _, info = solver.steps(x[l], *bc, sBC if l == 0 else (),
+                                             outflowEast and l == len(self.levels) - 1, number=1,
+                                             verbose=0, Nm1=Nm1[l], t0=t, profile=profile,
+                                             uBC0=bc0[l][0], vBC0=bc0[l][1],
+                                             forcing=None if S is None else -(S @ f))
+                Nm1[l] = info['Nm1']
+
+                if l == 0:
+                    for key in header[1:]:
+                        infodict[key][k] = info[key][-1]
+
+            with profile.phase('restriction'):
+                self.restrict(x)
+
+            t += self.levels[0].dt
+            infodict['t'][k] = t
+
+            if verbose and (k + 1) % verbose == 0:
+                print(f"{k+1:8}", "".join((f'{infodict[elem][k]: 12.5e} ' for elem in header)))
+
+            if (k + 1) % saveEvery == 0:
+                for xl, res in zip(x, xres):
+                    res.append(xl.copy())
+                tres.append(t)
+
+        infodict['Nm1'] = Nm1
+        infodict['profile'] = profile
+
+        return [np.squeeze(res) for res in xres], np.squeeze(tres), infodict
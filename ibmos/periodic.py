@@ -0,0 +1,255 @@
+"""Periodic orbits by Newton-Krylov shooting."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.linalg as la
+
+from .monitors import Monitor
+
+
+class _Derivative(Monitor):
+    """Keep the time derivative of the state vector at the last time step."""
+
+    def start(self, solver, number):
+        self.x, self.t = None, None
+
+    def update(self, k, t, x, uBC, vBC, values):
+        if self.x is not None:
+            self.derivative = (x - self.x) / (t - self.t)
+        self.x, self.t = x, t
+        return False
+
+
+def period_map(solver, q, T, number, uBC, vBC, sBC=()):
+    """Integrate the governing equations over a period.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver. Its time step is set to T/number during the integration,
+        and then restored (see `Solver.set_dt`). The propagators of the
+        period map are kept but are the first to be evicted from the cache.
+    q : np.ndarray
+        Velocity field (first solver.pStart entries of the state vector).
+    T : float
+        Period.
+    number : int
+        Number of time steps per period.
+    uBC : list
+        Boundary conditions on the horizontal velocity component.
+    vBC : list
+        Boundary conditions on the vertical velocity component.
+    sBC : list, optional
+        Velocity on the immersed boundaries.
+
+    Returns
+    -------
+    x : np.ndarray
+        State vector (packed) at time T.
+    dxdt : np.ndarray
+        Time derivative of the state vector at time T.
+
+    Raises
+    ------
+    KeyboardInterrupt
+        The integration was interrupted (see `Solver.steps`).
+
+    """
+
+    dt, dtLevels, cacheSize = solver.dt, solver.dtLevels, solver.cacheSize
+    keys = list(solver.propagators)
+
+    # One more level in the cache, so that the propagators of the caller are not evicted.
+    solver.set_dt(T / number, cacheSize=max(cacheSize, 1) + 1)
+
+    x = solver.zero()
+    x[:solver.pStart] = q
+
+    derivative = _Derivative()
+    try:
+        x, _, info = solver.steps(x, uBC, vBC, sBC, number=number, verbose=0, monitors=[derivative])
+    finally:
+        solver.dt, solver.dtLevels, solver.cacheSize = dt, dtLevels, cacheSize
+        for key in keys:
+            if key in solver.propagators:
+                solver.propagators.move_to_end(key)
+
+    # Solver.steps returns the state at the interruption.
+    if info['t'].size < number:
+        raise KeyboardInterrupt
+
+    return x, derivative.derivative
+
+
+# Flow solver and boundary conditions used by the worker processes.
+_worker = None
+
+
+def _initialize_worker(*args):
+    global _worker
+    _worker = args
+
+
+def _worker_period_map(q, T):
+    solver, number, uBC, vBC, sBC = _worker
+    return period_map(solver, q, T, number, uBC, vBC, sBC)[0][:solver.pStart]
+
+
+def periodic_orbit(solver, x0, T0, uBC, vBC, sBC=(), number=100, xtol=1e-8, ftol=1e-8,
+                   maxit=15, krylov=40, rtol=1e-3, ε=1e-7, multipliers=6, workers=None,
+                   verbose=True):
+    """Compute periodic orbit using Newton-Krylov shooting.
+
+    The unknowns are the velocity field q at a point of the orbit and the period
+    T, which are found by solving Φ(q, T) - q = 0, where Φ is the period map
+    (see `period_map`), together with the phase condition f·δq = 0, where f is
+    the time derivative of the state vector.
+
+    The Newton corrections are computed by minimizing the residual of the
+    linearized equations over a block Krylov subspace of the monodromy matrix
+    M = ∂Φ/∂q, whose products with vectors are approximated by finite
+    differences. Each block requires as many (independent) integrations as the
+    block size, which run concurrently in a process pool if `workers` is
+    provided. Since the time step is the same for all of them, each process
+    factorizes the propagator once per Newton iteration.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver. Its time step settings are unchanged on return (see
+        `period_map`).
+    x0 : np.ndarray
+        Initial guess (packed state vector) at a point of the orbit.
+    T0 : float
+        Initial guess of the period.
+    uBC : list
+        Boundary conditions on the horizontal velocity component.
+    vBC : list
+        Boundary conditions on the vertical velocity component.
+    sBC : list, optional
+        Velocity on the immersed boundaries.
+    number : int, optional
+        Number of time steps per period.
+    xtol : float, optional
+        Tolerance on the solution |δq|_2/|q|_2.
+    ftol : float, optional
+        Tolerance on the function |Φ(q) - q|_2/|q|_2.
+    maxit : int, optional
+        Maximum number of Newton iterations.
+    krylov : int, optional
+        Maximum dimension of the Krylov subspace.
+    rtol : float, optional
+        Relative tolerance of the linearized equations.
+    ε : float, optional
+        Relative size of the perturbations in the finite differences.
+    multipliers : int, optional
+        Number of Floquet multipliers returned.
+    workers : int, optional
+        Number of processes. By default, integrations are performed
+        sequentially in the current process.
+    verbose : bool, optional
+        Enable verbose output.
+
+    Returns
+    -------
+    x : np.ndarray
+        State vector (packed) at a point of the periodic orbit. If
+        interrupted, the last one computed (x0 before the first period map).
+    T : float
+        Period of the orbit through x, i.e. x = Φ(q, T) for the last
+        iterate q (T0 with x0).
+    infodict : dict
+        Information on the performed iterations (residual_x, residual_f and
+        period) and leading Floquet multipliers (Ritz values of the monodromy
+        matrix on the Krylov subspace of the last iteration).
+
+    """
+
+    q, T = x0[:solver.pStart].copy(), T0
+    x, Tx = x0.copy(), T0
+    block = workers or 1
+    V, W = np.empty((q.size, 0)), np.empty((q.size, 0))
+
+    header = ['residual_x', 'residual_f', 'period']
+    infodict = dict(zip(header, ([] for _ in header)))
+
+    if verbose:
+        print("   k", "".join((f'{elem:>12} ' for elem in header)))
+
+    pool = ProcessPoolExecutor(workers, initializer=_initialize_worker,
+                               initargs=(solver, number, uBC, vBC, sBC)) if workers else None
+
+    def monodromy(V, Φq, T):
+        """Return M V by finite differences (one integration per column)."""
+        h = ε * max(la.norm(q), 1.0)
+        Q = [q + h * v for v in V.T]
+        if pool:
+            Φ = pool.map(_worker_period_map, Q, [T] * len(Q))
+        else:
+            Φ = (period_map(solver, qk, T, number, uBC, vBC, sBC)[0][:solver.pStart] for qk in Q)
+        return np.column_stack([(Φk - Φq) / h for Φk in Φ])
+
+    try:
+        for k in range(maxit):
+            xk, f = period_map(solver, q, T, number, uBC, vBC, sBC)
+            x, Tx = xk, T
+            Φq, f = x[:solver.pStart], f[:solver.pStart]
+            r = Φq - q
+
+            # Block Krylov subspace V (orthonormal columns) and W = M V.
+            S = np.column_stack([r, f] + [np.random.random(q.shape) for _ in range(block - 2)])
+            V, W = np.empty((q.size, 0)), np.empty((q.size, 0))
+            Vk = la.qr(S[:, :block], mode='economic')[0]
+
+            while True:
+                V, W = np.hstack([V, Vk]), np.hstack([W, monodromy(Vk, Φq, T)])
+
+                # Minimize |[(M - I) V y + f δT + r; f·V y]|_2
+                G = np.block([[W - V, f[:, np.newaxis]], [f @ V, 0]])
+                y = la.lstsq(G, -np.r_[r, 0])[0]
+                residual = la.norm(G @ y + np.r_[r, 0]) / la.norm(r)
+
+                if residual < rtol or V.shape[1] + block > krylov:
+                    break
+
+                # Next block: orthogonalize M Vk against the subspace (twice).
+                Vk = W[:, -Vk.shape[1]:]
+                for _ in range(2):
+                    Vk = Vk - V @ (V.T @ Vk)
+                Vk = la.qr(Vk, mode='economic')[0]
+
+            δq, δT = V @ y[:-1], y[-1]
+
+            infodict['residual_x'].append(la.norm(δq) / la.norm(q))
+            infodict['residual_f'].append(la.norm(r) / la.norm(q))
+            infodict['period'].append(T)
+
+            if verbose:
+                print(f"{k+1:4}", "".join((f'{infodict[elem][k]: 12.5e} ' for elem in header)))
+
+            if infodict['residual_f'][-1] < ftol:
+                break
+
+            q, T = q + δq, T + δT
+
+            if infodict['residual_x'][-1] < xtol:
+                x, Tx = period_map(solver, q, T, number, uBC, vBC, sBC)[0], T
+                break
+        else:
+            x, Tx = period_map(solver, q, T, number, uBC, vBC, sBC)[0], T
+            if verbose:
+                print("Warning: maximum number of iterations reached (maxit=%d)" % maxit)
+    except KeyboardInterrupt:
+        print("Interrupting at iteration number", k)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    infodict.update((key, np.asarray(value)) for key, value in infodict.items())
+
+    # Floquet multipliers: Ritz values of M on the Krylov subspace.
+    μ = la.eigvals(V.T @ W) if V.size else np.empty(0)
+    infodict['multipliers'] = μ[np.argsort(-np.abs(μ))][:multipliers]
+
+    return x, Tx, infodict
@@ -0,0 +1,97 @@
+"""Timers and counters of the phases of `Solver.steps` and `Solver.steady_state`."""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profile:
+    """Time, number of calls and (optionally) memory allocated per phase.
+
+    `Solver.steps` and `Solver.steady_state` record their phases (advection,
+    rhs, solve, factorization, boundary, forces, monitors...) in the profile
+    passed to them (or in a new one), which is returned in the infodict as
+    'profile'. The same profile may be passed to several calls to accumulate
+    the results. Counters include the number of time steps or Newton
+    iterations, linear solves, factorizations and Krylov iterations (if the
+    linear solver reports them, see `ibmos.tools`).
+
+    Attributes
+    ----------
+    times : dict
+        Total time (seconds) of each phase.
+    calls : dict
+        Number of times each phase was entered.
+    counters : dict
+        Counters (steps, iterations, solves, factorizations, krylov_iterations).
+    allocated : dict
+        Peak of the memory allocated (bytes) by Python and NumPy within each
+        phase (tracemalloc), if `memory` is True.
+    memory : bool
+        Measure memory allocated (slow).
+
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.times, self.calls, self.counters, self.allocated = {}, {}, {}, {}
+        self._tracing = False
+
+    def start(self):
+        """Start tracing memory allocations (if `memory` and not already traced)."""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        """Stop tracing memory allocations (if started by `start`)."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager that measures a phase."""
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if memory:
+                self.allocated[name] = max(self.allocated.get(name, 0),
+                                           tracemalloc.get_traced_memory()[1] - current)
+
+    def add_time(self, name, seconds):
+        """Add time to a phase measured elsewhere."""
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, number=1):
+        """Increment a counter."""
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def as_dict(self):
+        """Return flat dictionary with the times, calls, counters and allocated memory."""
+        result = {f'time_{name}': value for name, value in self.times.items()}
+        result.update((f'calls_{name}', value) for name, value in self.calls.items())
+        result.update(self.counters)
+        result.update((f'allocated_{name}', value) for name, value in self.allocated.items())
+        return result
+
+    def __str__(self):
+        total = sum(self.times.values())
+        lines = [f"{'phase':>16} {'time':>12} {'%':>6} {'calls':>8}" +
+                 (f" {'allocated':>12}" if self.allocated else "")]
+        for name, t in sorted(self.times.items(), key=lambda item: -item[1]):
+            line = f"{name:>16} {t:12.5e} {100 * t / total if total else 0:6.1f} {self.calls[name]:8}"
+            if self.allocated:
+                line += f" {self.allocated.get(name, 0):12}"
+            lines.append(line)
+        lines.extend(f"{name:>16} {value:12}" for name, value in self.counters.items())
+        return "\n".join(lines)
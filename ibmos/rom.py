@@ -0,0 +1,189 @@
+"""Galerkin reduced-order models on POD bases."""
+
+from dataclasses import *
+
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+
+from .growth import energy_weights
+
+
+def pod(solver, X, rank=10):
+    """Return POD basis of the velocity fluctuations.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    X : np.ndarray
+        Snapshots (packed state vectors in the rows, as returned by `Solver.steps`).
+    rank : int, optional
+        Number of modes.
+
+    Returns
+    -------
+    mean : np.ndarray
+        Mean velocity field (first solver.pStart entries of the state vector).
+    modes : np.ndarray
+        POD modes (columns), orthonormal in the kinetic energy inner product.
+    values : np.ndarray
+        POD eigenvalues (energy of each mode).
+
+    """
+    sW = np.sqrt(energy_weights(solver))
+
+    U = np.atleast_2d(X)[:, :solver.pStart]
+    mean = U.mean(axis=0)
+
+    S, Vt = la.svd(sW * (U - mean), full_matrices=False)[1:]
+
+    return mean, Vt[:rank].T / sW[:, np.newaxis], S[:rank] ** 2
+
+
+@dataclass
+class ROM:
+    """Galerkin reduced-order model.
+
+    The velocity field is approximated as u = mean + modes @ a, and the
+    coefficients a follow
+
+        da/dt = c + L a - T(a, a),   T(a, a)_i = Σ_jk T_ijk a_j a_k,
+
+    i.e. the projection of the momentum equations on the modes (pressure and
+    forces on the immersed boundaries do not contribute since the modes satisfy
+    homogeneous constraints).
+
+    Attributes
+    ----------
+    mean : np.ndarray
+        Mean velocity field (satisfies the boundary conditions).
+    modes : np.ndarray
+        Modes (columns), orthonormal in the kinetic energy inner product.
+    c : np.ndarray
+        Constant term.
+    L : np.ndarray
+        Linear term.
+    T : np.ndarray
+        Quadratic term.
+
+    """
+
+    mean: np.ndarray
+    modes: np.ndarray
+
+    c: np.ndarray
+    L: np.ndarray
+    T: np.ndarray
+
+    def rhs(self, a):
+        """Return da/dt for the coefficients a (last axis)."""
+        aa = (a[..., :, np.newaxis] * a[..., np.newaxis, :]).reshape(a.shape[:-1] + (-1,))
+        return self.c + a @ self.L.T - aa @ self.T.reshape(len(self.c), -1).T
+
+    def project(self, solver, x):
+        """Return coefficients of the packed state vectors x (last axis)."""
+        W = energy_weights(solver)
+        return (x[..., :solver.pStart] - self.mean) @ (W[:, np.newaxis] * self.modes)
+
+    def reconstruct(self, a):
+        """Return velocity fields (first solver.pStart entries of the state vector)."""
+        return self.mean + a @ self.modes.T
+
+    def integrate(self, a, dt, number=1, saveEvery=None):
+        """Integrate the model with the classical 4th-order Runge-Kutta method.
+
+        Parameters
+        ----------
+        a : np.ndarray
+            Initial coefficients. Several trajectories are advanced at once if
+            a has more than one dimension (coefficients on the last axis).
+        dt : float
+            Time step.
+        number : int, optional
+            Number of time steps.
+        saveEvery : int, optional
+            Specify how often coefficients are stored. By default, only the
+            last ones are returned.
+
+        Returns
+        -------
+        a : np.ndarray
+            Coefficients, with a leading axis for the stored time steps if
+            `saveEvery` is provided.
+        t : np.ndarray
+            Times (same leading axis).
+
+        """
+        a = np.array(a, dtype=float)
+        ares, tres = [], []
+
+        for k in range(number):
+            k1 = self.rhs(a)
+            k2 = self.rhs(a + 0.5 * dt * k1)
+            k3 = self.rhs(a + 0.5 * dt * k2)
+            k4 = self.rhs(a + dt * k3)
+            a = a + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+            if saveEvery and (k + 1) % saveEvery == 0:
+                ares.append(a)
+                tres.append((k + 1) * dt)
+
+        if saveEvery:
+            return np.array(ares), np.array(tres)
+        return a, number * dt
+
+
+def galerkin(solver, mean, modes, uBC, vBC):
+    """Build Galerkin reduced-order model.
+
+    The quadratic term is computed with one evaluation of the advection terms
+    (`Field.advection`) per pair of modes.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    mean : np.ndarray
+        Mean velocity field (see `pod`).
+    modes : np.ndarray
+        Modes (see `pod`).
+    uBC : list
+        Boundary conditions on the horizontal velocity component.
+    vBC : list
+        Boundary conditions on the vertical velocity component.
+
+    Returns
+    -------
+    ROM
+        Reduced-order model.
+
+    """
+    uSize, pStart, rank = solver.fluid.u.size, solver.pStart, modes.shape[1]
+    shapes = solver.fluid.u.shape, solver.fluid.v.shape
+    zBC = [np.zeros_like(bc) for bc in uBC], [np.zeros_like(bc) for bc in vBC]
+
+    def advection(q, uBC, vBC):
+        u, v = q[:uSize].reshape(shapes[0]), q[uSize:].reshape(shapes[1])
+        return np.r_[solver.fluid.advection(u, v, uBC, vBC)]
+
+    L = sp.block_diag((solver.laplacian[0][0], solver.laplacian[1][0]))
+    bc = solver.boundary_condition_terms(uBC, vBC)[:pStart]
+
+    N0 = advection(mean, uBC, vBC)
+    Nk = [advection(φ, *zBC) for φ in modes.T]
+
+    # Constant and linear terms.
+    c = modes.T @ (solver.iRe * (L @ mean) + bc - N0)
+    Lr = modes.T @ np.column_stack([solver.iRe * (L @ φ) - (advection(mean + φ, uBC, vBC) - N0 - Nφ)
+                                    for φ, Nφ in zip(modes.T, Nk)])
+
+    # Quadratic term (symmetric in the last two indices).
+    T = np.zeros((rank,) * 3)
+    for j in range(rank):
+        T[:, j, j] = modes.T @ Nk[j]
+        for k in range(j + 1, rank):
+            T[:, j, k] = T[:, k, j] = modes.T @ (0.5 * (advection(modes[:, j] + modes[:, k], *zBC) -
+                                                         Nk[j] - Nk[k]))
+
+    return ROM(mean, modes, c, Lr, T)
@@ -0,0 +1,79 @@
+"""Time integration schemes.
+
+All the schemes advance the solution through one or more stages of the form
+
+    (M/h - iRe L/2) x^{s+1} + Q^T λ = (M/h + iRe L/2) x^s - αN N(x^s) + αNm1 N(x^{s-1}) + bc
+                        Q x^{s+1} = bc
+
+i.e. viscous terms are treated with the Crank-Nicolson method and the constraints
+(incompressibility and velocity on the immersed boundaries) are enforced at every
+stage. Since each stage is a Crank-Nicolson step of size h, the propagators (and
+their factorizations) are those returned by `Solver.cached_propagator(h)`.
+"""
+
+
+class Scheme:
+    """Base class for time integration schemes.
+
+    Attributes
+    ----------
+    name : str
+        Name of the scheme.
+    nstages : int
+        Number of stages per time step.
+
+    """
+
+    name = None
+    nstages = 1
+
+    def stages(self, dt, dtm1):
+        """Return the stages of one time step.
+
+        Parameters
+        ----------
+        dt : float
+            Time step.
+        dtm1 : float
+            Previous time step.
+
+        Returns
+        -------
+        tuple
+            Tuple of (h, αN, αNm1) for each stage, where h is the (Crank-Nicolson)
+            time step of the stage, and αN and αNm1 are the coefficients of the
+            advection terms at the current and previous stages.
+
+        """
+        raise NotImplementedError
+
+
+class CNAB2(Scheme):
+    """Crank-Nicolson/Adams-Bashforth (2nd order) with variable time step."""
+
+    name = 'CNAB2'
+    nstages = 1
+
+    def stages(self, dt, dtm1):
+        ω = dt / dtm1
+        return (dt, 1 + 0.5 * ω, 0.5 * ω),
+
+
+class RK3(Scheme):
+    """Low-storage IMEX Runge-Kutta scheme of Spalart, Moser & Rogers (JCP, 1991).
+
+    Advection terms are integrated with a 3-stage, 3rd-order Runge-Kutta method
+    whose stability region includes the imaginary axis up to |λ dt| = 3**0.5, which
+    allows larger Courant numbers than CNAB2. Viscous terms are integrated with the
+    Crank-Nicolson method at each stage (2nd order). The scheme is self-starting,
+    i.e. it does not need the advection terms of the previous time step.
+    """
+
+    name = 'RK3'
+    nstages = 3
+
+    γ = (8 / 15, 5 / 12, 3 / 4)
+    ζ = (0, -17 / 60, -5 / 12)
+
+    def stages(self, dt, dtm1):
+        return tuple(((γ + ζ) * dt, γ / (γ + ζ), -ζ / (γ + ζ)) for γ, ζ in zip(self.γ, self.ζ))
@@ -3,6 +3,9 @@ from dataclasses import *
 import numpy as np
 import scipy.sparse as sp
 
+from . import delta
+from . import kernels as _kernels
+
 
 def _interp(delta, nelem, ξ, x, dx, normalized=None):
     """Auxiliary function for 1D interpolation."""
@@ -41,10 +44,31 @@ class Solid:
         self.l = len(self.ξ)
 
     def interpolation(self, field, normalized=True):
+        if _kernels.enabled() and _kernels.supported(self):
+            return _kernels.interpolation(self, field, normalized)
+
         Ey = sp.kron(_interp(self.δ, self.n, self.η, field.y, field.dy, normalized), np.ones_like(field.x)).tocsr()
         Ex = sp.kron(np.ones_like(field.y), _interp(self.δ, self.n, self.ξ, field.x, field.dx, normalized)).tocsr()
         E = Ey.multiply(Ex)
         return E
 
+    def interpolation_derivative(self, field, normalized=True):
+        """Return derivatives of the interpolation matrix with respect to ξ and η.
+
+        Row j of each matrix only depends on (ξ[j], η[j]), hence the derivative
+        of (E @ q)[j] with respect to ξ[j] is (Eξ @ q)[j].
+        """
+        if _kernels.enabled() and _kernels.supported(self):
+            return (_kernels.interpolation(self, field, normalized, 'ξ'),
+                    _kernels.interpolation(self, field, normalized, 'η'))
+
+        dδ = delta.derivatives[self.δ]
+
+        Ey = sp.kron(_interp(self.δ, self.n, self.η, field.y, field.dy, normalized), np.ones_like(field.x)).tocsr()
+        Ex = sp.kron(np.ones_like(field.y), _interp(self.δ, self.n, self.ξ, field.x, field.dx, normalized)).tocsr()
+        dEy = sp.kron(_interp(dδ, self.n, self.η, field.y, field.dy, normalized), np.ones_like(field.x)).tocsr()
+        dEx = sp.kron(np.ones_like(field.y), _interp(dδ, self.n, self.ξ, field.x, field.dx, normalized)).tocsr()
+        return Ey.multiply(dEx).tocsr(), dEy.multiply(Ex).tocsr()
+
     def regularization(self, field):
         return self.interpolation(field, False).T @ sp.diags(self.ds)
@@ -1,13 +1,56 @@
+import inspect
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import nullcontext
 from itertools import chain
 
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.linalg as la
 import scipy.sparse as sp
+from scipy.sparse.csgraph import reverse_cuthill_mckee
 
+from . import cache as _cache
+from . import tools as _tools
 from .flow import Field
+from .profiling import Profile
+from .schemes import CNAB2
 from .tools import solver_default
 
+
+# Floating-point types of the precisions (see `Solver.set_precision`).
+_dtypes = {'double': np.float64, 'single': np.float32}
+
+
+def _solve(solve, b, x0=None, trans=False):
+    """Call `solve` of a linear solver, passing `trans` only if True (for solvers written without it)."""
+    return solve(b, x0=x0, trans=True) if trans else solve(b, x0=x0)
+
+
+def _permuted(solve, permutation):
+    """Return solve of A given that of A[permutation][:, permutation]."""
+
+    def solver(b, x0=None, trans=False):
+        y = _solve(solve, b[permutation], None if x0 is None else x0[permutation], trans)
+        x = np.empty_like(np.asarray(y, dtype=float).ravel())
+        x[permutation] = np.ravel(y)
+        solver.iterations = getattr(solve, 'iterations', 0)
+        return x
+
+    solver.iterations = 0
+    solver.nbytes = getattr(solve, 'nbytes', np.nan)
+
+    return solver
+
+
+def _readonly(x):
+    """Return read-only view of an array."""
+    x = x.view()
+    x.flags.writeable = False
+    return x
+
+
 class Solver:
     """Flow solver based on the Projection-based Immersed Boundary Method.
 
@@ -24,9 +67,12 @@ class Solver:
     solids: list = []
     periodic: bool
     solver = None
+    profile = None
+    precision, snapshots = 'double', 'double'
+    ordering = None
 
     def __init__(self, x, y, iRe=1.0, Co=0.5, periodic=False,
-                 fractionalStep=False, solver=solver_default(), *solids):
+                 fractionalStep=False, solver=solver_default(), *solids, cache=None):
         """Initialize solver.
 
         Parameters
@@ -44,12 +90,17 @@ class Solver:
         fractionalStep : bool, optional
             Fractional Step Method flag.
         solver : callable, optional
-            `solver(A)` that returns linear solver.
+            `solver(A, **properties)` that returns linear solver (see
+            `linear_solver`).
         solids : list, optional
-            List of solids. """
+            List of solids.
+        cache : str, optional
+            Directory where operators and propagators are stored and loaded
+            from, see `ibmos.cache`. By default, nothing is stored. """
     
-        # Store periodicity
+        # Store periodicity and cache directory
         self.periodic = periodic
+        self.cache = cache
 
         # Create field and determine smallest cell size.
         self.fluid = Field(x, y, periodic)
@@ -57,8 +108,9 @@ class Solver:
         self.dxmin = np.min(np.r_[self.fluid.p.dx, self.fluid.p.dy])
 
         # Laplacian and divergence operators.
-        self.laplacian = self.fluid.laplacian()
-        self.divergence = self.fluid.divergence()
+        self.laplacian, self.divergence = _cache.cached(
+            self.cache, _cache.key('operators', *self.grid_key()),
+            lambda: (self.fluid.laplacian(), self.fluid.divergence()))
 
         # The state vector is formed by stacking u, v, p and if we have
         # solids, also by (fx, fy) as many times as the number of solids.
@@ -72,15 +124,32 @@ class Solver:
         self.set_Co(Co)
         self.set_fractional_step(fractionalStep)
         self.set_solver(solver)
+        self.set_precision()
+        self.set_ordering()
+        self.set_scheme(CNAB2())
         
         self.set_solids(*solids)
         
+    def grid_key(self):
+        """Return configuration of the grid (see `ibmos.cache.key`)."""
+        return self.fluid.x, self.fluid.y, self.periodic
+
+    def solids_key(self):
+        """Return configuration of the solids (see `ibmos.cache.key`)."""
+        return [(solid.ξ, solid.η, solid.δ.__name__, solid.n) for solid in self.solids]
+
     def cleanup(self):
         """Clean-up structures that must be recomputed after calls to set_*."""
         
         self.A, self.B, self.iA = None, None, None
-        self.stepsInitialized = False
+        self.propagators = OrderedDict()
         
+    def __getstate__(self):
+        """Return state for pickling. Propagators and linear solvers are not included."""
+        state = self.__dict__.copy()
+        state.update(A=None, B=None, iA=None, propagators=OrderedDict())
+        return state
+
     def set_iRe(self, iRe):
         """Set inverse of the Reynolds number.
         
@@ -94,17 +163,47 @@ class Solver:
         self.cleanup()
  
 
-    def set_Co(self, Co):
+    def set_Co(self, Co, levels=1, ratio=2.0, cacheSize=None):
         """Set courant number.
         
         Parameters
         ----------
         Co : float
             Courant number.
+        levels : int, optional
+            Number of time step levels available to adaptive time-stepping,
+            i.e. dt, ratio*dt, ratio**2*dt, ...
+        ratio : float, optional
+            Ratio between consecutive time step levels.
+        cacheSize : int, optional
+            Maximum number of time step levels whose propagators (and
+            factorizations) are kept in memory. By default, all levels.
         """
         
-        self.dt = Co * min(self.dxmin ** 2 / self.iRe, self.dxmin)
-        self.cleanup()
+        self.set_dt(Co * min(self.dxmin ** 2 / self.iRe, self.dxmin), levels, ratio, cacheSize)
+
+    def set_dt(self, dt, levels=1, ratio=2.0, cacheSize=None):
+        """Set time step.
+
+        Propagators are cached by time step (see `cached_propagator`), so
+        those computed for other time steps are kept.
+
+        Parameters
+        ----------
+        dt : float
+            Time step.
+        levels : int, optional
+            Number of time step levels (see `set_Co`).
+        ratio : float, optional
+            Ratio between consecutive time step levels.
+        cacheSize : int, optional
+            Maximum number of time step levels whose propagators are kept in
+            memory. By default, all levels.
+        """
+
+        self.dt = dt
+        self.dtLevels = self.dt * ratio ** np.arange(levels)
+        self.cacheSize = levels if cacheSize is None else cacheSize
 
 
     def set_fractional_step(self, fractionalStep):
@@ -133,6 +232,277 @@ class Solver:
         self.solver = solver
         self.cleanup()
 
+    def set_precision(self, precision='double', snapshots='double', refinement=10, tol=1e-12):
+        """Set precision of the factorizations and of the stored flow fields.
+
+        In single precision, the matrices are factorized (or preconditioned)
+        in float32, which halves the memory of the factors and the bytes moved
+        by the triangular solves, and the solutions are improved by iterative
+        refinement: residuals and corrections are accumulated in float64 with
+        the float64 matrix, so that the accuracy of the solution is that of
+        double precision as long as the refinement converges. Operators,
+        right-hand sides and advection terms stay in float64. The relative
+        residuals of the velocity and pressure after the refinement are
+        reported by `steps` and `steady_state` ('rel.error(u,v)' and
+        'rel.error(p)', the latter including the forces on the immersed
+        boundaries).
+
+        Linear solvers that do not support float32 matrices compute in
+        float64 (e.g. PARDISO and CHOLMOD through pypardiso and scikit-sparse).
+
+        Parameters
+        ----------
+        precision : str, optional
+            'double' or 'single' (factorizations).
+        snapshots : str, optional
+            'double' or 'single' (flow fields returned by `steps`, relative
+            rounding error below 6e-8 in single precision).
+        refinement : int, optional
+            Maximum number of refinement iterations per solve.
+        tol : float, optional
+            Tolerance on the relative residual of the refinement.
+
+        """
+        for value in (precision, snapshots):
+            if value not in _dtypes:
+                raise ValueError("Unknown precision '%s' (available: %s)" % (value, ", ".join(_dtypes)))
+
+        self.precision, self.snapshots = precision, snapshots
+        self.refinement, self.refinementTol = refinement, tol
+        self.cleanup()
+
+    def set_ordering(self, ordering=None):
+        """Set ordering of the unknowns in the factorizations.
+
+        The packed state vector (see `pack`) stacks u, v, p and the forces, so
+        the blocks of the coupled matrices (`propagator` and `jacobian`) couple
+        unknowns that are far apart. The matrices are factorized (and solved)
+        with their unknowns permuted by:
+
+        - 'interleaved': cell by cell (row-major), with u, v and p of each cell
+          together and the forces on the immersed boundaries next to the cell
+          that contains their points.
+        - 'rcm': reverse Cuthill-McKee ordering of the sparsity pattern, which
+          reduces the bandwidth.
+
+        The permutation is computed once per grid, solids and matrix (see
+        `ordering_permutation`). The layout of the state vectors, right-hand
+        sides and solutions is not modified. Saddle-point matrices passed to
+        linear solvers that use their blocks (split, e.g.
+        `ibmos.tools.solver_block_krylov`) are only permuted within the blocks.
+
+        Parameters
+        ----------
+        ordering : str, optional
+            None (packed layout), 'interleaved' or 'rcm'.
+
+        """
+        if ordering not in (None, 'interleaved', 'rcm'):
+            raise ValueError("Unknown ordering '%s' (available: None, interleaved, rcm)" % ordering)
+
+        self.ordering = ordering
+        self.permutations = {}
+        self.cleanup()
+
+    def coordinates(self):
+        """Return coordinates of the unknowns of the packed state vector.
+
+        Returns
+        -------
+        x, y : np.ndarray
+            Coordinates of u, v and p (cell centers) and of the points of the
+            immersed boundaries (forces).
+        kind : np.ndarray
+            0 for u, 1 for v, 2 for p and 3 for the forces.
+
+        """
+        points = [np.meshgrid(info.x, info.y) for info in (self.fluid.u, self.fluid.v, self.fluid.p)]
+        x = [xy[0].ravel() for xy in points]
+        y = [xy[1].ravel() for xy in points]
+        x[2], y[2] = x[2][1:], y[2][1:]
+
+        for solid in self.solids:
+            x.extend((solid.ξ, solid.ξ))
+            y.extend((solid.η, solid.η))
+
+        kind = np.repeat(np.arange(4), [self.fluid.u.size, self.fluid.v.size, self.fluid.p.size - 1,
+                                        sum(self.sizes()[3:])])
+
+        return np.concatenate(x), np.concatenate(y), kind
+
+    def ordering_permutation(self, A, role=None, split=None):
+        """Return permutation of the unknowns of A (see `set_ordering`).
+
+        Parameters
+        ----------
+        A : sp.spmatrix
+            Matrix: velocity block ('velocity'), pressure and forces block
+            ('pressure') or whole state vector (other roles).
+        role : str, optional
+            Role of the matrix (see `propagator_properties`).
+        split : tuple or int, optional
+            Start of the pressure block (and of the forces), see
+            `ibmos.tools.solver_block_krylov`. The blocks are kept in order.
+
+        Returns
+        -------
+        np.ndarray
+            Permutation (None if the unknowns are not reordered).
+
+        """
+        if self.ordering is None:
+            return None
+
+        key = self.ordering, role, A.shape[0], split is not None
+        if key not in self.permutations:
+            rows = {'velocity': slice(0, self.pStart), 'pressure': slice(self.pStart, None)}.get(role, slice(None))
+
+            if self.ordering == 'interleaved':
+                x, y, kind = (xyk[rows] for xyk in self.coordinates())
+                i = np.clip(np.searchsorted(self.fluid.x, x, side='right') - 1, 0, self.fluid.x.size - 2)
+                j = np.clip(np.searchsorted(self.fluid.y, y, side='right') - 1, 0, self.fluid.y.size - 2)
+                permutation = np.lexsort((kind, i, j))
+            else:
+                pattern = abs(sp.csr_matrix(A))
+                permutation = reverse_cuthill_mckee((pattern + pattern.T).tocsr(), symmetric_mode=True)
+
+            permutation = np.asarray(permutation, dtype=np.intp)
+            if permutation.size != A.shape[0]:
+                raise ValueError("Matrix of size %d does not match role '%s'" % (A.shape[0], role))
+
+            # Keep the blocks (velocity, pressure and forces): stable sort by block.
+            if split is not None:
+                blocks = np.searchsorted(np.atleast_1d(split), permutation, side='right')
+                permutation = permutation[np.argsort(blocks, kind='stable')]
+
+            self.permutations[key] = permutation
+
+        return self.permutations[key]
+
+    def _refined(self, A, solve, split=None, role=None):
+        """Return solve with iterative refinement in float64 of a single precision `solve` of A.
+
+        Its attribute `error` is a dict with the residual of the last solve
+        relative to the right-hand side: 'velocity' and 'pressure' blocks if
+        split is provided, or the role of the matrix otherwise.
+        """
+        m = split if split is None or np.isscalar(split) else split[0]
+
+        def solver(b, x0=None, trans=False):
+            At = A.T if trans else A
+            if x0 is None:
+                x = np.asarray(_solve(solve, b.astype(np.float32), trans=trans), dtype=float).ravel()
+            else:
+                x = np.array(x0, dtype=float)
+
+            r = b - At @ x
+            for _ in range(self.refinement):
+                if la.norm(r) <= self.refinementTol * la.norm(b):
+                    break
+                x += np.asarray(_solve(solve, r.astype(np.float32), trans=trans), dtype=float).ravel()
+                r = b - At @ x
+                solver.refinements += 1
+
+            if m is None:
+                solver.error[role or 'solution'] = la.norm(r) / (la.norm(b) or 1.0)
+            else:
+                solver.error.update(velocity=la.norm(r[:m]) / (la.norm(b) or 1.0),
+                                    pressure=la.norm(r[m:]) / (la.norm(b) or 1.0))
+            solver.iterations = getattr(solve, 'iterations', 0)
+            return x
+
+        solver.error, solver.refinements, solver.iterations = {}, 0, 0
+        solver.nbytes = getattr(solve, 'nbytes', np.nan)
+
+        return solver
+
+    def linear_solver(self, A, **properties):
+        """Return linear solver for the matrix A.
+
+        Parameters
+        ----------
+        A : sp.spmatrix
+            Matrix.
+        properties : dict, optional
+            Structure of A: role (e.g. 'pressure', see `ibmos.tools.autotune`),
+            symmetric, definite (positive definite) and split (sizes of the
+            velocity and pressure blocks of saddle-point matrices, see
+            `ibmos.tools.solver_block_krylov`).
+            Only those accepted by the linear solver set with `set_solver` are
+            passed.
+
+        Returns
+        -------
+        callable
+            `solve(b, x0=None, trans=False)`. `trans` is only passed to the
+            solve of the linear solver if True, so that linear solvers
+            without it work except for transposed solves. While `profile` is
+            set (see `steps`), the factorization and the solves are recorded
+            in it. Its attribute `nbytes` is the memory of the factorization (NaN if
+            the linear solver does not report it). The unknowns are reordered
+            internally as set with `set_ordering`. In single precision (see
+            `set_precision`), A is factorized in float32 and the solves are
+            refined in float64; the attribute `error` holds the relative
+            residuals of the last solve.
+
+        """
+        try:
+            parameters = inspect.signature(self.solver).parameters
+        except (TypeError, ValueError):
+            parameters = {}
+
+        split, role = properties.get('split'), properties.get('role')
+        if not any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values()):
+            properties = {key: value for key, value in properties.items() if key in parameters}
+
+        single = self.precision == 'single'
+        profile = self.profile
+        with profile.phase('factorization') if profile else nullcontext():
+            # Linear solvers that use the blocks (or may choose one that does) keep them.
+            blocks = 'split' in parameters or getattr(self.solver, 'func', self.solver) is _tools.solver_autotuned
+            permutation = self.ordering_permutation(A, role, split if blocks else None)
+            Ap = A if permutation is None else sp.csc_matrix(A)[permutation][:, permutation]
+            solve = self.solver(Ap.astype(np.float32) if single else Ap, **properties)[0]
+            if permutation is not None:
+                solve = _permuted(solve, permutation)
+        if profile:
+            profile.count('factorizations')
+
+        if single:
+            solve = self._refined(A, solve, split, role)
+
+        def solver(b, x0=None, trans=False):
+            profile = self.profile
+            if profile is None:
+                return _solve(solve, b, x0, trans)
+
+            # Iterative solvers report the number of iterations (see `ibmos.tools`).
+            iterations, refinements = getattr(solve, 'iterations', 0), getattr(solve, 'refinements', 0)
+            with profile.phase('solve'):
+                x = _solve(solve, b, x0, trans)
+            profile.count('solves')
+            profile.count('krylov_iterations', getattr(solve, 'iterations', 0) - iterations)
+            if single:
+                profile.count('refinements', solve.refinements - refinements)
+            return x
+
+        solver.nbytes = getattr(solve, 'nbytes', np.nan)
+        solver.error = getattr(solve, 'error', {})
+
+        return solver
+
+    def set_scheme(self, scheme):
+        """Set time integration scheme.
+
+        Parameters
+        ----------
+        scheme : Scheme
+            Time integration scheme (see `ibmos.schemes`).
+
+        """
+
+        self.scheme = scheme
+        self.cleanup()
 
     def set_solids(self, *solids):
         """Set immersed boundaries (solids).
@@ -150,10 +520,12 @@ class Solver:
 
         self.solids = solids
         self.E = []
+        self.permutations = {}
 
         for solid in self.solids:
-            Eu = solid.interpolation(self.fluid.u)
-            Ev = solid.interpolation(self.fluid.v)
+            Eu, Ev = _cache.cached(
+                self.cache, _cache.key('interpolation', *self.grid_key(), solid.ξ, solid.η, solid.δ.__name__, solid.n),
+                lambda: (solid.interpolation(self.fluid.u), solid.interpolation(self.fluid.v)))
             self.E.append((Eu, Ev))
             
         self.cleanup()
@@ -207,11 +579,13 @@ class Solver:
 
         return J
 
-    def propagator(self, fractionalStep):
+    def propagator(self, fractionalStep, dt=None):
         """Return propagator.
 
         fractionalStep: bool, optional
             Propagators for fractional step method.
+        dt: float, optional
+            Time step. By default, the one set with `set_Co`.
 
         Returns
         -------
@@ -243,8 +617,10 @@ class Solver:
 
         Z = sp.coo_matrix((Q.shape[0],) * 2)
 
-        A = (M / self.dt - 0.5 * self.iRe * L).tocsc()
-        B = (M / self.dt + 0.5 * self.iRe * L).tocsr()
+        dt = self.dt if dt is None else dt
+
+        A = (M / dt - 0.5 * self.iRe * L).tocsc()
+        B = (M / dt + 0.5 * self.iRe * L).tocsr()
         BB = sp.block_diag((B, Z)).tocsr()
 
         if fractionalStep:
@@ -253,7 +629,7 @@ class Solver:
 
             iML = iM @ L
 
-            BN = self.dt*iM + (0.5*self.iRe)*self.dt**2*iML@iM + (0.5*self.iRe)**2*self.dt**3*iML@(iML@iM)
+            BN = dt*iM + (0.5*self.iRe)*dt**2*iML@iM + (0.5*self.iRe)**2*dt**3*iML@(iML@iM)
 
             QBNQT = (Q @ (BN @ Q.T)).tocsc()
 
@@ -263,6 +639,255 @@ class Solver:
 
             return (AA,), (BB,)
 
+    def propagator_properties(self, fractionalStep):
+        """Return structural properties of the propagator matrices.
+
+        The matrices M/dt - iRe/2 L and Q BN Q^T of the fractional step method
+        are symmetric positive definite, and the monolithic propagator is a
+        symmetric (indefinite) saddle-point matrix. The properties are passed
+        to the linear solver (see `linear_solver`).
+
+        Parameters
+        ----------
+        fractionalStep : bool
+            Propagators for fractional step method.
+
+        Returns
+        -------
+        list
+            Properties (dict) of each matrix returned by `propagator` (left-hand-side),
+            including its role ('velocity', 'pressure' or 'saddle').
+
+        """
+        if fractionalStep:
+            return [{'role': 'velocity', 'symmetric': True, 'definite': True},
+                    {'role': 'pressure', 'symmetric': True, 'definite': True}]
+        else:
+            return [{'role': 'saddle', 'symmetric': True, 'split': (self.pStart, self.pEnd)}]
+
+    def cached_propagator(self, dt):
+        """Return propagator and linear solvers for the time step `dt`.
+
+        The propagators of the last `cacheSize` time step levels (see `set_Co`)
+        are kept in memory, so that switching between time step levels does not
+        require new factorizations. Multi-stage schemes need one propagator per
+        stage and time step level.
+
+        Parameters
+        ----------
+        dt : float
+            Time step.
+
+        Returns
+        -------
+        A : tuple
+            Propagator matrices (left-hand-side).
+        B : tuple
+            Propagator matrices (right-hand-side).
+        iA : list
+            Linear solvers for the matrices in A.
+
+        """
+        if dt in self.propagators:
+            self.propagators.move_to_end(dt)
+        else:
+            name = _cache.key('propagator', *self.grid_key(), self.solids_key(), self.iRe, dt,
+                              self.fractionalStep)
+            with self.profile.phase('propagator') if self.profile else nullcontext():
+                A, B = _cache.cached(self.cache, name, lambda: self.propagator(self.fractionalStep, dt))
+            properties = self.propagator_properties(self.fractionalStep)
+            iA = [self.linear_solver(Ak, **Pk) for Ak, Pk in zip(A, properties)]
+            self.propagators[dt] = A, B, iA
+
+            while len(self.propagators) > max(self.cacheSize, 1) * self.scheme.nstages:
+                self.propagators.popitem(last=False)
+
+        return self.propagators[dt]
+
+    def memory(self):
+        """Return memory held by the operators, propagators and factorizations.
+
+        Memory of the Jacobian and its factorization are reported by
+        `steady_state` (infodict['memory']).
+
+        Returns
+        -------
+        dict
+            Bytes held by the Laplacian, divergence and interpolation (E)
+            operators, by the propagator matrices of each time step level in
+            memory (A, QBNQT, B, BN and Q with the fractional step method, AA
+            and BB otherwise) and by their factorizations (NaN if the linear
+            solver does not report it).
+
+        """
+        result = {name: _tools.nbytes(getattr(self, name)) for name in ('laplacian', 'divergence', 'E')}
+
+        names = (('A', 'QBNQT'), ('B', 'BN', 'Q')) if self.fractionalStep else (('AA',), ('BB',))
+        for dt, (A, B, iA) in self.propagators.items():
+            for name, matrix in zip(names[0] + names[1], A + B):
+                result[f'{name}(dt={dt:g})'] = _tools.nbytes(matrix)
+            for name, solve in zip(names[0], iA):
+                result[f'factorization {name}(dt={dt:g})'] = getattr(solve, 'nbytes', np.nan)
+
+        return result
+
+    def predict_memory(self, steady=False, fractionalStep=None, backends=None):
+        """Predict memory of the factorizations without factorizing (dry run).
+
+        The matrices are assembled (propagators for the time step set with
+        `set_Co`, or Jacobian of a generic flow field) and the nonzeros of the
+        factors and peak memory of the setup of each backend are predicted with
+        `ibmos.tools.predict_memory`.
+
+        Parameters
+        ----------
+        steady : bool, optional
+            Predict for `steady_state` (Jacobian) instead of `steps` (propagators).
+        fractionalStep : bool, optional
+            Propagators for fractional step method. By default, the current setting.
+        backends : list, optional
+            Names of the backends (see `ibmos.tools.predict_memory`).
+
+        Returns
+        -------
+        dict
+            For each matrix (A and QBNQT, AA or J), its memory ('bytes') and
+            predictions for each backend ('predictions').
+
+        """
+        fractionalStep = self.fractionalStep if fractionalStep is None else fractionalStep
+
+        if steady:
+            uBC, vBC = self.zero_boundary_conditions()
+            rng = np.random.default_rng(0)
+            u, v = (rng.random(shape) for shape in self.shapes()[:2])
+            matrices = {'J': self.jacobian(uBC, vBC, u, v)}
+            properties = [{'role': 'jacobian', 'split': (self.pStart, self.pEnd)}]
+        else:
+            names = ('A', 'QBNQT') if fractionalStep else ('AA',)
+            matrices = dict(zip(names, self.propagator(fractionalStep)[0]))
+            properties = self.propagator_properties(fractionalStep)
+
+        return {name: {'bytes': _tools.nbytes(matrix),
+                       'predictions': _tools.predict_memory(matrix, backends, **Pk)}
+                for (name, matrix), Pk in zip(matrices.items(), properties)}
+
+    def fit_memory(self, limit=None, steady=False, verbose=True):
+        """Choose a configuration whose predicted memory fits, before factorizing.
+
+        The current configuration (linear solver and fractional step setting)
+        is kept if its predicted peak memory (see `predict_memory`) is below
+        `limit`. Otherwise, the first configuration that fits is set among: the
+        fractional step method with the same linear solver, and iterative
+        solvers (block-preconditioned GMRES for the monolithic propagator or
+        the Jacobian, PCG for the fractional step method). The prediction
+        includes the operators (Laplacian, divergence and E) and, for `steps`,
+        the propagators and factorizations of all the time step levels and
+        stages kept in memory. Propagators and factorizations already in memory
+        are kept unless the configuration changes.
+
+        Linear solvers that are not in `ibmos.tools._backends` (e.g.
+        `solver_autotuned`) are predicted as `ibmos.tools.solver_default`.
+
+        Parameters
+        ----------
+        limit : float, optional
+            Memory limit (bytes). By default, the available memory.
+        steady : bool, optional
+            Configuration for `steady_state` instead of `steps`.
+        verbose : bool, optional
+            Print the predicted memory of each configuration tried.
+
+        Returns
+        -------
+        dict
+            Chosen configuration: 'fractionalStep', 'backend' and predicted
+            'peak' memory (bytes).
+
+        Raises
+        ------
+        MemoryError
+            No configuration fits.
+
+        """
+        import importlib.util
+
+        limit = _tools.available_memory() if limit is None else limit
+
+        current = _tools.backend_name(self.solver) or _tools.backend_name(_tools.solver_default())
+        pcg = 'pcg_amg' if importlib.util.find_spec('pyamg') else 'pcg_ilu'
+
+        if steady:
+            configurations = [(False, current), (False, 'block_krylov')]
+        elif self.fractionalStep:
+            configurations = [(True, current), (True, pcg)]
+        else:
+            configurations = [(False, current), (True, current), (False, 'block_krylov'), (True, pcg)]
+
+        # Operators (the propagators and factorizations in memory are replaced by those predicted).
+        held = sum(_tools.nbytes(getattr(self, name)) for name in ('laplacian', 'divergence', 'E'))
+        levels = 1 if steady else max(self.cacheSize, 1) * self.scheme.nstages
+
+        for fractionalStep, backend in dict.fromkeys(configurations):
+            matrices = self.predict_memory(steady, fractionalStep, [backend]).values()
+            predictions = [matrix['predictions'][backend] for matrix in matrices]
+
+            # Matrices and factorizations of all the levels, plus the overhead of the last setup.
+            peak = (held + levels * sum(matrix['bytes'] + prediction['factor']
+                                        for matrix, prediction in zip(matrices, predictions)) +
+                    max(prediction['peak'] - prediction['factor'] for prediction in predictions))
+            if steady:
+                peak += next(iter(matrices))['bytes']  # Jacobian without advection terms.
+
+            if verbose:
+                print(f"fractionalStep={fractionalStep}, {backend}: {peak / 2**20:.1f} MiB "
+                      f"(limit {limit / 2**20:.1f} MiB)")
+
+            if peak <= limit:
+                # The current configuration (and its propagators in memory) is kept.
+                if (fractionalStep, backend) != configurations[0]:
+                    if fractionalStep != self.fractionalStep:
+                        self.set_fractional_step(fractionalStep)
+                    if backend != current:
+                        self.set_solver(getattr(_tools, _tools._backends[backend][0]))
+                return {'fractionalStep': fractionalStep, 'backend': backend, 'peak': peak}
+
+        raise MemoryError("No configuration fits in %.1f MiB" % (limit / 2**20))
+
+    def courant(self, x, uBC, vBC, dt=None):
+        """Return convective Courant number.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            State vector (packed).
+        uBC : list
+            Boundary conditions on the horizontal velocity component.
+        vBC : list
+            Boundary conditions on the vertical velocity component.
+        dt : float, optional
+            Time step. By default, the one set with `set_Co`.
+
+        Returns
+        -------
+        float
+            Maximum over all cells of dt*(|u|/dx + |v|/dy), where |u| and |v|
+            are the largest velocities on the faces of each cell.
+
+        """
+        u, v = (np.abs(f) for f in self.reshape(*self.unpack(x))[:2])
+
+        u = np.hstack([np.abs(uBC[0])[:, np.newaxis], u, np.abs(uBC[1])[:, np.newaxis]])
+        if not self.periodic:
+            v = np.vstack([np.abs(vBC[2])[np.newaxis, :], v, np.abs(vBC[3])[np.newaxis, :]])
+        else:
+            v = np.vstack([v, v[:1, :]])
+
+        Cu = np.maximum(u[:, 1:], u[:, :-1]) / self.fluid.p.dx
+        Cv = np.maximum(v[1:, :], v[:-1, :]) / self.fluid.p.dy[:, np.newaxis]
+
+        return (self.dt if dt is None else dt) * np.max(Cu + Cv)
+
 
     def boundary_condition_terms(self, uBC, vBC, *sBC):
         """Return contribution of the boundary terms to the right-hand-side.
@@ -302,9 +927,115 @@ class Solver:
 
         return np.concatenate(bc)
 
+    def boundary_condition_terms_adjoint(self, y):
+        """Return the products of y with the derivatives of the boundary terms.
+
+        Parameters
+        ----------
+        y : np.ndarray
+            Packed vector.
+
+        Returns
+        -------
+        uBC : list
+            y·∂bc/∂uBC for the West, East, South and North boundaries.
+        vBC : list
+            y·∂bc/∂vBC for the West, East, South and North boundaries.
+        sBC : tuple
+            y·∂bc/∂sBC for each solid (horizontal and vertical components).
+
+        """
+        uSize, pStart, pEnd = self.fluid.u.size, self.pStart, self.pEnd
+
+        uBC = [self.iRe * A.T @ y[:uSize] for A in self.laplacian[0][1]]
+        vBC = [self.iRe * A.T @ y[uSize:pStart] for A in self.laplacian[1][1]]
+
+        for k, A in enumerate(self.divergence[0][1]):
+            uBC[k] = uBC[k] + A[1:].T @ y[pStart:pEnd]
+        for k, A in enumerate(self.divergence[1][1]):
+            vBC[k + 2] = vBC[k + 2] + A[1:].T @ y[pStart:pEnd]
+
+        s = self.unpack(y)[3:]
+
+        return uBC, vBC, tuple(zip(s[::2], s[1::2]))
+
+    def force_sensitivities(self, x, uBC, vBC, iJ):
+        """Return the sensitivities of the forces on the solids at a steady state.
+
+        For each force F = g·x, the adjoint equation J^T y = g is solved and
+        dF/dp = -y·∂R/∂p, where R(x, p) = 0 are the steady governing equations
+        and p are the boundary conditions, the inverse of the Reynolds number
+        and the position of the points of the immersed boundaries.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Steady state (packed state-vector).
+        uBC : list
+            Boundary conditions on the horizontal velocity component.
+        vBC : list
+            Boundary conditions on the vertical velocity component.
+        iJ : callable
+            Linear solver for the Jacobian at x (see `steady_state`).
+
+        Returns
+        -------
+        dict
+            Sensitivities of each force (named as in the infodict of
+            `steady_state`) with respect to iRe, uBC, vBC, sBC, ξ and η. The
+            last four have the same structure as the corresponding parameters.
+
+        """
+        uSize, pStart = self.fluid.u.size, self.pStart
+
+        u, v = x[:uSize], x[uSize:pStart]
+        forces = self.unpack(x)[3:]
+
+        # ∂R/∂iRe: viscous terms (velocity rows).
+        L = sp.block_diag((self.laplacian[0][0], self.laplacian[1][0]))
+        dRdiRe = -(L @ x[:pStart] + np.r_[
+            np.sum([A @ bc for A, bc in zip(self.laplacian[0][1], uBC)], axis=0),
+            np.sum([A @ bc for A, bc in zip(self.laplacian[1][1], vBC)], axis=0)])
+
+        # ∂(advection terms)/∂BC.
+        Nu, Nv = self.fluid.linearized_advection_boundary(*self.reshape(*self.unpack(x))[:2], uBC, vBC)
+
+        # ∂E/∂ξ and ∂E/∂η for the horizontal and vertical velocity components.
+        dE = [(solid.interpolation_derivative(self.fluid.u), solid.interpolation_derivative(self.fluid.v))
+              for solid in self.solids]
+
+        sensitivities = {}
+        for l, solid in enumerate(self.solids):
+            for c, component in enumerate(('fx', 'fy')):
+                g = self.zero()
+                self.unpack(g)[3 + 2 * l + c][:] = 2
+
+                y = iJ(g, trans=True)
+                yf = self.unpack(y)[3:]
+
+                uBCgrad, vBCgrad, sBCgrad = self.boundary_condition_terms_adjoint(y)
+
+                ξgrad, ηgrad = [], []
+                for m, ((Euξ, Euη), (Evξ, Evη)) in enumerate(dE):
+                    fx, fy, yfx, yfy = forces[2 * m], forces[2 * m + 1], yf[2 * m], yf[2 * m + 1]
+                    for grad, Eu, Ev in ((ξgrad, Euξ, Evξ), (ηgrad, Euη, Evη)):
+                        grad.append(-(fx * (Eu @ y[:uSize]) + fy * (Ev @ y[uSize:pStart]) +
+                                      yfx * (Eu @ u) + yfy * (Ev @ v)))
+
+                sensitivities[f'{solid.name}_{component}'] = {
+                    'iRe': -y[:pStart] @ dRdiRe,
+                    'uBC': [grad - Nk.T @ y[:pStart] for grad, Nk in zip(uBCgrad, Nu)],
+                    'vBC': [grad - Nk.T @ y[:pStart] for grad, Nk in zip(vBCgrad, Nv)],
+                    'sBC': sBCgrad,
+                    'ξ': ξgrad,
+                    'η': ηgrad}
+
+        return sensitivities
+
 
     def steady_state(self, x0, uBC, vBC, sBC=(), outflowEast=False, xtol=1e-8, ftol=1e-8,
-                     maxit=15, verbose=True, checkJacobian=False):
+                     maxit=15, verbose=True, checkJacobian=False, sensitivities=False, monitors=(),
+                     profile=None):
         """Compute steady state solution using exact Newton-Raphson iterations.
 
         Parameters
@@ -335,16 +1066,33 @@ class Solver:
             and forces on the immersed boundaries.
         checkJacobian : bool, optional
             Check Jacobian against numerical approximation.
+        sensitivities : bool, optional
+            Compute the sensitivities of the forces on the immersed boundaries
+            (see `force_sensitivities`) reusing the factorization of the last
+            Jacobian (the Jacobian at x0 is factorized if no iteration was
+            performed). They are stored in infodict['sensitivities'].
+        monitors : list, optional
+            List of monitors (see `ibmos.monitors`) evaluated after every
+            iteration (k is the iteration and t is NaN). The iterations stop as
+            soon as one of them says so.
+        profile : Profile, optional
+            Profile where the time spent in each phase (advection, residual,
+            jacobian, factorization, solve...) and the counters are accumulated
+            (see `ibmos.profiling`). By default, a new one.
 
         Returns
         -------
         x : np.ndarray
             Result of the last iteration.
         infodict : dict
-            Information on the performed iterations.
+            Information on the performed iterations, profile and memory held by
+            the operators, the Jacobian and its factorization (see `memory`).
 
         """
 
+        profile = Profile() if profile is None else profile
+        phase = profile.phase
+
         # Contribution of the boundary conditions to the right-hand-side
         bc = self.boundary_condition_terms(uBC, vBC, *sBC)
         # Build Jacobian without advection terms.
@@ -357,6 +1105,8 @@ class Solver:
         header = ['residual_x', 'residual_f']
         header.extend(chain(*[(f'{solid.name}_fx', f'{solid.name}_fy')
                               for solid in self.solids]))
+        if self.precision == 'single':
+            header.extend(['rel.error(u,v)', 'rel.error(p)'])
 
         # Create dictionary
         infodict = dict(zip(header, ([] for _ in header)))
@@ -365,6 +1115,16 @@ class Solver:
         if verbose:
             print("   k", "".join((f'{elem:>12} ' for elem in header)))
 
+        for monitor in monitors:
+            monitor.start(self, maxit)
+
+        # Linear solvers record factorizations and solves in the profile.
+        previous, self.profile = self.profile, profile
+        profile.start()
+
+        # Memory of the last Jacobian and its factorization.
+        memory = {}
+        iJ = None
 
         # Newton-Raphson iterations
         try:
@@ -373,14 +1133,17 @@ class Solver:
                 b = bc.copy()
 
                 u0, v0 = self.reshape(*self.unpack(x))[:2]
-                b[:self.pStart] -= np.r_[self.fluid.advection(u0, v0, uBC, vBC)]
+                with phase('advection'):
+                    b[:self.pStart] -= np.r_[self.fluid.advection(u0, v0, uBC, vBC)]
 
                 # Compute residual vector
-                residual = JnoAdv @ x - b
+                with phase('residual'):
+                    residual = JnoAdv @ x - b
 
                 # Compute next estimate of the solution and subtract the average pressure.
                 # The linear system is solved using direct methods.
-                J = self.jacobian(uBC, vBC, u0, v0)
+                with phase('jacobian'):
+                    J = self.jacobian(uBC, vBC, u0, v0)
 
                 if checkJacobian:
                     h = 1e-8
@@ -400,20 +1163,36 @@ class Solver:
                     if ftol <= eerr:
                         print("Warning: Jacobian might not be accurate enough (eerr=%12e)" % eerr)
 
-                xp1 = x - self.solver(J)[0](residual, x0=None if k==0 else x-xp1)  # Time consuming.
+                iJ = self.linear_solver(J, role='jacobian', split=(self.pStart, self.pEnd))  # Time consuming.
+                memory.update({'J': _tools.nbytes(J), 'factorization J': iJ.nbytes})
+                xp1 = x - iJ(residual, x0=None if k==0 else x-xp1)
+
+                profile.count('iterations')
 
                 # How much has the solution changed? How close is f(x^{k+1}) to zero?
-                xp1mx = xp1 - x
-                
-                infodict['residual_x'].append(la.norm(xp1mx) / la.norm(xp1))
-                infodict['residual_f'].append(la.norm(residual) / la.norm(b))
-                
-                if self.solids:
-                    fp1 = self.unpack(xp1)[3:]
-                    for l, solid in enumerate(self.solids):
-                        infodict[f'{solid.name}_fx'].append(2*np.sum(fp1[2*l]))
-                        infodict[f'{solid.name}_fy'].append(2*np.sum(fp1[2*l+1]))
-                        
+                with phase('forces'):
+                    xp1mx = xp1 - x
+
+                    infodict['residual_x'].append(la.norm(xp1mx) / la.norm(xp1))
+                    infodict['residual_f'].append(la.norm(residual) / la.norm(b))
+
+                    if self.solids:
+                        fp1 = self.unpack(xp1)[3:]
+                        for l, solid in enumerate(self.solids):
+                            infodict[f'{solid.name}_fx'].append(2*np.sum(fp1[2*l]))
+                            infodict[f'{solid.name}_fy'].append(2*np.sum(fp1[2*l+1]))
+
+                    if self.precision == 'single':
+                        infodict['rel.error(u,v)'].append(iJ.error['velocity'])
+                        infodict['rel.error(p)'].append(iJ.error['pressure'])
+
+                stop = False
+                if monitors:
+                    with phase('monitors'):
+                        values = {key: infodict[key][k] for key in header}
+                        for monitor in monitors:
+                            stop = monitor.update(k, np.nan, _readonly(xp1), uBC, vBC, values) or stop
+
                 # Print (if verbose) the iteration count, residuals and forces
                 # on the immersed boundaries.
                 if verbose:
@@ -426,12 +1205,13 @@ class Solver:
                 #     This may lead to diverging iterations if the boundary is not
                 #     sufficiently far downstream from the obstacle(s).
                 if outflowEast:
-                    u, v = self.reshape(*self.unpack(x))[:2]
-                    uBC[1][:], vBC[1][:] = np.mean(u[:, -5:], axis=1), np.mean(v[:, -5:], axis=1)
-                    bc = self.boundary_condition_terms(uBC, vBC, *sBC)
+                    with phase('boundary'):
+                        u, v = self.reshape(*self.unpack(x))[:2]
+                        uBC[1][:], vBC[1][:] = np.mean(u[:, -5:], axis=1), np.mean(v[:, -5:], axis=1)
+                        bc = self.boundary_condition_terms(uBC, vBC, *sBC)
 
                 # If the tolerances are reached, stop iterating.
-                if infodict['residual_x'][-1] < xtol and infodict['residual_f'][-1] < ftol:
+                if stop or (infodict['residual_x'][-1] < xtol and infodict['residual_f'][-1] < ftol):
                     break
             else:
                 if verbose:
@@ -439,16 +1219,34 @@ class Solver:
         except KeyboardInterrupt:
             print("Interrupting at iteration number", k)
             pass 
+        finally:
+            profile.stop()
+            self.profile = previous
 
         infodict.update((key, np.asarray(value)) for key, value in infodict.items())
 
+        if sensitivities and self.solids:
+            if iJ is None:
+                J = self.jacobian(uBC, vBC, *self.reshape(*self.unpack(x))[:2])
+                iJ = self.linear_solver(J, role='jacobian', split=(self.pStart, self.pEnd))
+            infodict['sensitivities'] = self.force_sensitivities(x, uBC, vBC, iJ)
+
+        for monitor in monitors:
+            infodict.update(monitor.result())
+        infodict['profile'] = profile
+        infodict['memory'] = dict(self.memory(), JnoAdv=_tools.nbytes(JnoAdv), **memory)
+
         return x, infodict
 
 
     def steps(self, x, uBC, vBC, sBC=(), outflowEast=False, number=1, saveEvery=None, 
-              verbose=1, checkSolvers=False, Nm1=None):
+              verbose=1, checkSolvers=False, Nm1=None, t0=0.0, k0=0, checkpoint=None,
+              checkpointEvery=None, dtm1=None, CFL=None, sfd=None, sfdTol=0.0, xbar=None,
+              monitors=(), profile=None, uBC0=None, vBC0=None, forcing=None):
         """Time-step the governing equations.
 
+        The time integration scheme is set with `set_scheme` (CNAB2 by default).
+
         Parameters
         ----------
         x : np.ndarray
@@ -477,37 +1275,110 @@ class Solver:
         Nm1 : np.ndarray, optional
             Advection terms at the previous time-step. If None, the first
             step is performed using explicit Euler method.
+        t0 : float, optional
+            Time at the initial condition.
+        k0 : int, optional
+            Number of time steps performed before the initial condition.
+        checkpoint : str, optional
+            File where checkpoints are written (see `save_checkpoint`). A
+            checkpoint is always written after the last time step.
+        checkpointEvery : int, optional
+            Specify how often checkpoints are written. By default, only
+            after the last time step.
+        dtm1 : float, optional
+            Time step at which Nm1 was computed. By default, dt.
+        CFL : float, optional
+            If provided, the time step is adapted at every step: the largest
+            time step level (see `set_Co`) that keeps the convective Courant
+            number below `CFL` is chosen, going up at most one level per step.
+            Adams-Bashforth coefficients account for the variable time step.
+        sfd : tuple, optional
+            Gain χ and filter width Δ of the selective frequency damping method.
+            If provided, the velocity field is relaxed towards its low-pass
+            filtered version, which drives the solution to a steady state
+            (stable or not). The SFD equations are integrated exactly after each
+            time step (encapsulated formulation, Jordi et al. JCP 2014).
+        sfdTol : float, optional
+            Stop when |q - q̄|_2 is smaller than `sfdTol`, where q and q̄ are the
+            velocity field and its filtered version.
+        xbar : np.ndarray, optional
+            Filtered state vector (packed). By default, the initial condition.
+        monitors : list, optional
+            List of monitors (see `ibmos.monitors`) evaluated after every time
+            step, e.g. callbacks and loggers. The time integration stops as
+            soon as one of them says so.
+        profile : Profile, optional
+            Profile where the time spent in each phase (advection, rhs,
+            propagator, factorization, solve, boundary, forces, monitors...) and
+            the counters are accumulated (see `ibmos.profiling`). By default, a
+            new one.
+        uBC0 : list, optional
+            Boundary conditions on the horizontal velocity component at the
+            initial condition, if they differ from uBC (e.g. interpolated
+            from a coarser grid, see `ibmos.multidomain`). The first step
+            uses them for the advection terms and the old half of the
+            Crank-Nicolson viscous terms. By default, uBC.
+        vBC0 : list, optional
+            Boundary conditions on the vertical velocity component at the
+            initial condition. By default, vBC.
+        forcing : np.ndarray, optional
+            Body force added to the right-hand-side of the momentum equations
+            (first pStart entries, integrated over the cells like the forces
+            on the immersed boundaries), e.g. the immersed boundaries of a
+            finer grid (see `ibmos.multidomain`).
 
         Returns
         -------
         xres : (np.ndarray)
-            Flow fields sampled every saveEvery steps.
+            Flow fields sampled every saveEvery steps. If the time integration
+            stops before `number` steps, the last flow field is also returned.
+            They are stored in the precision of the snapshots (see `set_precision`).
         tres: list (np.ndarray)
             Time.
         infodict: dict
-            Norm of the state vector, temporal derivative, and forces.
+            Norm of the state vector, temporal derivative, and forces. With
+            selective frequency damping, also |q - q̄|_2 and the filtered
+            state vector (xbar). Results of the monitors, the advection
+            terms at the last time step (Nm1, to continue the time
+            integration), the profile and the memory held by the operators
+            and factorizations (see `memory`) are also included, and in single precision the relative residuals
+            of the velocity and pressure solves (see `set_precision`).
 
         """
-        if not self.stepsInitialized:
-            self.A, self.B = self.propagator(self.fractionalStep)
-            self.iA = [self.solver(Ak)[0] for Ak in self.A]
-            self.stepsInitialized = True
+        profile = Profile() if profile is None else profile
+        phase = profile.phase
+
+        # Time step. When adapting the time step, we start from the previous one.
+        dt = self.dt if CFL is None or dtm1 is None else dtm1
+        if dtm1 is None:
+            dtm1 = dt
 
         if saveEvery is None:
             saveEvery = number
 
         xres, tres = [], []
 
+        uBC0 = uBC if uBC0 is None else uBC0
+        vBC0 = vBC if vBC0 is None else vBC0
+
         # Advection terms at the CURRENT time step.
-        N = np.r_[self.fluid.advection(*self.reshape(*self.unpack(x))[:2], uBC, vBC)]
+        with phase('advection'):
+            N = np.r_[self.fluid.advection(*self.reshape(*self.unpack(x))[:2], uBC0, vBC0)]
 
         # If we were not provided with the advection terms at the PREVIOUS
         # time step, we use the current ones.
-        if not Nm1:
+        if Nm1 is None:
             Nm1 = N
 
         # Contribution of the boundary conditions to the right-hand-side.
-        bc = self.boundary_condition_terms(uBC, vBC, *sBC)
+        with phase('boundary'):
+            bc = bc0 = self.boundary_condition_terms(uBC, vBC, *sBC)
+
+            # First step: viscous terms averaged between the initial and final boundary conditions.
+            if uBC0 is not uBC or vBC0 is not vBC:
+                bc0 = bc.copy()
+                bc0[:self.pStart] += self.boundary_condition_terms(uBC0, vBC0, *sBC)[:self.pStart]
+                bc0[:self.pStart] *= 0.5
 
         # Dictionary with output variables
         header = ['t', 'x_2', 'dxdt_2']
@@ -515,11 +1386,18 @@ class Solver:
                               for solid in self.solids]))
         if outflowEast:
             header.append('Uinf@outlet')
+        if CFL is not None:
+            header.extend(['dt', 'CFL'])
+        if sfd:
+            header.append('sfd_residual')
+            xbar = x.copy() if xbar is None else xbar.copy()
         if checkSolvers:
             if self.fractionalStep:
                 header.extend(['rel.error(A)', 'rel.error(C)'])
             else:
                 header.append('rel.error(A)')
+        if self.precision == 'single':
+            header.extend(['rel.error(u,v)', 'rel.error(p)'])
 
         # Create dictionary
         infodict = dict(zip(header, (np.empty(number) for _ in header)))
@@ -529,79 +1407,316 @@ class Solver:
             print("       k", "".join((f'{elem:>12} ' for elem in header)))
 
 
-        # Main loop.
-        try:
-            for k in range(number):
-                infodict['t'][k] = (k+1)*self.dt
-
-                # Build right-hand-side.
-                # terms at current time step plus boundary conditions plus advection.
-                # And compute timestep
-
-                # Compute next time step. Time consuming part
-                if self.fractionalStep:
-                    b = self.B[0] @ x[:self.pStart] + bc[:self.pStart]
-                    b += -1.5 * N + 0.5 * Nm1
-
-                    qast = self.iA[0](b, x0=None if k==0 else qast)
-                    λ = self.iA[1](self.B[2]@qast - bc[self.pStart:], x0=None if k==0 else λ)
+        for monitor in monitors:
+            monitor.start(self, number)
 
-                    xp1 = np.r_[qast - self.B[1]@(self.B[2].T@λ), λ]
+        # Linear solvers record factorizations and solves in the profile.
+        previous, self.profile = self.profile, profile
+        profile.start()
 
-                    if checkSolvers:
-                        infodict['rel.error(A)'][k] = la.norm(self.A[0]@qast - b)/la.norm(b)
-                        infodict['rel.error(C)'][k] = la.norm(self.A[1]@λ - self.B[2]@qast + bc[self.pStart:])/la.norm(self.B[2]@qast - bc[self.pStart:])
-                else:
-                    b = self.B[0] @ x + bc
-                    b[:self.pStart] += -1.5 * N + 0.5 * Nm1
-                    xp1 = self.iA[0](b, x0=None if k==0 else xp1)
+        # Main loop.
+        t = t0
+        xp1 = qast = λ = None
+        completed = 0
 
-                    if checkSolvers:
-                        infodict['rel.error(A)'][k] = (la.norm(self.A[0]@xp1 - b)/la.norm(b))
+        # State at the beginning of the current step (returned if interrupted).
+        xk, tk, Nm1k = x, t, Nm1
+        try:
+            for k in range(number):
+                stop = False
+
+                # Adapt time step: go down as much as needed, but up only one level.
+                if CFL is not None:
+                    with phase('courant'):
+                        rate = self.courant(x, uBC, vBC, 1.0)
+                    level = min(np.searchsorted(self.dtLevels, dt) + 1,
+                                np.count_nonzero(self.dtLevels * rate <= CFL) - 1)
+                    dt = self.dtLevels[max(level, 0)]
+
+                    infodict['dt'][k] = dt
+                    infodict['CFL'][k] = rate * dt
+
+                t += dt
+                infodict['t'][k] = t
+
+                bck = bc0 if k == 0 else bc
+                for stage, (h, αN, αNm1) in enumerate(self.scheme.stages(dt, dtm1)):
+                    self.A, self.B, self.iA = self.cached_propagator(h)
+
+                    # Advection terms at the current and previous stages.
+                    if stage:
+                        x, Nm1 = xp1, N
+                        with phase('advection'):
+                            N = np.r_[self.fluid.advection(*self.reshape(*self.unpack(x))[:2], uBC, vBC)]
+
+                    # Build right-hand-side.
+                    # terms at current time step plus boundary conditions plus advection.
+                    # And compute timestep
+
+                    # Compute next time step. Time consuming part
+                    if self.fractionalStep:
+                        with phase('rhs'):
+                            b = self.B[0] @ x[:self.pStart] + bck[:self.pStart]
+                            b += -αN * N + αNm1 * Nm1
+                            if forcing is not None:
+                                b += forcing
+
+                        qast = self.iA[0](b, x0=qast)
+                        with phase('rhs'):
+                            c = self.B[2]@qast - bck[self.pStart:]
+                        λ = self.iA[1](c, x0=λ)
+
+                        with phase('projection'):
+                            xp1 = np.r_[qast - self.B[1]@(self.B[2].T@λ), λ]
+
+                        if checkSolvers:
+                            infodict['rel.error(A)'][k] = la.norm(self.A[0]@qast - b)/la.norm(b)
+                            infodict['rel.error(C)'][k] = la.norm(self.A[1]@λ - self.B[2]@qast + bck[self.pStart:])/la.norm(self.B[2]@qast - bck[self.pStart:])
+                    else:
+                        with phase('rhs'):
+                            b = self.B[0] @ x + bck
+                            b[:self.pStart] += -αN * N + αNm1 * Nm1
+                            if forcing is not None:
+                                b[:self.pStart] += forcing
+                        xp1 = self.iA[0](b, x0=xp1)
+
+                        if checkSolvers:
+                            infodict['rel.error(A)'][k] = (la.norm(self.A[0]@xp1 - b)/la.norm(b))
+
+                    # Error of the single precision solves after refinement.
+                    if self.precision == 'single':
+                        error = dict(chain(*(solve.error.items() for solve in self.iA)))
+                        infodict['rel.error(u,v)'][k] = error['velocity']
+                        infodict['rel.error(p)'][k] = error['pressure']
+
+                # Selective frequency damping: exact solution over one time step of
+                # dq/dt = -χ(q - q̄), dq̄/dt = (q - q̄)/Δ, where q + χΔq̄ is invariant.
+                if sfd:
+                    with phase('sfd'):
+                        χ, Δ = sfd
+                        q, qbar = xp1[:self.pStart], xbar[:self.pStart]
+
+                        w = q + χ * Δ * qbar
+                        d = (q - qbar) * np.exp(-(χ + 1 / Δ) * dt)
+                        q[:], qbar[:] = (w + χ * Δ * d) / (1 + χ * Δ), (w - d) / (1 + χ * Δ)
+
+                        infodict['sfd_residual'][k] = la.norm(q - qbar)
+                        stop = infodict['sfd_residual'][k] < sfdTol
+
+                with phase('forces'):
+                    infodict['x_2'][k] = la.norm(xp1)
+                    infodict['dxdt_2'][k] = la.norm(xp1-xk)/dt
+
+                    if self.solids:
+                        fp1 = self.unpack(xp1)[3:]
+                        for l, solid in enumerate(self.solids):
+                            infodict[f'{solid.name}_fx'][k] = 2*np.sum(fp1[2*l])
+                            infodict[f'{solid.name}_fy'][k] = 2*np.sum(fp1[2*l+1])
 
-                infodict['x_2'][k] = la.norm(xp1)
-                infodict['dxdt_2'][k] = la.norm(xp1-x)/self.dt
+                if outflowEast:
+                    with phase('boundary'):
+                        u, v = self.reshape(*self.unpack(xp1))[:2]
 
-                if self.solids:
-                    fp1 = self.unpack(xp1)[3:]
-                    for l, solid in enumerate(self.solids):
-                        infodict[f'{solid.name}_fx'][k] = 2*np.sum(fp1[2*l])
-                        infodict[f'{solid.name}_fy'][k] = 2*np.sum(fp1[2*l+1])
+                        Uinf = np.sum(self.fluid.u.dy*u[:,-1])/(self.fluid.y[-1]-self.fluid.y[0])
+                        infodict['Uinf@outlet'][k] = Uinf
+                        dx = (self.fluid.x[-1]-self.fluid.x[-2])
+                        uBC[1][:] = uBC[1][:] - Uinf*dt/dx*(uBC[1][:] - u[:,-1])
+                        vBC[1][:] = vBC[1][:] - Uinf*dt/dx*(vBC[1][:] - v[:,-1])
+                        bc = self.boundary_condition_terms(uBC, vBC, *sBC)
 
-                if outflowEast:
-                    u, v = self.reshape(*self.unpack(xp1))[:2]
+                profile.count('steps')
 
-                    Uinf = np.sum(self.fluid.u.dy*u[:,-1])/(self.fluid.y[-1]-self.fluid.y[0])
-                    infodict['Uinf@outlet'][k] = Uinf
-                    dx = (self.fluid.x[-1]-self.fluid.x[-2])
-                    uBC[1][:] = uBC[1][:] - Uinf*self.dt/dx*(uBC[1][:] - u[:,-1])
-                    vBC[1][:] = vBC[1][:] - Uinf*self.dt/dx*(vBC[1][:] - v[:,-1])
-                    bc = self.boundary_condition_terms(uBC, vBC, *sBC)
+                if monitors:
+                    with phase('monitors'):
+                        values = {key: infodict[key][k] for key in header}
+                        for monitor in monitors:
+                            stop = monitor.update(k, t, _readonly(xp1), uBC, vBC, values) or stop
 
                 # If reportEvery is not None, print current step, time, residuals and,
                 # if we have immersed boundaries, print also the forces.
-                if verbose and ((k + 1) % verbose == 0 or (k + 1) == number):
+                last = stop or k == number - 1
+
+                if verbose and ((k + 1) % verbose == 0 or last):
                     print(f"{k+1:8}", "".join((f'{infodict[elem][k]: 12.5e} ' for elem in header)))
 
                 # Prepare for the next time step
                 x = xp1
-                Nm1 = N
-                if k != number - 1:
-                    N = np.r_[self.fluid.advection(*self.reshape(*self.unpack(x))[:2], uBC, vBC)]
+                Nm1, dtm1 = N, dt
+                xk, tk, Nm1k = x, t, Nm1
+                if not last:
+                    with phase('advection'):
+                        N = np.r_[self.fluid.advection(*self.reshape(*self.unpack(x))[:2], uBC, vBC)]
 
                 # Append vector to xres?
-                if (k + 1) % saveEvery == 0:
-                    xres.append(x)
-                    tres.append((k+1)*self.dt)
+                if (k + 1) % saveEvery == 0 or (stop and k != number - 1):
+                    xres.append(x.astype(_dtypes[self.snapshots]))
+                    tres.append(t)
+
+                # Write checkpoint?
+                if checkpoint and ((checkpointEvery and (k0 + k + 1) % checkpointEvery == 0) or last):
+                    with phase('checkpoint'):
+                        self.save_checkpoint(checkpoint, x, uBC, vBC, sBC, Nm1, t, k0 + k + 1, dt, xbar)
+
+                completed = k + 1
+                if stop:
+                    break
         except KeyboardInterrupt:
-            print("Interrupting at t =", k*self.dt)
-            xres.append(x)
-            tres.append(k*self.dt)
-            pass 
+            print("Interrupting at t =", tk)
+            xres.append(xk.astype(_dtypes[self.snapshots]))
+            tres.append(tk)
+            Nm1 = Nm1k
+        finally:
+            profile.stop()
+            self.profile = previous
+
+        # Discard the entries of the steps that were not performed.
+        infodict.update((key, value[:completed]) for key, value in infodict.items())
+        if sfd:
+            infodict['xbar'] = xbar
+        for monitor in monitors:
+            infodict.update(monitor.result())
+        infodict['Nm1'] = Nm1
+        infodict['profile'] = profile
+        infodict['memory'] = self.memory()
 
         # Return state vectors
         return np.squeeze(xres), np.squeeze(tres), infodict
 
+    def save_checkpoint(self, filename, x, uBC, vBC, sBC=(), Nm1=None, t=0.0, k=0, dt=None,
+                        xbar=None):
+        """Write a checkpoint of a time integration to disk.
+
+        The checkpoint is first written to a temporary file in the same
+        directory, which then replaces `filename`. Hence, `filename` always
+        holds a complete checkpoint even if the process is killed while
+        writing.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the checkpoint file (.npz).
+        x : np.ndarray
+            State vector (packed).
+        uBC : list
+            Boundary conditions on the horizontal velocity component.
+        vBC : list
+            Boundary conditions on the vertical velocity component.
+        sBC : list, optional
+            Velocity on the immersed boundaries.
+        Nm1 : np.ndarray, optional
+            Advection terms at the time step previous to `x`.
+        t : float, optional
+            Time.
+        k : int, optional
+            Time step counter.
+        dt : float, optional
+            Last time step. By default, the one set with `set_Co`.
+        xbar : np.ndarray, optional
+            Filtered state vector (selective frequency damping).
+
+        """
+
+        arrays = dict(x=x, t=t, k=k, dt=self.dt if dt is None else dt, iRe=self.iRe)
+        if Nm1 is not None:
+            arrays['Nm1'] = Nm1
+        if xbar is not None:
+            arrays['xbar'] = xbar
+        arrays.update((f'uBC{l}', bc) for l, bc in enumerate(uBC))
+        arrays.update((f'vBC{l}', bc) for l, bc in enumerate(vBC))
+        arrays.update((f'sBC{l}', np.asarray(bc)) for l, bc in enumerate(sBC))
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        fd, tmpname = tempfile.mkstemp(suffix='.npz', dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpname, filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+    def load_checkpoint(self, filename):
+        """Read a checkpoint written by `save_checkpoint`.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the checkpoint file (.npz).
+
+        Returns
+        -------
+        dict
+            Dictionary with keys x, uBC, vBC, sBC, Nm1, xbar, t, k, dt and iRe.
+
+        Raises
+        ------
+        ValueError
+            The checkpoint does not match the size of the state vector.
+
+        """
+
+        with np.load(filename) as data:
+            checkpoint = dict(x=data['x'], Nm1=data['Nm1'] if 'Nm1' in data else None,
+                              xbar=data['xbar'] if 'xbar' in data else None,
+                              t=data['t'].item(), k=data['k'].item(),
+                              dt=data['dt'].item(), iRe=data['iRe'].item())
+            for name in ('uBC', 'vBC', 'sBC'):
+                keys = sorted((key for key in data if key.startswith(name)),
+                              key=lambda key: int(key[len(name):]))
+                checkpoint[name] = [data[key] for key in keys]
+
+        checkpoint['sBC'] = tuple(tuple(bc) for bc in checkpoint['sBC'])
+
+        if checkpoint['x'].size != np.sum(self.sizes()):
+            raise ValueError("Checkpoint does not match the state vector: size %d (expected %d)" %
+                             (checkpoint['x'].size, np.sum(self.sizes())))
+
+        return checkpoint
+
+    def resume(self, filename, number=1, **kwargs):
+        """Resume a time integration from a checkpoint.
+
+        With direct linear solvers, the time integration continues exactly as
+        if it had not been interrupted.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the checkpoint file (.npz).
+        number : int, optional
+            Number of time steps.
+        kwargs : dict, optional
+            Additional arguments to `steps`. By default, checkpoints keep
+            being written to `filename`.
+
+        Returns
+        -------
+        See `steps`.
+
+        Raises
+        ------
+        ValueError
+            The Reynolds number of the checkpoint does not match that of the
+            solver.
+
+        """
+
+        checkpoint = self.load_checkpoint(filename)
+
+        if checkpoint['iRe'] != self.iRe:
+            raise ValueError("Checkpoint written with iRe=%e (solver: iRe=%e)" %
+                             (checkpoint['iRe'], self.iRe))
+
+        kwargs.setdefault('checkpoint', filename)
+        if checkpoint['xbar'] is not None:
+            kwargs.setdefault('xbar', checkpoint['xbar'])
+
+        return self.steps(checkpoint['x'], checkpoint['uBC'], checkpoint['vBC'], checkpoint['sBC'],
+                          number=number, Nm1=checkpoint['Nm1'], t0=checkpoint['t'],
+                          k0=checkpoint['k'], dtm1=checkpoint['dt'], **kwargs)
+
     def shapes(self):
         """Return the shapes of the fields stacked in the state vector.
 
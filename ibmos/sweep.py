@@ -0,0 +1,372 @@
+"""Parameter sweeps on a fixed grid and set of solids.
+
+Cases that only differ in the Reynolds number, boundary conditions or velocity
+of the immersed boundaries share the grid-dependent operators (Laplacian,
+divergence and interpolation matrices), which are built once and placed in
+shared memory, so that the worker processes do not rebuild nor copy them.
+
+Sweeps can also be run from the command line (`ibmos-sweep config.json`), see
+`main` for the format of the configuration file.
+"""
+
+import argparse
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+
+from . import shapes
+from .solver import Solver
+
+# Operators of the solver placed in shared memory.
+_operators = ('laplacian', 'divergence', 'E')
+
+
+def _map(obj, function):
+    """Apply function to the sparse matrices in nested lists/tuples."""
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_map(elem, function) for elem in obj)
+    return function(obj)
+
+
+def _share(matrix, segments):
+    """Copy CSR arrays of matrix to shared memory and return their description."""
+    matrix = sp.csr_matrix(matrix)
+
+    arrays = []
+    for array in (matrix.data, matrix.indices, matrix.indptr):
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, segment.buf)[:] = array
+        segments.append(segment)
+        arrays.append((segment.name, array.dtype.str, array.shape))
+
+    return {'shape': matrix.shape, 'arrays': arrays}
+
+
+def _attach(description, segments):
+    """Return CSR matrix whose arrays are in shared memory."""
+    views = []
+    for name, dtype, size in description['arrays']:
+        segment = shared_memory.SharedMemory(name=name)
+        segments.append(segment)
+        views.append(np.ndarray(size, dtype, segment.buf))
+
+    return sp.csr_matrix(tuple(views), shape=description['shape'], copy=False)
+
+
+def share_operators(solver):
+    """Place the operators of the solver in shared memory.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+
+    Returns
+    -------
+    state : dict
+        Picklable state of the solver, where the operators are replaced by the
+        description of their arrays in shared memory (see `attach_operators`).
+    segments : list
+        Shared memory segments. They must be closed and unlinked by the caller
+        once the workers are done.
+
+    """
+    segments = []
+
+    state = solver.__getstate__()
+    for name in _operators:
+        state[name] = _map(state[name], lambda matrix: _share(matrix, segments))
+
+    return state, segments
+
+
+def attach_operators(state, segments):
+    """Return solver whose operators are those in shared memory.
+
+    Parameters
+    ----------
+    state : dict
+        State returned by `share_operators`.
+    segments : list
+        List where the attached segments are appended (they must be kept alive
+        while the solver is in use).
+
+    Returns
+    -------
+    Solver
+        Flow solver.
+
+    """
+    state = dict(state)
+    for name in _operators:
+        state[name] = _map(state[name], lambda description: _attach(description, segments))
+
+    solver = Solver.__new__(Solver)
+    solver.__dict__.update(state)
+    return solver
+
+
+def run_case(solver, case, uBC, vBC, sBC=(), x0=None, method='steady_state', **kwargs):
+    """Run a single case.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    case : dict
+        Parameters of the case: iRe, Co, uBC, vBC, sBC and x0 replace the
+        defaults; other entries are passed to `method`.
+    uBC : list
+        Default boundary conditions on the horizontal velocity component.
+    vBC : list
+        Default boundary conditions on the vertical velocity component.
+    sBC : list, optional
+        Default velocity on the immersed boundaries.
+    x0 : np.ndarray, optional
+        Default initial condition (or initial guess). By default, zero.
+    method : str, optional
+        'steady_state' or 'steps'.
+    kwargs : dict
+        Default options of `method`.
+
+    Returns
+    -------
+    x : np.ndarray
+        Solution (packed state vector).
+    infodict : dict
+        Information returned by `method`.
+
+    """
+    case = dict(case)
+
+    if 'iRe' in case:
+        solver.set_iRe(case.pop('iRe'))
+    if 'Co' in case:
+        solver.set_Co(case.pop('Co'))
+
+    uBC = [np.array(bc, dtype=float) for bc in case.pop('uBC', uBC)]
+    vBC = [np.array(bc, dtype=float) for bc in case.pop('vBC', vBC)]
+    sBC = case.pop('sBC', sBC)
+    x0 = case.pop('x0', x0)
+    x0 = solver.zero() if x0 is None else np.array(x0, dtype=float)
+
+    options = dict(kwargs, verbose=0, **case)
+
+    if method == 'steady_state':
+        return solver.steady_state(x0, uBC, vBC, sBC, **options)
+    elif method == 'steps':
+        x, _, infodict = solver.steps(x0, uBC, vBC, sBC, **options)
+        return x, infodict
+    else:
+        raise ValueError("Unknown method '%s' (available: steady_state, steps)" % method)
+
+
+# Flow solver, shared memory segments and defaults used by the worker processes.
+_worker = None
+
+
+def _initialize_worker(state, defaults):
+    global _worker
+    segments = []
+    _worker = attach_operators(state, segments), segments, defaults
+
+
+def _worker_run_case(case):
+    solver, _, (args, kwargs) = _worker
+    return run_case(solver, case, *args, **kwargs)
+
+
+def sweep(solver, cases, uBC, vBC, sBC=(), x0=None, method='steady_state', workers=None,
+          labels=None, verbose=True, options=None, **kwargs):
+    """Run a set of cases on the same grid and solids.
+
+    Parameters
+    ----------
+    solver : Solver
+        Flow solver.
+    cases : list
+        List of dictionaries with the parameters of each case (see `run_case`).
+    uBC : list
+        Default boundary conditions on the horizontal velocity component.
+    vBC : list
+        Default boundary conditions on the vertical velocity component.
+    sBC : list, optional
+        Default velocity on the immersed boundaries.
+    x0 : np.ndarray, optional
+        Default initial condition (or initial guess). By default, zero.
+    method : str, optional
+        'steady_state' or 'steps'.
+    workers : int, optional
+        Number of processes. By default, cases run sequentially in the current
+        process (and the settings of the solver are modified by the cases).
+        Otherwise, the operators are shared by the processes.
+    labels : list, optional
+        Parameters shown in the results table for each case. By default, cases.
+    verbose : bool, optional
+        Print the results table.
+    options : dict, optional
+        Default options of `method`, e.g. those whose names are also
+        parameters of `sweep` (such as verbose).
+    kwargs : dict
+        Default options of `method` (they replace those in `options`).
+
+    Returns
+    -------
+    table : dict
+        Results table: one column (np.ndarray) per scalar parameter of the
+        cases and per entry of the infodicts (last value), one row per case.
+    results : list
+        Solution and infodict of each case.
+
+    """
+    kwargs = dict(options or {}, **kwargs)
+    defaults = (uBC, vBC, sBC, x0, method), kwargs
+
+    if workers:
+        state, segments = share_operators(solver)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_initialize_worker,
+                                     initargs=(state, defaults)) as pool:
+                results = list(pool.map(_worker_run_case, cases))
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+    else:
+        results = [run_case(solver, case, *defaults[0], **kwargs) for case in cases]
+
+    table = results_table(labels or cases, results)
+
+    if verbose:
+        print("".join((f'{key:>16} ' for key in table)))
+        for row in zip(*table.values()):
+            print("".join((f'{value: 16.8e} ' for value in row)))
+
+    return table, results
+
+
+def results_table(labels, results):
+    """Return results table (see `sweep`)."""
+    rows = []
+    for case, (x, infodict) in zip(labels, results):
+        row = {key: value for key, value in case.items() if np.isscalar(value)}
+        for key, value in infodict.items():
+            value = np.asarray(value)
+            if not np.issubdtype(value.dtype, np.floating) and not np.issubdtype(value.dtype, np.integer):
+                continue
+            if value.ndim == 1 and value.size:
+                row[key] = value[-1]
+            elif value.ndim == 0:
+                row[key] = value[()]
+        rows.append(row)
+
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    return {key: np.array([row.get(key, np.nan) for row in rows], dtype=float) for key in keys}
+
+
+def solver_from_config(config):
+    """Return flow solver built from a configuration (see `main`)."""
+    grid = config['grid']
+    x, y = (np.linspace(*grid[key]) for key in ('x', 'y'))
+
+    solver = Solver(x, y, 1 / config.get('Re', 1.0), config.get('Co', 0.5), grid.get('periodic', False))
+
+    solids = []
+    for solid in config.get('solids', []):
+        solid = dict(solid)
+        shape = getattr(shapes, solid.pop('shape'))
+        solids.append(shape(solid.pop('name'), ds=solid.pop('ds', solver.dxmin), **solid))
+    solver.set_solids(*solids)
+
+    return solver
+
+
+def case_from_config(solver, case):
+    """Return case (see `run_case`) from its configuration (see `main`)."""
+    case = dict(case)
+
+    if 'Re' in case:
+        case['iRe'] = 1 / case.pop('Re')
+
+    # Uniform flow: boundary conditions and initial condition.
+    u, v = case.pop('u', 0.0), case.pop('v', 0.0)
+
+    uBC, vBC = solver.zero_boundary_conditions()
+    for bc in uBC:
+        bc[:] = u
+    for bc in vBC:
+        bc[:] = v
+
+    x0 = solver.zero()
+    x0[:solver.fluid.u.size], x0[solver.fluid.u.size:solver.pStart] = u, v
+
+    case.update(uBC=uBC, vBC=vBC, x0=x0)
+
+    if 'sBC' in case:
+        velocity = case.pop('sBC')
+        case['sBC'] = tuple((np.full(solid.l, velocity.get(solid.name, (0.0, 0.0))[0]),
+                             np.full(solid.l, velocity.get(solid.name, (0.0, 0.0))[1]))
+                            for solid in solver.solids)
+
+    return case
+
+
+def main(argv=None):
+    """Run a sweep defined in a JSON configuration file.
+
+    Example of configuration file:
+
+        {
+            "grid": {"x": [-5, 15, 201], "y": [-5, 5, 101], "periodic": false},
+            "solids": [{"shape": "cylinder", "name": "cylinder", "x": 0, "y": 0, "r": 0.5}],
+            "Co": 0.5,
+            "method": "steady_state",
+            "options": {"maxit": 20},
+            "defaults": {"Re": 40, "u": 1.0, "v": 0.0},
+            "cases": [{"Re": 20}, {"Re": 40, "sBC": {"cylinder": [0.0, 0.1]}}],
+            "workers": 4,
+            "output": "sweep.csv"
+        }
+
+    Solids are created with the functions in `ibmos.shapes` (by default, with
+    ds equal to the smallest grid spacing). Boundary conditions are uniform
+    (u, v) on the four boundaries and velocities on the immersed boundaries
+    are uniform on each solid. Case entries replace those in defaults; other
+    entries are passed to `Solver.steady_state` or `Solver.steps`. The initial
+    condition is the uniform flow of each case.
+    """
+    parser = argparse.ArgumentParser(prog='ibmos-sweep', description=main.__doc__.splitlines()[0])
+    parser.add_argument('config', help="JSON configuration file")
+    parser.add_argument('-o', '--output', help="CSV file with the results table")
+    parser.add_argument('-w', '--workers', type=int, help="number of processes")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    solver = solver_from_config(config)
+
+    labels = [dict(config.get('defaults', {}), **case) for case in config['cases']]
+    cases = [case_from_config(solver, case) for case in labels]
+
+    uBC, vBC = solver.zero_boundary_conditions()
+    sBC = tuple((np.zeros(solid.l), np.zeros(solid.l)) for solid in solver.solids)
+
+    table, _ = sweep(solver, cases, uBC, vBC, sBC, method=config.get('method', 'steady_state'),
+                     workers=config.get('workers') if args.workers is None else args.workers, labels=labels,
+                     options=config.get('options', {}))
+
+    output = args.output or config.get('output')
+    if output:
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(table.keys())
+            writer.writerows(zip(*table.values()))
+
+
+if __name__ == '__main__':
+    main()
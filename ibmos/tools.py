@@ -3,76 +3,178 @@ import numpy as np
 from scipy.special import erf
 
 
-def solver_pardiso(A):
+def solver_pardiso(A, symmetric=False, definite=False, **properties):
     """ 
     Return a function for solving a sparse linear system using PARDISO.
+
+    Symmetric matrices are factorized with the Cholesky (positive definite)
+    or Bunch-Kaufman LDL^T (indefinite) methods, which only use the upper
+    triangle of `A`.
     
     Parameters
     ----------
     A : (N, N) array_like
         Input.
+    symmetric : bool, optional
+        `A` is symmetric.
+    definite : bool, optional
+        `A` is positive definite.
+    properties : dict, optional
+        Other properties of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
     
-    from pypardiso import spsolve, PyPardisoSolver
+    from pypardiso import spsolve
+
+    A, pypardisosolver = _pardiso(A, symmetric, definite)
+
+    # Factorize now, so that the memory of the factors is known.
+    pypardisosolver.factorize(A)
+
+    def solver(b, x0=None, trans=False):
+        if not trans or symmetric:
+            return spsolve(A, b, squeeze=False, solver=pypardisosolver)
+
+        pypardisosolver.set_iparm(12, 2)  # solve transposed system
+        try:
+            return spsolve(A, b, squeeze=False, solver=pypardisosolver)
+        finally:
+            pypardisosolver.set_iparm(12, 0)
+
+    # Permanent memory of the symbolic analysis and memory of the factors (in KB).
+    solver.nbytes = 1024 * (pypardisosolver.iparm[15] + pypardisosolver.iparm[16])
+
+    return solver, pypardisosolver
+
+
+def _pardiso(A, symmetric=False, definite=False):
+    """Return matrix (upper triangle if symmetric) and configured PyPardisoSolver."""
+
+    from pypardiso import PyPardisoSolver
+    import scipy.sparse as sp
+
+    if symmetric:
+        A = sp.triu(A, format='csr')
     
-    pypardisosolver = PyPardisoSolver(mtype=11)
+    pypardisosolver = PyPardisoSolver(mtype=(2 if definite else -2) if symmetric else 11)
     pypardisosolver.set_iparm(1, 1)
     pypardisosolver.set_iparm(2, 2)
-    pypardisosolver.set_iparm(10, 10) # pivot drop tol. (was 13)
+    pypardisosolver.set_iparm(10, 10 if not symmetric or definite else 8) # pivot drop tol. (was 13)
     pypardisosolver.set_iparm(11, 1) # 0 disable, 1 enable scaling vectors.
-    pypardisosolver.set_iparm(13, 0) # 0 disable, 1 matching normal, 2 advanced matching
+    pypardisosolver.set_iparm(13, 1 if symmetric and not definite else 0) # 0 disable, 1 matching normal, 2 advanced matching
     
     #pypardisosolver.set_iparm(21, 0) #pivoting symmetric indefinite. 1 enable
     #pypardisosolver.set_iparm(24, 1) #parallel numerial factorization, 1 improved algo
     #pypardisosolver.set_iparm(25, 1) #parallel backward forward, 1 enabled
     #pypardisosolver.set_statistical_info_on()
 
-    def solver(b, x0=None):
-        return spsolve(A, b, squeeze=False, solver=pypardisosolver)
+    return A, pypardisosolver
 
-    return solver, pypardisosolver
 
+def _factor_nbytes(nnz, n, index=4, value=8):
+    """Return memory (bytes) of sparse factors with nnz entries and n columns."""
+    return int(nnz) * (value + index) + (n + 1) * index
 
-def solver_superlu(A):
+
+def solver_superlu(A, symmetric=False, definite=False, **properties):
     """ 
     Return a function for solving a sparse linear system using SuperLU.
+
+    Symmetric positive definite matrices are factorized in symmetric mode
+    (minimum degree ordering of A^T + A and diagonal pivots), which preserves
+    the symmetry of the sparsity pattern and reduces the fill-in. Symmetric
+    indefinite matrices (e.g. saddle-point ones, whose diagonal has zeros)
+    are factorized as nonsymmetric ones.
     
     Parameters
     ----------
     A : (N, N) array_like
         Input.
+    symmetric : bool, optional
+        `A` is symmetric.
+    definite : bool, optional
+        `A` is positive definite.
+    properties : dict, optional
+        Other properties of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
     
     import scipy.sparse.linalg as spla
 
-    _useUmfpack = spla.dsolve.linsolve.useUmfpack
-    spla.use_solver(useUmfpack=False)
+    if symmetric and definite:
+        iA = spla.splu(A.tocsc(), permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0,
+                       options=dict(SymmetricMode=True))
+    else:
+        iA = spla.splu(A.tocsc())
+
+    def solver(b, x0=None, trans=False):
+        return iA.solve(b, 'T' if trans else 'N')
+
+    # Memory of the factors L and U and of the permutations.
+    solver.nbytes = _factor_nbytes(iA.nnz, A.shape[0], value=A.dtype.itemsize) + 8 * A.shape[0]
+
+    return solver,
+
 
-    iA = spla.factorized(A)
+def solver_cholmod(A, symmetric=False, definite=False, **properties):
+    """ 
+    Return a function for solving a sparse linear system using CHOLMOD.
 
-    def solver(b, x0=None):
+    Symmetric positive definite matrices are factorized with the (supernodal)
+    Cholesky method of CHOLMOD (scikit-sparse), and other matrices with
+    `solver_superlu`.
+    
+    Parameters
+    ----------
+    A : (N, N) array_like
+        Input.
+    symmetric : bool, optional
+        `A` is symmetric.
+    definite : bool, optional
+        `A` is positive definite.
+    properties : dict, optional
+        Other properties of `A` (ignored).
+        
+    Returns
+    -------
+    solve : callable
+        To solve the linear system of equations given in `A`, the `solve`
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
+        
+    """
+
+    if not (symmetric and definite):
+        return solver_superlu(A, symmetric=symmetric, definite=definite)
+
+    from sksparse.cholmod import cholesky
+
+    iA = cholesky(A.tocsc())
+
+    def solver(b, x0=None, trans=False):
         return iA(b)
 
-    spla.use_solver(useUmfpack=_useUmfpack)
+    # Memory of the factor L and of the permutation.
+    solver.nbytes = _factor_nbytes(iA.L().nnz, A.shape[0], value=A.dtype.itemsize) + 8 * A.shape[0]
 
-    return solver,
+    return solver, iA
 
 
-def solver_umfpack(A):
+def solver_umfpack(A, **properties):
     """ 
     Return a function for solving a sparse linear system using UMFPACK.
     
@@ -80,12 +182,15 @@ def solver_umfpack(A):
     ----------
     A : (N, N) array_like
         Input.
+    properties : dict, optional
+        Structure of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
     
@@ -98,15 +203,23 @@ def solver_umfpack(A):
     A.indices = A.indices.astype(np.int64)
 
     iA=spla.factorized(A)
-    def solver(b, x0=None):
-        return iA(b)
+    iAT = []
+
+    def solver(b, x0=None, trans=False):
+        if not trans:
+            return iA(b)
+
+        # The transposed system requires its own factorization.
+        if not iAT:
+            iAT.append(spla.factorized(A.T.tocsc()))
+        return iAT[0](b)
 
     #spla.use_solver(useUmfpack=_useUmfpack)
 
     return solver,
 
 
-def solver_pcg_ilu(A):
+def solver_pcg_ilu(A, **properties):
     """ 
     Return a function for solving a sparse linear system using PCG with ILU.
     
@@ -114,29 +227,43 @@ def solver_pcg_ilu(A):
     ----------
     A : (N, N) array_like
         Input.
+    properties : dict, optional
+        Structure of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
 
     from scipy.sparse.linalg import cg, spilu, LinearOperator
 
-    M = LinearOperator(A.shape, matvec=spilu(A).solve)
+    iM = spilu(A)
+    M = LinearOperator(A.shape, matvec=iM.solve)
+    MT = LinearOperator(A.shape, matvec=lambda x: iM.solve(x, 'T'))
 
-    def solver(b, x0=None):
-        x, info = cg(A.T, b, x0=x0, M=M)
+    def solver(b, x0=None, trans=False):
+        x, info = cg(A if trans else A.T, b, x0=x0, M=MT if trans else M, callback=count)
         if info != 0:
             raise ValueError(f'CG failed: info={info}')
         return x
 
+    # Memory of the incomplete factors.
+    solver.nbytes = _factor_nbytes(iM.nnz, A.shape[0], value=A.dtype.itemsize) + 8 * A.shape[0]
+
+    # Number of iterations of all the solves.
+    solver.iterations = 0
+
+    def count(xk):
+        solver.iterations += 1
+
     return solver,
 
 
-def solver_pcg_amg(A):
+def solver_pcg_amg(A, **properties):
     """ 
     Return a function for solving a sparse linear system using PCG with AMG.
     
@@ -144,12 +271,15 @@ def solver_pcg_amg(A):
     ----------
     A : (N, N) array_like
         Input.
+    properties : dict, optional
+        Structure of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
 
@@ -158,16 +288,22 @@ def solver_pcg_amg(A):
     
     M = rootnode_solver(A.T).aspreconditioner(cycle='V')
 
-    def solver(b, x0=None):
-        x, info = cg(A.T, b, x0=x0, M=M)
+    def solver(b, x0=None, trans=False):
+        x, info = cg(A if trans else A.T, b, x0=x0, M=M, callback=count)
         if info != 0:
             raise ValueError(f'CG failed: info={info}')
         return x
 
+    # Number of iterations of all the solves.
+    solver.iterations = 0
+
+    def count(xk):
+        solver.iterations += 1
+
     return solver,
 
 
-def solver_pminres_ilu(A):
+def solver_pminres_ilu(A, **properties):
     """ 
     Return a function for solving a sparse linear system using MINRES with ILU.
     
@@ -175,31 +311,233 @@ def solver_pminres_ilu(A):
     ----------
     A : (N, N) array_like
         Input.
+    properties : dict, optional
+        Structure of `A` (ignored).
         
     Returns
     -------
     solve : callable
         To solve the linear system of equations given in `A`, the `solve`
-        callable should be passed an ndarray of shape (N,).
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
         
     """
 
     from scipy.sparse.linalg import minres, spilu, LinearOperator
 
-    M = LinearOperator(A.shape, matvec=spilu(A.solve))
+    iM = spilu(A.tocsc())
+    M = LinearOperator(A.shape, matvec=iM.solve)
 
-    def solver(b, x0=None):
-        x, info = minres(A.T, b, x0=x0, M=M)
+    def solver(b, x0=None, trans=False):
+        x, info = minres(A if trans else A.T, b, x0=x0, M=M, callback=count)
         if info != 0:
             raise ValueError(f'MINRES failed: info={info}')
         return x
 
+    # Memory of the incomplete factors.
+    solver.nbytes = _factor_nbytes(iM.nnz, A.shape[0], value=A.dtype.itemsize) + 8 * A.shape[0]
+
+    # Number of iterations of all the solves.
+    solver.iterations = 0
+
+    def count(xk):
+        solver.iterations += 1
+
+    return solver,
+
+
+def _approximate_inverse(A, symmetric=True):
+    """Return functions that apply an approximate inverse of A and of its transpose.
+
+    One V-cycle of smoothed aggregation AMG is used for symmetric matrices if
+    pyamg is available, and an incomplete LU factorization otherwise.
+    """
+
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+
+    if symmetric:
+        try:
+            from pyamg import smoothed_aggregation_solver
+        except ImportError:
+            pass
+        else:
+            M = smoothed_aggregation_solver(sp.csr_matrix(A)).aspreconditioner(cycle='V')
+
+            # pyamg requires vectors of the same type as A (e.g. float32).
+            def apply(b):
+                return M.matvec(np.asarray(b, dtype=A.dtype))
+
+            return apply, apply
+
+    iA = spla.spilu(sp.csc_matrix(A))
+    return iA.solve, lambda b: iA.solve(b, 'T')
+
+
+def _rtol(krylov, rtol):
+    """Return the relative tolerance keyword of a SciPy Krylov solver (`tol` before SciPy 1.12)."""
+    import inspect
+
+    return {'rtol' if 'rtol' in inspect.signature(krylov).parameters else 'tol': rtol}
+
+
+def _schur_inverse(S, n):
+    """Return function that applies an approximate inverse of the symmetric matrix S.
+
+    The leading n x n block (pressure) is approximated with
+    `_approximate_inverse` and the remaining unknowns (forces on the immersed
+    boundaries, which are few) are eliminated through their dense Schur
+    complement, computed with one PCG solve per unknown (in float64, also if S
+    is float32). The approximation is symmetric positive definite if S is.
+    """
+
+    import scipy.linalg as la
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+
+    S = sp.csr_matrix(S)
+    S11, S12, S21, S22 = S[:n, :n], S[:n, n:], S[n:, :n], S[n:, n:]
+
+    iS11 = _approximate_inverse(S11)[0]
+    if S22.shape[0] == 0:
+        return iS11
+
+    M = spla.LinearOperator(S11.shape, matvec=iS11)
+    S11d = S11.astype(np.float64)
+    Z = np.column_stack([spla.cg(S11d, column, **_rtol(spla.cg, 1e-10), atol=0.0, M=M)[0]
+                         for column in S12.T.toarray().astype(np.float64)])
+    lu = la.lu_factor(S22.toarray() - S21 @ Z)
+
+    def solve(r):
+        y2 = la.lu_solve(lu, r[n:] - Z.T @ r[:n])
+        return np.r_[iS11(r[:n]) - Z @ y2, y2]
+
+    return solve
+
+
+def solver_block_krylov(A, split=None, method='gmres', tol=1e-10, restart=100, maxiter=1000, **properties):
+    """
+    Return a function for solving a saddle-point system using a Krylov method
+    with a block preconditioner.
+
+    The matrix is partitioned as A = [[K, B1], [B2, 0]], where K is the
+    velocity block and the second block row corresponds to the constraints
+    (pressure and forces on the immersed boundaries, B2 = B1^T). The inverse
+    of the Schur complement -B2 K^{-1} B1 is approximated as -S^{-1} F S^{-1}
+    (least-squares commutator), with S = B2 D^{-1} B1, F = B2 D^{-1} K D^{-1} B1
+    and D = diag(K). GMRES uses the block upper-triangular preconditioner and
+    MINRES (symmetric positive definite K only) the positive definite
+    block-diagonal one. K is approximated with one AMG V-cycle if it is
+    symmetric and pyamg is available, and with an incomplete LU factorization
+    otherwise; S with one AMG V-cycle (or incomplete LU) on the pressure and
+    a dense Schur complement for the forces.
+
+    Parameters
+    ----------
+    A : (N, N) array_like
+        Input.
+    split : int or tuple
+        Size of the velocity block K (e.g. `Solver.pStart`) and, optionally,
+        end of the pressure block (e.g. `Solver.pEnd`).
+    method : str, optional
+        'gmres' or 'minres'.
+    tol : float, optional
+        Relative tolerance of the Krylov method.
+    restart : int, optional
+        Number of GMRES iterations between restarts.
+    maxiter : int, optional
+        Maximum number of iterations (of restart cycles for GMRES).
+    properties : dict, optional
+        Other properties of `A` (ignored).
+
+    Returns
+    -------
+    solve : callable
+        To solve the linear system of equations given in `A`, the `solve`
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`. Its attribute `iterations` counts
+        the iterations of all the solves.
+
+    Raises
+    ------
+    ValueError
+        Unknown method, block structure not provided or nonsymmetric K with
+        MINRES.
+
+    """
+
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+
+    if split is None:
+        raise ValueError("The size of the velocity block (split) is required")
+    if method not in ('gmres', 'minres'):
+        raise ValueError("Unknown method '%s' (available: gmres, minres)" % method)
+
+    m, n = (split, A.shape[0]) if np.isscalar(split) else split
+
+    A = sp.csr_matrix(A)
+    K, B1, B2 = A[:m, :m], A[:m, m:], A[m:, :m]
+
+    symmetric = abs(K - K.T).max() <= 1e-12 * abs(K).max()
+    if method == 'minres' and not symmetric:
+        raise ValueError("MINRES requires a symmetric velocity block")
+
+    iD = sp.diags(1 / K.diagonal())
+    F = (B2 @ iD @ K @ iD @ B1).tocsr()
+
+    iK, iKT = _approximate_inverse(K, symmetric)
+    iS = _schur_inverse(B2 @ iD @ B1, n - m)
+
+    def triangular(iK, B1, F):
+        def apply(r):
+            y2 = -iS(F @ iS(r[m:]))
+            return np.r_[iK(r[:m] - B1 @ y2), y2]
+        return apply
+
+    def diagonal(r):
+        return np.r_[iK(r[:m]), iS(F @ iS(r[m:]))]
+
+    if method == 'gmres':
+        M = spla.LinearOperator(A.shape, matvec=triangular(iK, B1, F))
+        MT = spla.LinearOperator(A.shape, matvec=triangular(iKT, B2.T.tocsr(), F.T.tocsr()))
+    else:
+        M = MT = spla.LinearOperator(A.shape, matvec=diagonal)
+
+    # The preconditioner is applied in the type of A (e.g. float32, see
+    # `Solver.set_precision`), but Krylov iterations in float32 stagnate.
+    A = A.astype(np.float64)
+
+    krylov = spla.gmres if method == 'gmres' else spla.minres
+    rtol = _rtol(krylov, tol)
+
+    def solver(b, x0=None, trans=False):
+        if method == 'gmres':
+            x, info = krylov(A.T if trans else A, b, x0=x0, **rtol, atol=0.0, restart=restart,
+                             maxiter=maxiter, M=MT if trans else M, callback=count,
+                             callback_type='pr_norm')
+        else:
+            x, info = krylov(A.T if trans else A, b, x0=x0, **rtol, maxiter=maxiter,
+                             M=MT if trans else M, callback=count)
+        if info != 0:
+            raise ValueError(f'{method.upper()} failed: info={info}')
+        return x
+
+    # Number of iterations of all the solves.
+    solver.iterations = 0
+
+    def count(residual):
+        solver.iterations += 1
+
     return solver,
 
 
 def solver_default():
     """ 
     Return (fastest?) available sparse direct solver.
+
+    PARDISO if available, then CHOLMOD (for symmetric positive definite
+    matrices) and SuperLU.
     
     Returns
     -------
@@ -211,10 +549,417 @@ def solver_default():
     try:
         import pypardiso
         return solver_pardiso
+    except ImportError:
+        pass
+
+    try:
+        import sksparse.cholmod
+        return solver_cholmod
     except ImportError:
         return solver_superlu
 
 
+# Backends considered by `autotune` (name: (function, module required)).
+_backends = {
+    'pardiso': ('solver_pardiso', 'pypardiso'),
+    'cholmod': ('solver_cholmod', 'sksparse.cholmod'),
+    'superlu': ('solver_superlu', None),
+    'umfpack': ('solver_umfpack', 'scikits.umfpack'),
+    'pcg_ilu': ('solver_pcg_ilu', None),
+    'pcg_amg': ('solver_pcg_amg', 'pyamg'),
+    'block_krylov': ('solver_block_krylov', None),
+}
+
+
+def backend_name(solver):
+    """Return name of a linear solver in `_backends` (None if it is not one of them)."""
+    solver = getattr(solver, 'func', solver)  # functools.partial
+    names = {function: name for name, (function, _) in _backends.items()}
+    return names.get(getattr(solver, '__name__', None))
+
+
+def _candidates(properties):
+    """Return names of the installed backends suitable for a matrix with the given properties.
+
+    PCG is only suitable for positive definite matrices and block_krylov for
+    saddle-point ones.
+    """
+    import importlib.util
+
+    return [name for name, (_, module) in _backends.items()
+            if (module is None or importlib.util.find_spec(module.split('.')[0]))
+            and (not name.startswith('pcg') or properties.get('definite', False))
+            and (name != 'block_krylov' or 'split' in properties)]
+
+
+def _resident_memory():
+    """Return resident memory of the process in bytes (NaN if not available)."""
+    import os
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return np.nan
+
+
+def available_memory():
+    """Return memory available for new allocations in bytes (NaN if not available)."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return np.nan
+
+
+def nbytes(obj):
+    """Return memory (bytes) held by arrays, sparse matrices and nested lists/tuples/dicts of them.
+
+    Other objects count as their attribute `nbytes` (e.g. linear solvers, see
+    `Solver.linear_solver`) or zero.
+    """
+    import scipy.sparse as sp
+
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(elem) for elem in obj)
+    elif isinstance(obj, dict):
+        return sum(nbytes(elem) for elem in obj.values())
+    elif sp.issparse(obj):
+        obj = obj.tocoo(copy=False) if obj.format not in ('csr', 'csc', 'coo') else obj
+        if obj.format == 'coo':
+            return obj.data.nbytes + obj.row.nbytes + obj.col.nbytes
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    return getattr(obj, 'nbytes', 0)
+
+
+def _envelope_nnz(A):
+    """Return number of nonzeros of the lower triangle of the envelope of A.
+
+    The pattern A + A^T is reordered with the reverse Cuthill-McKee algorithm
+    and the nonzeros of its envelope (from the first nonzero of each row to
+    the diagonal) are counted. Since the fill-in of a factorization without
+    pivoting stays within the envelope, this bounds the nonzeros of the
+    Cholesky factor with this ordering; with the minimum degree orderings of
+    the direct solvers it overestimates them (by 1.2 to 3 on 2D grids of 10^4
+    to 10^5 unknowns).
+    """
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+    P = (abs(sp.csr_matrix(A)) + abs(sp.csr_matrix(A).T)).tocsr()
+    P.data[:] = 1.0
+
+    p = reverse_cuthill_mckee(P, symmetric_mode=True)
+    P = P[p][:, p].tocsr()
+
+    n = P.shape[0]
+    first = np.arange(n)
+    np.minimum.at(first, np.repeat(np.arange(n), np.diff(P.indptr)), P.indices)
+
+    return int(np.sum(np.arange(n) - first + 1))
+
+
+def _preconditioner_nnz(A, symmetric):
+    """Return estimated nonzeros of `_approximate_inverse` (AMG hierarchy or ILU factors)."""
+    import importlib.util
+
+    if symmetric and importlib.util.find_spec('pyamg'):
+        return 2 * A.nnz  # Operator complexity of smoothed aggregation (< 2 on grids).
+    return 10 * A.nnz  # Default fill factor of spilu.
+
+
+def predict_memory(A, backends=None, symmetric=False, definite=False, split=None, **properties):
+    """
+    Predict nonzeros of the factors and peak memory of each backend without
+    factorizing.
+
+    PARDISO runs its symbolic analysis (reordering and symbolic
+    factorization), which is exact. For the other direct backends the
+    nonzeros of the factors are bounded by the envelope of the matrix (see
+    `_envelope_nnz`): LU factorizations store L and U, Cholesky
+    factorizations (CHOLMOD, SuperLU in symmetric mode) only L; pivoting for
+    nonsymmetric matrices may increase the fill-in. Iterative backends are
+    estimated from the size of their preconditioners (incomplete LU with the
+    default fill factor of 10, AMG hierarchy twice the matrix) and of the
+    Krylov vectors.
+
+    Parameters
+    ----------
+    A : (N, N) array_like
+        Input.
+    backends : list, optional
+        Names of the backends (see `_backends`). By default, all those whose
+        dependencies are installed and which are suitable for `A`.
+    symmetric : bool, optional
+        `A` is symmetric.
+    definite : bool, optional
+        `A` is positive definite.
+    split : int or tuple, optional
+        Block structure of saddle-point matrices (see `solver_block_krylov`).
+    properties : dict, optional
+        Other properties of `A` (ignored).
+
+    Returns
+    -------
+    dict
+        For each backend, a dict with the predicted nonzeros of the factors
+        ('nnz', NaN for AMG), the memory of the factorization or
+        preconditioner ('factor', bytes), the peak memory of the setup
+        including a copy of the matrix ('peak', bytes) and whether the
+        prediction comes from a symbolic analysis ('exact').
+
+    """
+
+    import scipy.sparse as sp
+
+    properties = dict(properties, symmetric=symmetric, definite=definite)
+    if split is not None:
+        properties['split'] = split
+    backends = _candidates(properties) if backends is None else backends
+
+    A = sp.csr_matrix(A)
+    n, matrix = A.shape[0], nbytes(A)
+
+    envelope = None
+    predictions = {}
+    for name in backends:
+        if name not in _backends:
+            raise ValueError("Unknown backend '%s' (available: %s)" % (name, ", ".join(_backends)))
+
+        exact = False
+        if name == 'pardiso':
+            Ap, pypardisosolver = _pardiso(A, symmetric, definite)
+            pypardisosolver.set_iparm(18, -1)  # report nonzeros of the factors.
+            pypardisosolver.set_phase(11)  # analysis only.
+            pypardisosolver._call_pardiso(Ap, np.zeros(n))
+            iparm = pypardisosolver.iparm
+            nnz, exact = iparm[17], True
+            factor = 1024 * (iparm[15] + iparm[16])
+            peak = 1024 * max(iparm[14], iparm[15] + iparm[16]) + nbytes(Ap)
+        elif name in ('superlu', 'cholmod', 'umfpack'):
+            envelope = _envelope_nnz(A) if envelope is None else envelope
+            nnz = envelope if name == 'cholmod' and symmetric and definite else 2 * envelope - n
+            factor = _factor_nbytes(nnz, n, 8 if name == 'umfpack' else 4)
+            peak = factor + matrix
+        elif name == 'pcg_ilu':
+            nnz = _preconditioner_nnz(A, False)
+            factor = _factor_nbytes(nnz, n)
+            peak = factor + matrix + 8 * 8 * n
+        elif name == 'pcg_amg':
+            nnz, factor = np.nan, 2 * matrix
+            peak = factor + matrix + 8 * 8 * n
+        elif name == 'block_krylov':
+            if split is None:
+                raise ValueError("The size of the velocity block (split) is required")
+            m, l = (split, n) if np.isscalar(split) else split
+            K, B1, B2 = A[:m, :m], A[:m, m:], A[m:, :m]
+            S = B2 @ sp.diags(1 / K.diagonal()) @ B1
+            # Approximations of K and S, matrix F, dense coupling of the forces
+            # and GMRES basis (100 vectors).
+            nnz = _preconditioner_nnz(K, symmetric) + _preconditioner_nnz(S[:l - m, :l - m], True)
+            factor = _factor_nbytes(nnz, n) + 2 * nbytes(S) + 8 * (l - m) * (n - l) + 8 * (n - l) ** 2
+            peak = factor + 2 * matrix + 8 * 101 * n
+
+        predictions[name] = {'nnz': nnz, 'factor': int(factor), 'peak': int(peak), 'exact': exact}
+
+    return predictions
+
+
+def _trial(name, A, b, properties, repeat, queue):
+    """Measure setup and solve times, memory and residual of a backend (run in a child process)."""
+    import time
+
+    try:
+        solver = globals()[_backends[name][0]]
+
+        memory = _resident_memory()
+        t = time.perf_counter()
+        solve = solver(A, **properties)[0]
+        setup = time.perf_counter() - t
+        memory = _resident_memory() - memory
+
+        times, residual = [], 0.0
+        for trans in (False, True):
+            for _ in range(repeat):
+                t = time.perf_counter()
+                x = solve(b, trans=trans)
+                times.append(time.perf_counter() - t)
+            r = (A.T if trans else A) @ np.ravel(x) - b
+            residual = max(residual, float(np.linalg.norm(r) / np.linalg.norm(b)))
+
+        queue.put({'setup': setup, 'solve': min(times), 'memory': memory, 'residual': residual})
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def autotune(A, role=None, candidates=None, rtol=1e-8, solves=100, timeout=60.0, path=None,
+             verbose=False, **properties):
+    """
+    Return the fastest backend for a matrix, benchmarking them if needed.
+
+    Each candidate backend is tried on `A` in a child process (so that its
+    memory can be measured and it can be stopped after `timeout` seconds)
+    with a random right-hand side. Setup (factorization) time, solve time
+    (best of three, direct and transposed systems), increase of resident
+    memory and relative residual are measured, and the backend with the
+    smallest setup + solves * solve time among those whose residual is below
+    `rtol` is chosen. The results of the trials are stored in a JSON file,
+    keyed by role, size class (log2 of the number of rows), type and
+    properties of the matrix and candidates, so that later calls for similar
+    matrices skip them (the backend is chosen again with their `rtol` and
+    `solves`).
+
+    Parameters
+    ----------
+    A : (N, N) array_like
+        Input.
+    role : str, optional
+        Role of the matrix (e.g. 'velocity', 'pressure', 'saddle' or
+        'jacobian', see `Solver.propagator_properties`).
+    candidates : list, optional
+        Names of the backends to try (see `_backends`). By default, all those
+        whose dependencies are installed (PCG only for positive definite
+        matrices and block_krylov only for saddle-point ones).
+    rtol : float, optional
+        Maximum relative residual. For single precision matrices (whose
+        solves are refined in double precision, see `Solver.set_precision`),
+        at least the square root of the machine epsilon.
+    solves : int, optional
+        Expected number of solves per setup.
+    timeout : float, optional
+        Maximum time (in seconds) of each trial.
+    path : str, optional
+        JSON file with the results. By default, ibmos/autotune.json in the
+        user cache directory ($XDG_CACHE_HOME or ~/.cache).
+    verbose : bool, optional
+        Print the results of the trials.
+    properties : dict, optional
+        Structure of `A` (passed to the backends).
+
+    Returns
+    -------
+    dict
+        Chosen backend ('backend') and results of the trials ('trials').
+
+    Raises
+    ------
+    ValueError
+        Unknown candidate or no backend meets the accuracy requirements.
+
+    """
+
+    import json
+    import multiprocessing
+    import os
+    import queue
+    import tempfile
+
+    import scipy.sparse as sp
+
+    if candidates is None:
+        candidates = _candidates(properties)
+    for name in candidates:
+        if name not in _backends:
+            raise ValueError("Unknown backend '%s' (available: %s)" % (name, ", ".join(_backends)))
+
+    if path is None:
+        path = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                            'ibmos', 'autotune.json')
+
+    flags = ','.join(f'{key}={value}' for key, value in sorted(properties.items()) if isinstance(value, bool))
+    key = f'{role}:{int(np.log2(max(A.shape[0], 1)))}:{A.dtype}:{flags}:{",".join(candidates)}'
+
+    if A.dtype == np.float32:
+        rtol = max(rtol, np.sqrt(np.finfo(np.float32).eps))
+
+    def choose(trials):
+        valid = {name: trial['setup'] + solves * trial['solve'] for name, trial in trials.items()
+                 if 'error' not in trial and trial['residual'] <= rtol}
+        if not valid:
+            raise ValueError("No backend meets the accuracy requirements (rtol=%g)" % rtol)
+        return {'backend': min(valid, key=valid.get), 'trials': trials}
+
+    try:
+        with open(path) as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        results = {}
+
+    if key in results:
+        return choose(results[key]['trials'])
+
+    A = sp.csr_matrix(A)
+    b = (A @ np.random.default_rng(0).standard_normal(A.shape[0])).astype(A.dtype)
+
+    context = multiprocessing.get_context()
+    trials = {}
+    for name in candidates:
+        q = context.Queue()
+        process = context.Process(target=_trial, args=(name, A, b, properties, 3, q), daemon=True)
+        process.start()
+        try:
+            trials[name] = q.get(timeout=timeout)
+        except queue.Empty:
+            trials[name] = {'error': f'Timeout ({timeout} s)'}
+            process.terminate()
+        process.join()
+
+        if verbose:
+            print(f'{name:>14}:', ', '.join(f'{k}={v:.3e}' if isinstance(v, float) else f'{k}={v}'
+                                            for k, v in trials[name].items()))
+
+    # The trials are stored even if no backend meets the accuracy requirements.
+    results[key] = {'trials': trials}
+
+    # Atomic update of the file (concurrent runs may tune other matrices).
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(results, f, indent=1)
+    os.replace(tmp, path)
+
+    return choose(trials)
+
+
+def solver_autotuned(A, role=None, candidates=None, rtol=1e-8, path=None, **properties):
+    """ 
+    Return a function for solving a sparse linear system using the fastest
+    available backend (see `autotune`).
+
+    Use `functools.partial` to change the options, e.g.
+    `Solver(..., solver=functools.partial(solver_autotuned, rtol=1e-10))`.
+    
+    Parameters
+    ----------
+    A : (N, N) array_like
+        Input.
+    role : str, optional
+        Role of the matrix.
+    candidates : list, optional
+        Names of the backends to try.
+    rtol : float, optional
+        Maximum relative residual.
+    path : str, optional
+        JSON file with the results of the trials.
+    properties : dict, optional
+        Structure of `A` (passed to the backend).
+        
+    Returns
+    -------
+    solve : callable
+        To solve the linear system of equations given in `A`, the `solve`
+        callable should be passed an ndarray of shape (N,). The transposed
+        system is solved if `trans=True`.
+        
+    """
+
+    name = autotune(A, role, candidates, rtol, path=path, **properties)['backend']
+    return globals()[_backends[name][0]](A, **properties)
+
+
 def stretching(n, dn0, dn1, ns, ws=12, we=12, maxs=0.04):
     """Return stretched segment.
 
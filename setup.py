@@ -10,5 +10,8 @@ setup(
     license='MIT License',
     author='Miguel Fosas de Pando',
     author_email='miguel.fosas@uca.es',
-    description='Immersed boundary method for numerical optimization and stability analyses'
+    description='Immersed boundary method for numerical optimization and stability analyses',
+    entry_points={
+        'console_scripts': ['ibmos-sweep = ibmos.sweep:main'],
+    },
 )